@@ -1,82 +1,62 @@
 import os
-import requests
 import csv
-import time
 from datetime import datetime
-import threading
+
+import cosmos
+import metrics
+import prices
+import schemas
+import snapshot
+from progress import Progress
 
 BASE_URL = "https://docs-demo.cosmos-mainnet.quiknode.pro"
 ADDRESS = "cosmos1c6nwjknq8hkfqdhwx6rvj6xt24asv4u7asjqy4"
-DEXSCREENER_URL = "https://api.dexscreener.com/tokens/v1/bsc/0x0Eb3a705fc54725037CC9e008bDede697f62F335" #pulling price of ATOM on BSC - No cosmos data on dexscreener.
 REPORTS_FOLDER = "reports"
+CATEGORIES = ("spendable", "staked", "rewards")  # position categories returned by collect()
+
+# ATOM on BSC (no Cosmos data on Dexscreener), cross-checked against CoinGecko
+PRICE_SOURCES = (
+    prices.dexscreener_source("0x0Eb3a705fc54725037CC9e008bDede697f62F335", chain="bsc"),
+    prices.coingecko_source("cosmos")
+)
 
-loading = True
-
-def show_loading(message):
-    """Show a loading animation in the terminal."""
-    global loading
-    dots = 0
-    while loading:
-        print(f"\r{message}{'.' * (dots % 4)}", end='', flush=True)
-        dots += 1
-        time.sleep(0.5)
-    print(f"\r{message}...", end='', flush=True)
-
-def get_available_balance(address):
-    """Fetch the available (spendable) ATOM balance for a given Cosmos address."""
-    url = f"{BASE_URL}/cosmos/bank/v1beta1/balances/{address}"
+def get_balances(address):
+    """Fetch every bank balance (all denoms) of a Cosmos address."""
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        balances = response.json().get("balances", [])
-        for balance in balances:
-            if balance["denom"] == "uatom":
-                return int(balance["amount"]) / 1_000_000 
-        return 0.0
-    except requests.RequestException as err:
-        print(f"Error fetching available balance: {err}")
-        return 0.0
-
-def get_delegated_balance(address):
-    """Fetch the delegated balance (staked) for a given Cosmos address."""
-    url = f"{BASE_URL}/cosmos/staking/v1beta1/delegations/{address}"
+        return list(cosmos.get_client("atom", BASE_URL).bank_balances(address))
+    except cosmos.TRANSPORT_ERRORS as err:
+        print(f"Error fetching balances: {err}")
+        return []
+    except ValueError as err:
+        print(f"Error parsing balances: {err}")
+        return []
+
+def get_reward_coins(address):
+    """Fetch the pending staking rewards of a Cosmos address, in every denom."""
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        delegations = response.json().get("delegation_responses", [])
-        total_delegated = sum(int(delegation["balance"]["amount"]) for delegation in delegations)
-        return total_delegated / 1_000_000 
-    except requests.RequestException as err:
-        print(f"Error fetching delegated balance: {err}")
-        return 0.0
+        return cosmos.get_client("atom", BASE_URL).rewards(address)
+    except cosmos.TRANSPORT_ERRORS as err:
+        print(f"Error fetching rewards: {err}")
+        return []
+    except ValueError as err:
+        print(f"Error parsing rewards: {err}")
+        return []
 
-def get_rewards(address):
-    """Fetch staking rewards for a given Cosmos address."""
-    url = f"{BASE_URL}/cosmos/distribution/v1beta1/delegators/{address}/rewards"
+def get_delegated_amount(address):
+    """Fetch the delegated uatom of a Cosmos address."""
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        rewards = response.json().get("total", [])
-        for reward in rewards:
-            if reward["denom"] == "uatom":
-                return float(reward["amount"]) / 1_000_000 
-        return 0.0
-    except requests.RequestException as err:
-        print(f"Error fetching rewards: {err}")
-        return 0.0
+        delegations = cosmos.get_client("atom", BASE_URL).delegations(address)
+        return sum(delegation.amount for delegation in delegations)
+    except cosmos.TRANSPORT_ERRORS as err:
+        print(f"Error fetching delegated balance: {err}")
+        return 0
+    except ValueError as err:
+        print(f"Error parsing delegated balance: {err}")
+        return 0
 
 def get_atom_price():
-    """Fetch the current price of ATOM from Dexscreener."""
-    try:
-        response = requests.get(DEXSCREENER_URL)
-        response.raise_for_status()
-        data = response.json()
-        if isinstance(data, list) and data:
-            return float(data[0]["priceUsd"])
-        return 0.0
-    except requests.RequestException as err:
-        print(f"Error fetching ATOM price: {err}")
-        return 0.0
+    """Fetch the current price of ATOM from the fastest healthy price source."""
+    return prices.get_price("ATOM", PRICE_SOURCES)
 
 def export_to_csv(data, filename):
     """Export the results to a CSV file, including a total value row."""
@@ -113,47 +93,59 @@ def export_to_csv(data, filename):
         print(f"\nError exporting to CSV: {e}")
 
 
-def main():
-    global loading
+def collect(address, categories=CATEGORIES):
+    """Return the valued positions of one address (see snapshot.Position).
+
+    Each category is its own query, so only the requested ones are fetched.
+    Balances and rewards in other denoms are valued too (see cosmos.value_other_denoms).
+    """
+    atom_price = snapshot.cached_price("atom", get_atom_price)
+    fetchers = {
+        "spendable": get_balances,
+        "staked": lambda address: [schemas.Coin("uatom", get_delegated_amount(address))],
+        "rewards": get_reward_coins
+    }
+    positions = []
+    for category in CATEGORIES:
+        if category in categories:
+            coins = fetchers[category](address)
+            raw = schemas.amount_of(coins, "uatom")
+            positions.append(snapshot.Position.of(
+                "atom", address, "ATOM", "uatom", category, raw / 1_000_000, atom_price, 6, raw, f"cosmos-{cosmos.transport()}"
+            ))
+            positions.extend(cosmos.value_other_denoms("atom", address, coins, category, BASE_URL))
+    return positions
+
 
+def main():
     print("Running...")
 
-    loading_thread = threading.Thread(target=show_loading, args=("Fetching data",))
-    loading_thread.start()
+    progress = Progress("Cosmos")
+    progress.stage("Fetching data")
+    progress.plan()
 
-    atom_price = get_atom_price()
-    available_balance = get_available_balance(ADDRESS)
-    delegated_balance = get_delegated_balance(ADDRESS)
-    rewards = get_rewards(ADDRESS)
+    positions = collect(ADDRESS)
+    progress.advance()
 
-    loading = False
-    loading_thread.join()
+    progress.finish()
 
+    labels = {"spendable": "Available Balance", "staked": "Delegated Balance", "rewards": "Rewards"}
     results = [
         {
-            "Category": "Available Balance",
-            "Balance": f"{available_balance:.6f}",
-            "Price (USD)": f"{atom_price:.6f}",
-            "Total Value (USD)": f"{available_balance * atom_price:.6f}"
-        },
-        {
-            "Category": "Delegated Balance",
-            "Balance": f"{delegated_balance:.6f}",
-            "Price (USD)": f"{atom_price:.6f}",
-            "Total Value (USD)": f"{delegated_balance * atom_price:.6f}"
-        },
-        {
-            "Category": "Rewards",
-            "Balance": f"{rewards:.6f}",
-            "Price (USD)": f"{atom_price:.6f}",
-            "Total Value (USD)": f"{rewards * atom_price:.6f}"
+            "Category": labels[position.category] if position.asset == "ATOM" else f"{labels[position.category]} ({position.asset})",
+            "Balance": f"{position.balance:.6f}",
+            "Price (USD)": f"{position.price:.6f}",
+            "Total Value (USD)": f"{position.value:.6f}"
         }
+        for position in positions
     ]
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"{ADDRESS}_Cosmos_{timestamp}.csv"
     export_to_csv(results, filename)
 
+    metrics.export_trace("Cosmos")
+
     print("Done!")
 
 if __name__ == "__main__":
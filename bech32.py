@@ -0,0 +1,82 @@
+CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+GENERATOR = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+
+
+def polymod(values):
+    """Compute the BIP-173 checksum polynomial."""
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ value
+        for i in range(5):
+            chk ^= GENERATOR[i] if ((top >> i) & 1) else 0
+    return chk
+
+
+def hrp_expand(hrp):
+    return [ord(c) >> 5 for c in hrp] + [0] + [ord(c) & 31 for c in hrp]
+
+
+def create_checksum(hrp, data):
+    values = hrp_expand(hrp) + data
+    mod = polymod(values + [0, 0, 0, 0, 0, 0]) ^ 1
+    return [(mod >> 5 * (5 - i)) & 31 for i in range(6)]
+
+
+def encode(hrp, data):
+    """Encode a human-readable prefix and 5-bit data into a bech32 string."""
+    combined = data + create_checksum(hrp, data)
+    return hrp + "1" + "".join(CHARSET[d] for d in combined)
+
+
+def decode(address):
+    """Decode a bech32 string into (hrp, 5-bit data). Raises ValueError if invalid."""
+    if address.lower() != address and address.upper() != address:
+        raise ValueError(f"Mixed case in bech32 address: {address}")
+    address = address.lower()
+    pos = address.rfind("1")
+    if pos < 1 or pos + 7 > len(address) or len(address) > 90:
+        raise ValueError(f"Invalid bech32 address: {address}")
+    if any(c not in CHARSET for c in address[pos + 1:]):
+        raise ValueError(f"Invalid bech32 character in: {address}")
+
+    hrp = address[:pos]
+    data = [CHARSET.find(c) for c in address[pos + 1:]]
+    if polymod(hrp_expand(hrp) + data) != 1:
+        raise ValueError(f"Invalid bech32 checksum: {address}")
+    return hrp, data[:-6]
+
+
+def convert_bits(data, from_bits, to_bits, pad=True):
+    """Regroup a list of `from_bits` integers into `to_bits` integers."""
+    acc = 0
+    bits = 0
+    result = []
+    maxv = (1 << to_bits) - 1
+    for value in data:
+        acc = (acc << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            result.append((acc >> bits) & maxv)
+    if pad and bits:
+        result.append((acc << (to_bits - bits)) & maxv)
+    elif not pad and (bits >= from_bits or ((acc << (to_bits - bits)) & maxv)):
+        raise ValueError("Invalid padding in bech32 data")
+    return result
+
+
+def address_bytes(address):
+    """Return the raw account bytes behind a bech32 address."""
+    _, data = decode(address)
+    return bytes(convert_bits(data, 5, 8, pad=False))
+
+
+def reencode(address, prefix):
+    """Re-encode a bech32 address under another human-readable prefix.
+
+    This maps the same account bytes to another chain, e.g. a cosmos1...
+    address to its osmo1... counterpart.
+    """
+    _, data = decode(address)
+    return encode(prefix, data)
@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+import argparse
+import importlib
+import subprocess
+from typing import NamedTuple, Optional
+
+# Startup budgets checked by `chains.py startup`
+COMPLETION_BUDGET_MS = int(os.getenv("CHAINS_COMPLETION_BUDGET_MS", "100"))
+CHAIN_BUDGET_MS = int(os.getenv("CHAINS_CHAIN_BUDGET_MS", "400"))
+
+
+class Chain(NamedTuple):
+    """What is known about a chain aggregator without importing it.
+
+    `module` exposes CATEGORIES and collect(wallet, categories); it is
+    imported by load() only when the chain is actually used.
+    """
+    id: str
+    module: str
+    name: str
+    asset: str  # native asset symbol, as in its Positions
+    price: Optional[str] = None  # module function returning the native USD price, shared per run
+    coingecko_id: Optional[str] = None  # for price history
+    address: Optional[str] = None  # address of the native asset's spendable Positions
+
+
+REGISTRY = {}
+
+
+def register(chain_id, module, name, asset, price=None, coingecko_id=None, address=None):
+    REGISTRY[chain_id] = Chain(chain_id, module, name, asset, price, coingecko_id, address)
+
+
+register("solana", "solana", "Solana", "SOL", "get_sol_price", "solana", "native SOL")
+register("sui", "sui", "Sui", "SUI", None, "sui", "0x2::sui::SUI")
+register("near", "near", "NEAR", "NEAR", "get_near_price", "near", "Near")
+register("tao", "tao", "Bittensor", "TAO", "fetch_tao_price", "bittensor", "native")
+register("mina", "mina", "Mina", "MINA", "fetch_mina_price", "mina-protocol", "native")
+register("atom", "atom", "Cosmos Hub", "ATOM", "get_atom_price", "cosmos", "uatom")
+register("inj", "inj", "Injective", "INJ", "fetch_inj_price", "injective-protocol", "inj")
+register("dydx", "dydx", "dYdX", "DYDX", "fetch_dydx_price", "dydx-chain", "adydx")
+register("nibi", "nibi", "Nibiru", "NIBI", "fetch_nibi_price", "nibiru", "unibi")
+
+
+def ids():
+    return list(REGISTRY)
+
+
+def get(chain_id):
+    """Return the registered Chain, raising ValueError for unknown ids."""
+    try:
+        return REGISTRY[chain_id]
+    except KeyError:
+        raise ValueError(f"Unknown chain {chain_id!r}, expected one of {', '.join(REGISTRY)}") from None
+
+
+def load(chain_id):
+    """Import and return the aggregator module of a chain."""
+    return importlib.import_module(get(chain_id).module)
+
+
+def collect(chain, wallet, categories=None):
+    """Collect some (default: all) categories of one wallet, returning None (and printing why) if its collector fails."""
+    try:
+        module = load(chain)
+        return module.collect(wallet, categories or module.CATEGORIES)
+    except Exception as e:
+        print(f"\nError collecting {chain} wallet {wallet}: {e}")
+        return None
+
+
+def load_wallets(path):
+    """Read a wallet list: one `chain wallet` pair per line, `#` starts a comment."""
+    wallets = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.split("#", 1)[0].replace(",", " ").strip()
+            if not line:
+                continue
+            parts = line.split()
+            if len(parts) != 2 or parts[0] not in REGISTRY:
+                raise ValueError(f"{path}:{line_number}: expected `<chain> <wallet>` with chain in {', '.join(REGISTRY)}")
+            wallets.append((parts[0], parts[1]))
+    return list(dict.fromkeys(wallets))
+
+
+def _time_ms(*args):
+    """Wall time of a fresh interpreter run with `args`, in milliseconds."""
+    started = time.perf_counter()
+    subprocess.run([sys.executable, *args], check=True, stdout=subprocess.DEVNULL, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List, complete and collect chains; only the selected chain is imported.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="registered chains")
+    complete = commands.add_parser("complete", help="chain ids starting with a prefix, one per line (for shell completion)")
+    complete.add_argument("prefix", nargs="?", default="")
+    run = commands.add_parser("collect", help="print the positions of wallets on one chain as JSON Lines")
+    run.add_argument("chain", choices=ids())
+    run.add_argument("wallets", nargs="+")
+    startup = commands.add_parser("startup", help="check startup times against their budgets")
+    startup.add_argument("chain", nargs="?", default="solana", choices=ids())
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for chain in REGISTRY.values():
+            print(f"{chain.id:8} {chain.asset:6} {chain.name}")
+    elif args.command == "complete":
+        for chain_id in REGISTRY:
+            if chain_id.startswith(args.prefix):
+                print(chain_id)
+    elif args.command == "collect":
+        import output  # not at the top: pyarrow, when installed, is slow to import
+        writer = output.open_writer("jsonl")
+        for wallet in args.wallets:
+            writer.write(collect(args.chain, wallet) or [])
+        writer.close()
+    else:
+        baseline = _time_ms("-c", "pass")
+        checks = [
+            ("completion", _time_ms("chains.py", "complete"), COMPLETION_BUDGET_MS),
+            (f"load {args.chain}", _time_ms("-c", f"import chains; chains.load({args.chain!r})"), CHAIN_BUDGET_MS)
+        ]
+        over = False
+        print(f"interpreter: {baseline:.0f} ms")
+        for label, elapsed, budget in checks:
+            over |= elapsed > budget
+            print(f"{label}: {elapsed:.0f} ms (budget {budget} ms){' OVER BUDGET' if elapsed > budget else ''}")
+        sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import os
+import time
+import threading
+
+import requests
+
+import metrics
+import schemas
+from ratelimit import RateLimiter
+
+COINGECKO_SIMPLE_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price"
+COINGECKO_MARKET_CHART_URL = "https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart/range"
+
+CHUNK_SIZE = 250  # ids per simple/price request
+CACHE_TTL = 60  # seconds a fetched price is reused
+
+# Public API budget for history backfills (simple/price is batched instead)
+RATE_LIMIT_PER_MINUTE = int(os.getenv("COINGECKO_RATE_LIMIT", "30"))
+rate_limiter = RateLimiter(RATE_LIMIT_PER_MINUTE, per=60.0)
+
+_lock = threading.Lock()
+_ids = set()
+_vs_currencies = {"usd"}
+_prices = {}
+_fetched = {}  # coin_id -> (monotonic time, vs_currencies requested)
+
+
+def register(*coin_ids, vs_currencies=("usd",)):
+    """Declare CoinGecko ids needed in this run so they are fetched together.
+
+    Aggregators register their ids at import time; the first price lookup
+    then fetches every registered id in one request per chunk.
+    """
+    with _lock:
+        _ids.update(coin_ids)
+        _vs_currencies.update(vs_currencies)
+
+
+def _headers():
+    headers = {"accept": "application/json"}
+    api_key = os.getenv("COINGECKO_API_KEY")
+    if api_key:
+        headers["x-cg-demo-api-key"] = api_key
+    return headers
+
+
+def _fetch(coin_ids):
+    """Fetch prices for `coin_ids`, one simple/price request per chunk."""
+    headers = _headers()
+    requested = frozenset(_vs_currencies)
+    vs_currencies = ",".join(sorted(requested))
+    coin_ids = sorted(coin_ids)
+    for start in range(0, len(coin_ids), CHUNK_SIZE):
+        chunk = coin_ids[start:start + CHUNK_SIZE]
+        params = {"ids": ",".join(chunk), "vs_currencies": vs_currencies}
+        try:
+            response = metrics.get("coingecko", "simple/price", COINGECKO_SIMPLE_PRICE_URL, params=params, headers=headers)
+            response.raise_for_status()
+            data = schemas.loads(response.content)
+        except requests.RequestException as e:
+            print(f"Error fetching prices from CoinGecko: {e}")
+            continue
+        except ValueError as e:
+            print(f"Unexpected response format from CoinGecko: {e}")
+            continue
+
+        now = time.monotonic()
+        for coin_id in chunk:
+            quotes = data.get(coin_id)
+            if quotes is None:
+                print(f"CoinGecko returned no price for {coin_id}")
+            # Remember misses too, so an unknown id isn't requested again until the TTL expires
+            _prices[coin_id] = quotes or {}
+            _fetched[coin_id] = (now, requested)
+
+
+def _is_fresh(coin_id, vs_currency):
+    fetched_at, vs_currencies = _fetched.get(coin_id, (float("-inf"), ()))
+    return time.monotonic() - fetched_at < CACHE_TTL and vs_currency in vs_currencies
+
+
+def get_price(coin_id, vs_currency="usd"):
+    """Return the price of `coin_id`, batching the lookup with every registered id."""
+    with _lock:
+        _ids.add(coin_id)
+        _vs_currencies.add(vs_currency)
+        hit = _is_fresh(coin_id, vs_currency)
+        metrics.record_cache("coingecko", "simple/price", hit)
+
+        if not hit:
+            stale = {i for i in _ids if not _is_fresh(i, vs_currency)}
+            _fetch(stale | {coin_id})
+
+        try:
+            return schemas.coingecko_price(_prices, coin_id, vs_currency)
+        except ValueError:
+            return 0.0
+
+
+def get_prices(coin_ids, vs_currency="usd"):
+    """Return {coin_id: price} for several ids, sharing one batched lookup."""
+    register(*coin_ids, vs_currencies=(vs_currency,))
+    return {coin_id: get_price(coin_id, vs_currency) for coin_id in coin_ids}
+
+
+def get_market_chart(coin_id, start, end, vs_currency="usd"):
+    """Return the PricePoints of `coin_id` between two unix timestamps.
+
+    CoinGecko returns daily points for ranges over 90 days and hourly
+    ones below. Raises requests.RequestException or ValueError.
+    """
+    params = {"vs_currency": vs_currency, "from": int(start), "to": int(end)}
+    rate_limiter.acquire()
+    response = metrics.get(
+        "coingecko", "market_chart/range", COINGECKO_MARKET_CHART_URL.format(coin_id=coin_id), params=params, headers=_headers()
+    )
+    response.raise_for_status()
+    return schemas.PricePoint.list_from_market_chart(schemas.loads(response.content))
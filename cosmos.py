@@ -0,0 +1,446 @@
+import os
+import sys
+import csv
+import json
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import bech32
+import coingecko
+import cosmos_grpc
+import metrics
+import schemas
+import snapshot
+from progress import Progress
+
+REPORTS_FOLDER = "reports"
+CONCURRENCY = int(os.getenv("COSMOS_CONCURRENCY", "16"))
+BANK_PAGE_LIMIT = 200
+
+# "rest" (JSON gateway) or "grpc" (protobuf, needs grpcio and the chain's grpc_url)
+TRANSPORT = os.getenv("COSMOS_TRANSPORT", "rest")
+
+CACHE_FOLDER = ".cache"
+DENOM_CACHE_FILE = os.path.join(CACHE_FOLDER, "ibc_denoms.json")
+
+# Cosmos SDK chains known to the aggregators. Chains with coin type 60
+# (Ethereum-style keys, e.g. Injective) derive a different account from the
+# same key, so their addresses can't be obtained by re-encoding.
+COSMOS_CHAINS = {
+    "atom": {
+        "name": "Cosmos Hub",
+        "prefix": "cosmos",
+        "rest_url": "https://docs-demo.cosmos-mainnet.quiknode.pro",
+        "grpc_url": os.getenv("ATOM_GRPC_URL", "cosmos-grpc.publicnode.com:443"),
+        "denom": "uatom",
+        "coingecko_id": "cosmos",
+        "decimals": 6,
+        "coin_type": 118
+    },
+    "osmo": {
+        "name": "Osmosis",
+        "prefix": "osmo",
+        "rest_url": "https://osmosis-rest.publicnode.com",
+        "grpc_url": os.getenv("OSMO_GRPC_URL", "osmosis-grpc.publicnode.com:443"),
+        "denom": "uosmo",
+        "coingecko_id": "osmosis",
+        "decimals": 6,
+        "coin_type": 118
+    },
+    "dydx": {
+        "name": "dYdX",
+        "prefix": "dydx",
+        "rest_url": "https://dydx-rest.publicnode.com",
+        "grpc_url": os.getenv("DYDX_GRPC_URL", "dydx-grpc.publicnode.com:443"),
+        "denom": "adydx",
+        "coingecko_id": "dydx-chain",
+        "decimals": 18,
+        "coin_type": 118
+    },
+    "nibi": {
+        "name": "Nibiru",
+        "prefix": "nibi",
+        "rest_url": "https://nibiru-rest.publicnode.com",
+        "grpc_url": os.getenv("NIBI_GRPC_URL", "nibiru-grpc.publicnode.com:443"),
+        "denom": "unibi",
+        "coingecko_id": "nibiru",
+        "decimals": 6,
+        "coin_type": 118
+    },
+    "inj": {
+        "name": "Injective",
+        "prefix": "inj",
+        "rest_url": "https://injective-rest.publicnode.com",
+        "grpc_url": os.getenv("INJ_GRPC_URL", "injective-grpc.publicnode.com:443"),
+        "denom": "inj",
+        "coingecko_id": "injective-protocol",
+        "decimals": 18,
+        "coin_type": 60
+    }
+}
+
+# CoinGecko ids of base denoms, to price denoms other than a chain's own
+DENOM_COINGECKO_IDS = {chain["denom"]: chain["coingecko_id"] for chain in COSMOS_CHAINS.values()}
+DENOM_COINGECKO_IDS.update({
+    "uusdc": "usd-coin",
+    "uusdt": "tether",
+    "utia": "celestia",
+    "ustrd": "stride",
+    "untrn": "neutron-3",
+    "ujuno": "juno-network",
+    "uakt": "akash-network",
+    "uscrt": "secret"
+})
+
+ADDRESS = "nibi1qmz8gw2ddh50x0nl4crejwr4vd67498rry37lm"
+
+
+def derive_addresses(address, chains=COSMOS_CHAINS):
+    """Derive the address of the same key on every configured chain.
+
+    Only chains sharing the source chain's coin type can be derived; the
+    others are skipped.
+    """
+    prefix, _ = bech32.decode(address)
+    source = next((chain for chain in chains.values() if chain["prefix"] == prefix), None)
+    coin_type = source["coin_type"] if source else 118
+
+    return {
+        chain_id: bech32.reencode(address, chain["prefix"])
+        for chain_id, chain in chains.items()
+        if chain["coin_type"] == coin_type
+    }
+
+
+def iter_bank_balances(rest_url, address, page_limit=BANK_PAGE_LIMIT):
+    """Yield every bank balance of an address, following pagination page by page.
+
+    Callers looking for a single denom can stop iterating as soon as it
+    shows up, without fetching the remaining pages.
+    """
+    params = {"pagination.limit": page_limit}
+    while True:
+        response = metrics.get("cosmos-rest", "bank/balances", f"{rest_url}/cosmos/bank/v1beta1/balances/{address}", params=params)
+        response.raise_for_status()
+        data = schemas.loads(response.content)
+        yield from schemas.Coin.list_from_json(data, 'balances')
+
+        next_key = schemas.next_page_key(data)
+        if not next_key:
+            return
+        params = {"pagination.limit": page_limit, "pagination.key": next_key}
+
+
+def fetch_bank_balances(rest_url, address):
+    """Fetch all bank balances of an address."""
+    return list(iter_bank_balances(rest_url, address))
+
+
+_denom_lock = threading.Lock()
+_denom_cache = None
+
+
+def _load_denom_cache():
+    global _denom_cache
+    if _denom_cache is None:
+        try:
+            with open(DENOM_CACHE_FILE) as f:
+                _denom_cache = {denom: schemas.DenomTrace(**trace) for denom, trace in json.load(f).items()}
+        except (OSError, ValueError, TypeError):
+            _denom_cache = {}
+    return _denom_cache
+
+
+def _save_denom_cache():
+    try:
+        os.makedirs(CACHE_FOLDER, exist_ok=True)
+        with open(DENOM_CACHE_FILE, mode='w') as f:
+            json.dump({denom: trace._asdict() for denom, trace in _denom_cache.items()}, f, indent=2, sort_keys=True)
+    except OSError as e:
+        print(f"\nError writing {DENOM_CACHE_FILE}: {e}")
+
+
+def fetch_denom_trace(rest_url, ibc_hash):
+    """Resolve an IBC denom hash through the chain's transfer module."""
+    response = metrics.get("cosmos-rest", "ibc/denom_traces", f"{rest_url}/ibc/apps/transfer/v1/denom_traces/{ibc_hash}")
+    if response.status_code in (404, 501):
+        # ibc-go v8 replaced denom_traces with denoms
+        response = metrics.get("cosmos-rest", "ibc/denoms", f"{rest_url}/ibc/apps/transfer/v1/denoms/{ibc_hash}")
+    response.raise_for_status()
+    return schemas.decode(response, schemas.DenomTrace)
+
+
+def resolve_denom(rest_url, denom, save=True):
+    """Return the base denom behind an `ibc/<hash>` denom (other denoms are returned as is).
+
+    Traces are kept in a persistent cache, so each hash is resolved once.
+    The hash commits to the full trace, so the cache is shared by all chains.
+    """
+    if not denom.startswith("ibc/"):
+        return denom
+
+    with _denom_lock:
+        cache = _load_denom_cache()
+        trace = cache.get(denom)
+    metrics.record_cache("cosmos-rest", "ibc/denom_traces", trace is not None)
+    if trace is not None:
+        return trace.base_denom
+
+    try:
+        trace = fetch_denom_trace(rest_url, denom[len("ibc/"):])
+    except requests.RequestException as e:
+        print(f"\nError resolving {denom}: {e}")
+        return denom
+    except ValueError as e:
+        print(f"\nError parsing trace of {denom}: {e}")
+        return denom
+
+    with _denom_lock:
+        _denom_cache[denom] = trace
+        if save:
+            _save_denom_cache()
+    return trace.base_denom
+
+
+def resolve_denoms(rest_url, denoms):
+    """Resolve many denoms at once, fetching uncached IBC traces concurrently.
+
+    The cache file is written once at the end instead of after every trace.
+    """
+    denoms = list(dict.fromkeys(denoms))
+    if not denoms:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(CONCURRENCY, len(denoms))) as executor:
+        resolved = dict(zip(denoms, executor.map(metrics.bind(lambda denom: resolve_denom(rest_url, denom, save=False)), denoms)))
+    with _denom_lock:
+        if _denom_cache:
+            _save_denom_cache()
+    return resolved
+
+
+def fetch_delegations(rest_url, address):
+    """Fetch the delegations of an address."""
+    response = metrics.get("cosmos-rest", "staking/delegations", f"{rest_url}/cosmos/staking/v1beta1/delegations/{address}")
+    response.raise_for_status()
+    return schemas.Delegation.list_from_json(schemas.loads(response.content))
+
+
+def fetch_rewards(rest_url, address):
+    """Fetch the pending staking rewards of an address."""
+    response = metrics.get("cosmos-rest", "distribution/rewards", f"{rest_url}/cosmos/distribution/v1beta1/delegators/{address}/rewards")
+    response.raise_for_status()
+    return schemas.Coin.list_from_json(schemas.loads(response.content), 'total')
+
+
+def denom_decimals(base_denom):
+    """Decimals of a base denom: a known chain's, else from the micro/atto prefix, else None."""
+    for chain in COSMOS_CHAINS.values():
+        if chain["denom"] == base_denom:
+            return chain["decimals"]
+    if base_denom.startswith("u"):
+        return 6
+    if base_denom.startswith("a"):
+        return 18
+    return None
+
+
+def value_other_denoms(chain_id, address, coins, category, rest_url=None):
+    """Value every coin other than the chain's native denom as Positions.
+
+    IBC denoms are resolved to their base denom, which becomes the asset
+    (the on-chain denom is kept as the address). Base denoms with a known
+    CoinGecko id are priced in one batched lookup; the others get price 0.
+    Denoms of unknown decimals keep their raw amount as the balance.
+    """
+    chain = COSMOS_CHAINS[chain_id]
+    others = [coin for coin in coins if coin.denom != chain["denom"] and coin.amount]
+    if not others:
+        return []
+    base_denoms = resolve_denoms(rest_url or chain["rest_url"], [coin.denom for coin in others])
+    coin_ids = {base: DENOM_COINGECKO_IDS[base] for base in base_denoms.values() if base in DENOM_COINGECKO_IDS}
+    quotes = coingecko.get_prices(sorted(set(coin_ids.values()))) if coin_ids else {}
+
+    positions = []
+    for coin in others:
+        base = base_denoms[coin.denom]
+        decimals = denom_decimals(base)
+        balance = coin.amount / 10 ** decimals if decimals is not None else float(coin.amount)
+        positions.append(snapshot.Position.of(
+            chain_id, address, base, coin.denom, category, balance, quotes.get(coin_ids.get(base), 0.0), decimals, coin.amount, f"cosmos-{transport()}"
+        ))
+    return positions
+
+
+def export_other_denoms(csvfile, positions):
+    """Append one row per non-native position under a chain report. Returns their total value."""
+    if not positions:
+        return 0.0
+    writer = csv.writer(csvfile)
+    writer.writerow([])
+    writer.writerow(["Asset", "Denom", "Category", "Balance", "Price (USD)", "Value (USD)"])
+    for position in positions:
+        writer.writerow([
+            position.asset, position.address, position.category, f"{position.balance:.6f}", f"{position.price:.6f}", f"{position.value:.4f}"
+        ])
+    return sum(position.value for position in positions)
+
+
+TRANSPORT_ERRORS = (requests.RequestException,) + ((cosmos_grpc.grpc.RpcError,) if cosmos_grpc.grpc else ())
+
+_warned_no_grpc = False
+
+
+class CosmosRestClient:
+    """Bank, staking and distribution queries over the REST gateway."""
+
+    def __init__(self, rest_url):
+        self.rest_url = rest_url
+
+    def bank_balances(self, address):
+        """Yield every bank balance of an address."""
+        return iter_bank_balances(self.rest_url, address)
+
+    def delegations(self, address):
+        """Return the delegations of an address."""
+        return fetch_delegations(self.rest_url, address)
+
+    def rewards(self, address):
+        """Return the total pending rewards of an address, in base units."""
+        return fetch_rewards(self.rest_url, address)
+
+
+def transport():
+    """The transport get_client actually uses: TRANSPORT, or "rest" when grpcio is missing."""
+    return "grpc" if TRANSPORT == "grpc" and cosmos_grpc.grpc is not None else "rest"
+
+
+def get_client(chain_id, rest_url=None):
+    """Return the query client of a chain for the configured transport.
+
+    `rest_url` overrides the chain's REST endpoint. Both clients raise one
+    of TRANSPORT_ERRORS on network errors and ValueError on bad payloads.
+    """
+    global _warned_no_grpc
+    chain = COSMOS_CHAINS[chain_id]
+    if transport() == "grpc":
+        return cosmos_grpc.CosmosGrpcClient(chain["grpc_url"])
+    if TRANSPORT == "grpc" and not _warned_no_grpc:
+        print("grpcio is not installed, falling back to the REST transport")
+        _warned_no_grpc = True
+    return CosmosRestClient(rest_url or chain["rest_url"])
+
+
+def _safe(fetch, chain_id, address, default):
+    """`fetch(address)`, or `default` on errors, which are reported to metrics.failures()."""
+    try:
+        return list(fetch(address))
+    except TRANSPORT_ERRORS as e:
+        print(f"\nError fetching {fetch.__name__} on {chain_id}: {e}")
+        metrics.record_failure(chain_id, fetch.__name__, type(e).__name__)
+    except ValueError as e:
+        print(f"\nError parsing {fetch.__name__} on {chain_id}: {e}")
+        metrics.record_failure(chain_id, fetch.__name__, type(e).__name__)
+    return default
+
+
+def discover_holdings(addresses, progress):
+    """Query bank, staking and distribution on every chain concurrently.
+
+    `addresses` maps chain ids to addresses (see derive_addresses). Returns
+    one holdings dict per chain, amounts in display units of the native denom.
+    """
+    progress.plan(3 * len(addresses))
+    holdings = []
+    if not addresses:
+        return holdings
+
+    safe = metrics.bind(_safe)
+    with ThreadPoolExecutor(max_workers=min(CONCURRENCY, 3 * len(addresses))) as executor:
+        futures = {}
+        for chain_id, address in addresses.items():
+            client = get_client(chain_id)
+            futures[chain_id] = (
+                executor.submit(safe, client.bank_balances, chain_id, address, []),
+                executor.submit(safe, client.delegations, chain_id, address, []),
+                executor.submit(safe, client.rewards, chain_id, address, [])
+            )
+
+        for chain_id, (balances_future, delegations_future, rewards_future) in futures.items():
+            chain = COSMOS_CHAINS[chain_id]
+            scale = 10 ** chain["decimals"]
+            balances = balances_future.result()
+            delegations = delegations_future.result()
+            rewards = rewards_future.result()
+            progress.advance(3)
+
+            others = value_other_denoms(chain_id, addresses[chain_id], balances, "spendable")
+
+            holdings.append({
+                "Chain": chain["name"],
+                "Address": addresses[chain_id],
+                "Denom": chain["denom"],
+                "Spendable": f"{schemas.amount_of(balances, chain['denom']) / scale:.6f}",
+                "Delegated": f"{sum(delegation.amount for delegation in delegations) / scale:.6f}",
+                "Rewards": f"{schemas.amount_of(rewards, chain['denom']) / scale:.6f}",
+                "Other Denoms": " ".join(f"{position.asset}={position.balance:g}" for position in others),
+                "Other Denoms Value (USD)": f"{sum(position.value for position in others):.4f}"
+            })
+
+    return holdings
+
+
+def export_to_csv(data, filename):
+    """Export the holdings to a CSV file."""
+    try:
+        os.makedirs(REPORTS_FOLDER, exist_ok=True)
+
+        file_path = os.path.join(REPORTS_FOLDER, filename)
+
+        with open(file_path, mode='w', newline='') as csvfile:
+            fieldnames = ['Chain', 'Address', 'Denom', 'Spendable', 'Delegated', 'Rewards', 'Other Denoms', 'Other Denoms Value (USD)']
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+
+            writer.writeheader()
+            for row in data:
+                writer.writerow(row)
+
+        print(f"\nData successfully exported to {file_path}")
+    except Exception as e:
+        print(f"\nError exporting to CSV: {e}")
+
+
+def main():
+    address = sys.argv[1] if len(sys.argv) > 1 else ADDRESS
+
+    print("Running...")
+
+    progress = Progress("Cosmos_Holdings")
+    progress.stage("Deriving addresses")
+    try:
+        addresses = derive_addresses(address)
+    except ValueError as e:
+        print(f"Invalid address: {e}")
+        return
+
+    progress.stage("Discovering holdings")
+    holdings = discover_holdings(addresses, progress)
+
+    progress.finish()
+
+    for row in holdings:
+        print(f"{row['Chain']}: {row['Address']} spendable={row['Spendable']} delegated={row['Delegated']} rewards={row['Rewards']}")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"Cosmos_Holdings_{timestamp}.csv"
+    export_to_csv(holdings, filename)
+
+    metrics.export_trace("Cosmos_Holdings")
+
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import os
+import time
+import threading
+
+try:
+    import grpc
+except ImportError:
+    grpc = None
+
+import metrics
+import schemas
+
+# Fully-qualified gRPC methods of the Cosmos SDK query services
+BANK_ALL_BALANCES = "/cosmos.bank.v1beta1.Query/AllBalances"
+STAKING_DELEGATOR_DELEGATIONS = "/cosmos.staking.v1beta1.Query/DelegatorDelegations"
+DISTRIBUTION_TOTAL_REWARDS = "/cosmos.distribution.v1beta1.Query/DelegationTotalRewards"
+
+TIMEOUT = 10  # seconds per call
+# TLS for targets without a grpc:// or grpcs:// scheme: "1" always, "0" never,
+# unset only on port 443
+TLS = os.getenv("COSMOS_GRPC_TLS")
+DEC_PRECISION = 10 ** 18  # sdk.Dec values are sent as integers scaled by 1e18
+
+_channels_lock = threading.Lock()
+_channels = {}
+
+
+# Protobuf wire format. Only the handful of messages used below are needed,
+# so they are encoded/decoded by field number instead of generated classes.
+
+def encode_varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(buf):
+            raise schemas.SchemaError("Protobuf", (), "truncated varint")
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def encode_field(number, value):
+    """Encode one field: ints as varints, str/bytes as length-delimited."""
+    if isinstance(value, int):
+        return encode_varint(number << 3) + encode_varint(value)
+    if isinstance(value, str):
+        value = value.encode()
+    return encode_varint(number << 3 | 2) + encode_varint(len(value)) + value
+
+
+def encode_message(*fields):
+    """Encode (number, value) pairs, skipping unset (None/empty) values."""
+    return b"".join(encode_field(number, value) for number, value in fields if value not in (None, b"", ""))
+
+
+def decode_message(buf):
+    """Decode a message into {field number: [values]}.
+
+    Varints decode to ints, length-delimited fields to bytes (nested messages
+    are decoded by the caller, which knows the schema).
+    """
+    fields = {}
+    pos = 0
+    while pos < len(buf):
+        key, pos = decode_varint(buf, pos)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = decode_varint(buf, pos)
+        elif wire_type == 2:
+            length, pos = decode_varint(buf, pos)
+            value = bytes(buf[pos:pos + length])
+            pos += length
+        elif wire_type == 1:
+            value = bytes(buf[pos:pos + 8])
+            pos += 8
+        elif wire_type == 5:
+            value = bytes(buf[pos:pos + 4])
+            pos += 4
+        else:
+            raise schemas.SchemaError("Protobuf", (number,), f"has unsupported wire type {wire_type}")
+        if pos > len(buf):
+            raise schemas.SchemaError("Protobuf", (number,), "is truncated")
+        fields.setdefault(number, []).append(value)
+    return fields
+
+
+def _string(fields, number, default=""):
+    values = fields.get(number)
+    return values[-1].decode() if values else default
+
+
+def _coin(buf, scale=1):
+    # cosmos.base.v1beta1.Coin / DecCoin: denom = 1, amount = 2
+    fields = decode_message(buf)
+    amount = schemas.as_int("Coin", _string(fields, 2, "0"), 'amount')
+    return schemas.Coin(denom=_string(fields, 1), amount=amount // scale)
+
+
+def _page_request(key, limit):
+    # cosmos.base.query.v1beta1.PageRequest: key = 1, limit = 3
+    return encode_message((1, key), (3, limit))
+
+
+def _next_key(fields, number):
+    # cosmos.base.query.v1beta1.PageResponse: next_key = 1
+    page = fields.get(number)
+    if not page:
+        return None
+    return decode_message(page[-1]).get(1, [None])[-1] or None
+
+
+def parse_target(target):
+    """Split `target` ("grpcs://host:port", "grpc://host:port" or "host:port") into (host:port, use TLS)."""
+    scheme, sep, address = target.partition("://")
+    if sep:
+        if scheme not in ("grpc", "grpcs"):
+            raise ValueError(f"Unsupported gRPC scheme in {target!r}; use grpc:// or grpcs://")
+        return address, scheme == "grpcs"
+    if TLS is not None:
+        return target, TLS == "1"
+    return target, target.endswith(":443")
+
+
+def get_channel(target):
+    """Return the shared channel for `target` (see parse_target).
+
+    One HTTP/2 channel per node carries every concurrent call to it.
+    """
+    if grpc is None:
+        raise RuntimeError("grpcio is not installed; run `pip install grpcio` or use COSMOS_TRANSPORT=rest")
+    with _channels_lock:
+        channel = _channels.get(target)
+        if channel is None:
+            address, tls = parse_target(target)
+            if tls:
+                channel = grpc.secure_channel(address, grpc.ssl_channel_credentials())
+            else:
+                channel = grpc.insecure_channel(address)
+            _channels[target] = channel
+        return channel
+
+
+class CosmosGrpcClient:
+    """Bank, staking and distribution queries over gRPC.
+
+    Same interface as cosmos.CosmosRestClient. Raises grpc.RpcError on
+    transport errors and SchemaError on malformed messages.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.channel = get_channel(target)
+
+    def _call(self, method, request):
+        endpoint = method.rsplit("/", 1)[1]
+        # No serializers: requests and responses are passed as raw bytes
+        stub = self.channel.unary_unary(method)
+        start = time.perf_counter()
+        try:
+            response = stub(request, timeout=TIMEOUT)
+        except grpc.RpcError as e:
+            metrics.record("cosmos-grpc", endpoint, None, time.perf_counter() - start, 0, error=e.code().name)
+            raise
+        metrics.record("cosmos-grpc", endpoint, "OK", time.perf_counter() - start, len(response))
+        return decode_message(response)
+
+    def _paged(self, method, address, limit):
+        key = None
+        while True:
+            fields = self._call(method, encode_message((1, address), (2, _page_request(key, limit))))
+            yield fields
+            key = _next_key(fields, 2)
+            if not key:
+                return
+
+    def bank_balances(self, address, page_limit=200):
+        """Yield every bank balance of an address."""
+        for fields in self._paged(BANK_ALL_BALANCES, address, page_limit):
+            for coin in fields.get(1, []):
+                yield _coin(coin)
+
+    def delegations(self, address):
+        """Return the delegations of an address."""
+        delegations = []
+        for fields in self._paged(STAKING_DELEGATOR_DELEGATIONS, address, 200):
+            # DelegationResponse: delegation = 1 (validator_address = 2), balance = 2
+            for response in fields.get(1, []):
+                entry = decode_message(response)
+                delegation = decode_message(entry.get(1, [b""])[-1])
+                balance = _coin(entry.get(2, [b""])[-1])
+                delegations.append(schemas.Delegation(validator_address=_string(delegation, 2), amount=balance.amount))
+        return delegations
+
+    def rewards(self, address):
+        """Return the total pending rewards of an address, in base units."""
+        fields = self._call(DISTRIBUTION_TOTAL_REWARDS, encode_message((1, address)))
+        # total = 2, a list of DecCoins
+        return [_coin(coin, DEC_PRECISION) for coin in fields.get(2, [])]
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import argparse
+import threading
+
+import requests
+
+import metrics
+import schemas
+
+DEXSCREENER_TOKENS_URL = "https://api.dexscreener.com/tokens/v1/{chain}/{token}"
+DEXSCREENER_SEARCH_URL = "https://api.dexscreener.com/latest/dex/tokens/{token}"
+DEXSCREENER_PAIRS_URL = "https://api.dexscreener.com/latest/dex/pairs/{chain}/{pair}"
+
+CACHE_FOLDER = ".cache"
+PAIR_INDEX_FILE = os.path.join(CACHE_FOLDER, "dex_pairs.json")
+RERANK_INTERVAL = int(os.getenv("DEX_RERANK_INTERVAL", "86400"))  # seconds before a token's pairs are ranked again
+REQUEST_TIMEOUT = 10
+
+_lock = threading.Lock()
+_index = None  # "<chain>:<token>" -> {"chain", "pair", "liquidity", "volume", "ranked_at"}
+
+
+def _key(token, chain):
+    return f"{chain or 'any'}:{token}"
+
+
+def _load_index():
+    global _index
+    if _index is None:
+        try:
+            with open(PAIR_INDEX_FILE) as f:
+                _index = json.load(f)
+        except (OSError, ValueError):
+            _index = {}
+    return _index
+
+
+def _save_index():
+    """Write the index atomically; shards and the server share it."""
+    tmp_path = f"{PAIR_INDEX_FILE}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_FOLDER, exist_ok=True)
+        with open(tmp_path, mode='w') as f:
+            json.dump(_index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, PAIR_INDEX_FILE)
+    except OSError as e:
+        print(f"\nError writing {PAIR_INDEX_FILE}: {e}")
+
+
+def _get_pairs(endpoint, url):
+    response = metrics.get("dexscreener", endpoint, url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return schemas.DexPair.list_from_json(schemas.loads(response.content))
+
+
+def best_pair(pairs, token):
+    """The most liquid pair (24h volume breaks ties) that prices `token`.
+
+    Dexscreener also lists pairs where `token` is the quote side, whose
+    price is the other token's; those only count when nothing else does.
+    """
+    based = [pair for pair in pairs if pair.base_address.lower() == token.lower()]
+    return max(based or pairs, key=lambda pair: (pair.liquidity_usd, pair.volume_h24), default=None)
+
+
+def rank(token, chain=None):
+    """Look up every pair of `token`, index the best one and return it (or None)."""
+    if chain:
+        pairs = _get_pairs("tokens", DEXSCREENER_TOKENS_URL.format(chain=chain, token=token))
+    else:
+        pairs = _get_pairs("latest/dex/tokens", DEXSCREENER_SEARCH_URL.format(token=token))
+    pair = best_pair(pairs, token)
+    if pair is None:
+        return None
+
+    with _lock:
+        _load_index()[_key(token, chain)] = {
+            "chain": pair.chain_id or chain,
+            "pair": pair.pair_address,
+            "liquidity": pair.liquidity_usd,
+            "volume": pair.volume_h24,
+            "ranked_at": time.time()
+        }
+        _save_index()
+    return pair
+
+
+def get_pair(token, chain=None):
+    """Return the best DexPair of `token` on `chain` (any chain when None), or None.
+
+    The first lookup ranks all of the token's pairs and remembers the best
+    one in PAIR_INDEX_FILE. Later lookups query only that pair, which is a
+    much smaller response, until the entry is RERANK_INTERVAL seconds old.
+    Raises requests.RequestException or ValueError like the endpoints do.
+    """
+    with _lock:
+        entry = _load_index().get(_key(token, chain))
+    fresh = entry is not None and time.time() - entry["ranked_at"] < RERANK_INTERVAL
+    metrics.record_cache("dexscreener", "pair-index", fresh)
+
+    if fresh:
+        pairs = _get_pairs("latest/dex/pairs", DEXSCREENER_PAIRS_URL.format(chain=entry["chain"], pair=entry["pair"]))
+        if pairs:
+            return pairs[0]
+        # The pair is gone (delisted or migrated); rank again
+    return rank(token, chain)
+
+
+def get_price(token, chain=None):
+    """Return the USD price of `token` from its best pair, or 0.0 when it has none."""
+    pair = get_pair(token, chain)
+    return pair.price_usd if pair is not None else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-rank the indexed Dexscreener pairs, e.g. from cron.")
+    parser.add_argument("--all", action="store_true", help="re-rank every entry, not only the stale ones")
+    args = parser.parse_args()
+
+    entries = dict(_load_index())
+    now = time.time()
+    for key, entry in sorted(entries.items()):
+        if not args.all and now - entry["ranked_at"] < RERANK_INTERVAL:
+            continue
+        chain, token = key.split(":", 1)
+        try:
+            pair = rank(token, None if chain == "any" else chain)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Error ranking {key}: {e}")
+            continue
+        if pair is None:
+            print(f"{key}: no pairs")
+        elif pair.pair_address != entry["pair"]:
+            print(f"{key}: {entry['pair']} -> {pair.pair_address} (liquidity {pair.liquidity_usd:,.0f} USD)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import os
+import sys
+import glob
+import json
+import argparse
+from operator import attrgetter
+from typing import NamedTuple, Optional
+
+import snapshot
+from portfolio import SNAPSHOTS_FOLDER
+
+# Position fields identifying a holding across runs. The address (mint,
+# coin type, denom, ...) identifies the asset; symbols aren't unique (every
+# unpriced Solana mint is "UNKNOWN") and are only carried for display.
+ASSET_KEY = ("chain", "wallet", "address")
+DETAIL_KEY = ("chain", "wallet", "asset", "category", "address")
+
+BALANCE_EPSILON = 1e-9  # relative balance change treated as unchanged (float noise)
+
+
+class Holding(NamedTuple):
+    balance: float
+    value: float
+    asset: str = ""  # display symbol
+
+    @property
+    def price(self):
+        return self.value / self.balance if self.balance else 0.0
+
+
+class Change(NamedTuple):
+    key: tuple
+    status: str  # "added", "removed", "changed" or "unchanged"
+    before: Optional[Holding]
+    after: Optional[Holding]
+
+    @property
+    def balance_delta(self):
+        return (self.after.balance if self.after else 0.0) - (self.before.balance if self.before else 0.0)
+
+    @property
+    def value_delta(self):
+        return (self.after.value if self.after else 0.0) - (self.before.value if self.before else 0.0)
+
+    @property
+    def asset(self):
+        return (self.after or self.before).asset
+
+    def label(self, key_fields):
+        parts = dict(zip(key_fields, self.key))
+        parts.setdefault("asset", self.asset)
+        return " / ".join(str(parts[name]) for name in ("chain", "wallet", "asset", "category", "address") if name in parts and parts[name] != "")
+
+    def record(self, key_fields):
+        """Return the change as a JSON-ready dict."""
+        record = dict(zip(key_fields, self.key))
+        record.setdefault("asset", self.asset)
+        record.update({
+            "status": self.status,
+            "balance_before": self.before.balance if self.before else None,
+            "balance_after": self.after.balance if self.after else None,
+            "balance_delta": self.balance_delta,
+            "price_before": self.before.price if self.before else None,
+            "price_after": self.after.price if self.after else None,
+            "value_before": self.before.value if self.before else None,
+            "value_after": self.after.value if self.after else None,
+            "value_delta": self.value_delta
+        })
+        return record
+
+
+def index(positions, key_fields=ASSET_KEY):
+    """Index positions by `key_fields`, summing holdings that share a key.
+
+    With ASSET_KEY, an asset split over categories (spendable, staked, ...)
+    under the same address counts as one holding. Stakes recorded under
+    their pool or validator address stay separate holdings.
+    """
+    holdings = {}
+    key_of = attrgetter(*key_fields)
+    for position in positions:
+        key = key_of(position)
+        holding = holdings.get(key)
+        if holding is None:
+            holdings[key] = Holding(position.balance, position.value, position.asset)
+        else:
+            holdings[key] = Holding(holding.balance + position.balance, holding.value + position.value, holding.asset)
+    return holdings
+
+
+def _changed(before, after, min_value_delta):
+    scale = max(abs(before.balance), abs(after.balance))
+    if abs(after.balance - before.balance) > BALANCE_EPSILON * scale:
+        return True
+    return abs(after.value - before.value) > min_value_delta
+
+
+def diff(old, new, key_fields=ASSET_KEY, min_value_delta=0.0, include_unchanged=False):
+    """Yield the Changes between two snapshots (iterables of Positions).
+
+    Both sides are indexed by key in one pass each, and the new side is
+    hash-joined against the old one, so the cost is linear in the number
+    of positions. Value-only moves (price changes) below `min_value_delta`
+    USD count as unchanged.
+    """
+    before = index(old, key_fields)
+    after = index(new, key_fields)
+
+    for key, holding in after.items():
+        previous = before.get(key)
+        if previous is None:
+            yield Change(key, "added", None, holding)
+        elif _changed(previous, holding, min_value_delta):
+            yield Change(key, "changed", previous, holding)
+        elif include_unchanged:
+            yield Change(key, "unchanged", previous, holding)
+
+    for key, holding in before.items():
+        if key not in after:
+            yield Change(key, "removed", holding, None)
+
+
+def latest_snapshots(folder=SNAPSHOTS_FOLDER, count=2):
+    """Return the `count` most recent snapshot paths, oldest first."""
+    paths = sorted(glob.glob(os.path.join(folder, "*.jsonl")), key=os.path.getmtime)
+    return paths[-count:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show what changed between two portfolio snapshots.")
+    parser.add_argument("snapshots", nargs="*", help="old and new snapshot (default: the two newest in reports/snapshots)")
+    parser.add_argument("--detail", action="store_true", help="compare per category and address instead of per asset")
+    parser.add_argument("--min-value-delta", type=float, default=0.01, help="ignore value moves below this many USD")
+    parser.add_argument("--all", action="store_true", help="also list unchanged holdings")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text")
+    args = parser.parse_args()
+
+    paths = args.snapshots or latest_snapshots()
+    if len(paths) != 2:
+        parser.error("need exactly two snapshots to compare")
+
+    key_fields = DETAIL_KEY if args.detail else ASSET_KEY
+    try:
+        changes = list(diff(snapshot.read(paths[0]), snapshot.read(paths[1]), key_fields, args.min_value_delta, args.all))
+    except (OSError, ValueError) as e:
+        print(f"Error reading snapshots: {e}")
+        return
+
+    if args.format == "jsonl":
+        for change in changes:
+            sys.stdout.write(json.dumps(change.record(key_fields)) + "\n")
+        return
+
+    print(f"{os.path.basename(paths[0])} -> {os.path.basename(paths[1])}")
+    for change in sorted(changes, key=lambda change: abs(change.value_delta), reverse=True):
+        print(f"{change.status:>9}  {change.label(key_fields)}: balance {change.balance_delta:+.6f}, value {change.value_delta:+.2f} USD")
+    total = sum(change.value_delta for change in changes)
+    print(f"{len(changes)} changes, net value {total:+.2f} USD")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,28 @@
 import os
-import requests
 import csv
 from datetime import datetime
 from dotenv import load_dotenv
-import time
-import threading
+
+import cosmos
+import metrics
+import prices
+import schemas
+import snapshot
+from progress import Progress
 
 load_dotenv()
 
 DYDX_REST_API_URL = "https://dydx-rest.publicnode.com"
-DEXSCREENER_API_URL = "https://api.dexscreener.com/latest/dex/tokens/0x92D6C1e31e14520e676a687F0a93788B716BEff5"
 REPORTS_FOLDER = "reports"
+CATEGORIES = ("spendable", "staked", "rewards")  # position categories returned by collect()
 WALLET_ADDRESS = "dydx1qmz8gw2ddh50x0nl4crejwr4vd67498racmrkl"
 
 DECIMALS = 10**18
-loading = True
-
 
-def show_loading(message):
-    global loading
-    dots = 0
-    while loading:
-        print(f"\r{message}{'.' * (dots % 4)}", end='', flush=True)
-        dots += 1
-        time.sleep(0.5)
-    print(f"\r{message}...", end='', flush=True)
+PRICE_SOURCES = (
+    prices.dexscreener_source("0x92D6C1e31e14520e676a687F0a93788B716BEff5"),
+    prices.coingecko_source("dydx-chain")
+)
 
 
 def safe_float(value, default=0.0):
@@ -36,53 +34,41 @@ def safe_float(value, default=0.0):
 
 def fetch_account_balances(wallet_address):
     try:
-        response = requests.get(f"{DYDX_REST_API_URL}/cosmos/bank/v1beta1/balances/{wallet_address}")
-        response.raise_for_status()
-        return response.json().get('balances', [])
-    except requests.RequestException as e:
+        return list(cosmos.get_client("dydx", DYDX_REST_API_URL).bank_balances(wallet_address))
+    except cosmos.TRANSPORT_ERRORS as e:
         print(f"Error fetching balances: {e}")
         return []
+    except ValueError as e:
+        print(f"Error parsing balances: {e}")
+        return []
 
 
 def fetch_account_rewards(wallet_address):
     try:
-        response = requests.get(f"{DYDX_REST_API_URL}/cosmos/distribution/v1beta1/delegators/{wallet_address}/rewards")
-        response.raise_for_status()
-        return response.json().get('total', [])
-    except requests.RequestException as e:
+        return cosmos.get_client("dydx", DYDX_REST_API_URL).rewards(wallet_address)
+    except cosmos.TRANSPORT_ERRORS as e:
         print(f"Error fetching rewards: {e}")
         return []
+    except ValueError as e:
+        print(f"Error parsing rewards: {e}")
+        return []
 
 
 def fetch_account_delegations(wallet_address):
     try:
-        response = requests.get(f"{DYDX_REST_API_URL}/cosmos/staking/v1beta1/delegations/{wallet_address}")
-        response.raise_for_status()
-        delegations = response.json().get('delegation_responses', [])
-        if delegations:
-            return delegations[0].get('balance', {}).get('amount', "0")
-        return "0"
-    except requests.RequestException as e:
+        delegations = cosmos.get_client("dydx", DYDX_REST_API_URL).delegations(wallet_address)
+        return sum(delegation.amount for delegation in delegations)
+    except cosmos.TRANSPORT_ERRORS as e:
         print(f"Error fetching delegations: {e}")
-        return "0"
+        return 0
+    except ValueError as e:
+        print(f"Error parsing delegations: {e}")
+        return 0
 
 
 def fetch_dydx_price():
-    """Fetch the current price of DYDX in USD from Dexscreener."""
-    try:
-        response = requests.get(DEXSCREENER_API_URL)
-        response.raise_for_status()
-        data = response.json()
-
-        for pair in data.get('pairs', []):
-            if pair['pairAddress'].lower() == '0xe0cfa17aa9b8f930fd936633c0252d5cb745c2c3'.lower():
-                return safe_float(pair['priceUsd'])
-
-        print("Error: No matching pair found for the given address.")
-        return 0.0
-    except requests.RequestException as e:
-        print(f"Error fetching DYDX price: {e}")
-        return 0.0
+    """Fetch the current price of DYDX in USD from the fastest healthy price source."""
+    return prices.get_price("DYDX", PRICE_SOURCES)
 
 
 def convert_to_dydx(value):
@@ -90,15 +76,23 @@ def convert_to_dydx(value):
     return safe_float(value) / DECIMALS
 
 
-def get_wallet_balance_data():
-    """Extract and calculate wallet balance data."""
+def get_wallet_balance_data(progress):
+    """Extract and calculate wallet balance data.
+
+    Returns the native row and the Positions of every other denom held or earned.
+    """
+    progress.plan(4)
     balances = fetch_account_balances(WALLET_ADDRESS)
+    progress.advance()
     rewards = fetch_account_rewards(WALLET_ADDRESS)
+    progress.advance()
     delegated_balance = fetch_account_delegations(WALLET_ADDRESS)
+    progress.advance()
     dydx_price = fetch_dydx_price()
+    progress.advance()
 
-    spendable_balance_raw = next((item['amount'] for item in balances if item['denom'] == 'adydx'), "0")
-    reward_balance_raw = next((item['amount'] for item in rewards if item['denom'] == 'adydx'), "0")
+    spendable_balance_raw = schemas.amount_of(balances, 'adydx')
+    reward_balance_raw = schemas.amount_of(rewards, 'adydx')
 
     spendable_balance = convert_to_dydx(spendable_balance_raw)
     delegated_balance = convert_to_dydx(delegated_balance)
@@ -109,6 +103,11 @@ def get_wallet_balance_data():
     reward_balance_value = reward_balance * dydx_price
 
 
+    others = (
+        cosmos.value_other_denoms("dydx", WALLET_ADDRESS, balances, "spendable", DYDX_REST_API_URL) +
+        cosmos.value_other_denoms("dydx", WALLET_ADDRESS, rewards, "rewards", DYDX_REST_API_URL)
+    )
+
     return {
         "Wallet Address": WALLET_ADDRESS,
         "dydx Price (USD)": f"{dydx_price:.4f}",
@@ -118,11 +117,11 @@ def get_wallet_balance_data():
         "Delegated Value (USD)": f"{delegated_balance_value:.4f}",
         "Reward (dydx)": f"{reward_balance:.6f}",
         "Reward Value (USD)": f"{reward_balance_value:.4f}"
-    }
+    }, others
 
 
-def export_to_csv(data, filename):
-    """Export the results to a CSV file."""
+def export_to_csv(data, filename, others=()):
+    """Export the results to a CSV file, with other denoms (Positions) listed below."""
     try:
         os.makedirs(REPORTS_FOLDER, exist_ok=True)
 
@@ -138,29 +137,54 @@ def export_to_csv(data, filename):
             writer.writeheader()
 
             writer.writerow(data)
+            cosmos.export_other_denoms(csvfile, others)
 
         print(f"\nData successfully exported to {file_path}")
     except Exception as e:
         print(f"\nError exporting to CSV: {e}")
 
 
+def collect(wallet_address, categories=CATEGORIES):
+    """Return the valued positions of one wallet (see snapshot.Position).
+
+    Each category is its own query, so only the requested ones are fetched.
+    Balances and rewards in other denoms are valued too (see cosmos.value_other_denoms).
+    """
+    price = snapshot.cached_price("dydx", fetch_dydx_price)
+    fetchers = {
+        "spendable": lambda: fetch_account_balances(wallet_address),
+        "staked": lambda: [schemas.Coin('adydx', fetch_account_delegations(wallet_address))],
+        "rewards": lambda: fetch_account_rewards(wallet_address)
+    }
+    positions = []
+    for category in CATEGORIES:
+        if category in categories:
+            coins = fetchers[category]()
+            raw = int(schemas.amount_of(coins, 'adydx'))
+            positions.append(snapshot.Position.of(
+                "dydx", wallet_address, "DYDX", "adydx", category, convert_to_dydx(raw), price, 18, raw, f"cosmos-{cosmos.transport()}"
+            ))
+            positions.extend(cosmos.value_other_denoms("dydx", wallet_address, coins, category, DYDX_REST_API_URL))
+    return positions
+
+
 def main():
     """Main function to execute the script."""
-    global loading
-
     print("Running...")
-    loading_thread = threading.Thread(target=show_loading, args=("Fetching data",))
-    loading_thread.start()
 
-    wallet_data = get_wallet_balance_data()
+    progress = Progress("DYDX")
+    progress.stage("Fetching data")
 
-    loading = False
-    loading_thread.join()
+    wallet_data, others = get_wallet_balance_data(progress)
+
+    progress.finish()
 
     if wallet_data:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"DYDX_Wallet_{timestamp}.csv"
-        export_to_csv(wallet_data, filename)
+        export_to_csv(wallet_data, filename, others)
+
+    metrics.export_trace("DYDX")
 
     print("Done!")
 
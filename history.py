@@ -0,0 +1,324 @@
+import os
+import csv
+import json
+import math
+import time
+import glob
+import argparse
+from array import array
+from operator import add, mul
+from datetime import date, datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import chains
+import coingecko
+import snapshot
+from portfolio import REPORTS_FOLDER, SNAPSHOTS_FOLDER
+
+HISTORY_FOLDER = os.path.join(".cache", "price_history")
+CHUNK_DAYS = 365  # days per history request (CoinGecko returns daily points above 90)
+CONCURRENCY = 4
+
+NAN = float("nan")
+
+
+class PriceSeries:
+    """Daily USD prices of one asset, stored densely by day.
+
+    `prices[i]` is the price on day `start + i` (a date ordinal), NaN where
+    unknown, so a date range is a single slice.
+    """
+
+    def __init__(self, start=None, prices=()):
+        self.start = start
+        self.prices = array('d', prices)
+
+    @property
+    def end(self):
+        return self.start + len(self.prices) - 1 if self.start is not None else None
+
+    def set(self, day, price):
+        if self.start is None:
+            self.start = day
+        if day < self.start:
+            self.prices[:0] = array('d', [NAN]) * (self.start - day)
+            self.start = day
+        elif day > self.end:
+            self.prices.extend(array('d', [NAN]) * (day - self.end))
+        self.prices[day - self.start] = price
+
+    def window(self, first, last):
+        """Prices for days first..last inclusive, NaN outside the stored range."""
+        if self.start is None:
+            return array('d', [NAN]) * (last - first + 1)
+        lo, hi = max(first, self.start), min(last, self.end)
+        before = array('d', [NAN]) * max(0, min(self.start, last + 1) - first)
+        inside = self.prices[lo - self.start:hi - self.start + 1] if lo <= hi else array('d')
+        after = array('d', [NAN]) * max(0, last - max(self.end, first - 1))
+        return before + inside + after
+
+    def missing(self, first, last):
+        """Yield (first, last) runs of days without a price."""
+        run = None
+        for offset, price in enumerate(self.window(first, last)):
+            day = first + offset
+            if math.isnan(price):
+                run = (run[0], day) if run else (day, day)
+            elif run:
+                yield run
+                run = None
+        if run:
+            yield run
+
+    @classmethod
+    def load(cls, path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls()
+        return cls(date.fromisoformat(data["start"]).toordinal(), (NAN if p is None else p for p in data["prices"]))
+
+    def save(self, path):
+        """Write the series atomically."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, mode='w') as f:
+            json.dump({
+                "start": date.fromordinal(self.start).isoformat(),
+                "prices": [None if math.isnan(p) else p for p in self.prices]
+            }, f)
+        os.replace(tmp_path, path)
+
+
+def series_path(chain, asset):
+    return os.path.join(HISTORY_FOLDER, f"{chain}_{asset}.json")
+
+
+def _day(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).date().toordinal()
+
+
+def _timestamp(day):
+    return datetime.combine(date.fromordinal(day), datetime.min.time(), timezone.utc).timestamp()
+
+
+def _sources(chain, asset):
+    """History fetchers for an asset, as fetch(start, end) -> PricePoints, preferred first."""
+    sources = []
+    registered = chains.REGISTRY.get(chain)
+    if registered is None or asset != registered.asset:
+        return sources
+    if registered.coingecko_id:
+        sources.append(("coingecko", lambda start, end: coingecko.get_market_chart(registered.coingecko_id, start, end)))
+    if chain == "tao":
+        sources.append(("taostats", chains.load("tao").fetch_tao_price_history))
+    return sources
+
+
+def backfill(chain, asset, first, last):
+    """Fetch the missing daily prices of one asset between two day ordinals.
+
+    Only gaps are requested, in CHUNK_DAYS ranges; days a source can't
+    fill are tried on the next source. The last point of each UTC day is
+    its price. Returns the number of days filled.
+    """
+    path = series_path(chain, asset)
+    series = PriceSeries.load(path)
+    filled = 0
+    for name, fetch in _sources(chain, asset):
+        for run_first, run_last in list(series.missing(first, last)):
+            for chunk_first in range(run_first, run_last + 1, CHUNK_DAYS):
+                chunk_last = min(chunk_first + CHUNK_DAYS - 1, run_last)
+                try:
+                    points = fetch(_timestamp(chunk_first), _timestamp(chunk_last + 1))
+                except requests.RequestException as e:
+                    print(f"Error fetching {asset} history from {name}: {e}")
+                    continue
+                except ValueError as e:
+                    print(f"Error parsing {asset} history from {name}: {e}")
+                    continue
+                for point in sorted(points):
+                    day = _day(point.timestamp)
+                    if chunk_first <= day <= chunk_last and point.price > 0:
+                        filled += math.isnan(series.window(day, day)[0])
+                        series.set(day, point.price)
+    if series.start is not None:
+        try:
+            series.save(path)
+        except OSError as e:
+            print(f"Error writing {path}: {e}")
+    return filled
+
+
+# Categories only the native asset is held in (stakes, rewards, storage deposits)
+NATIVE_CATEGORIES = ("staked", "unstaked", "rewards", "storage")
+
+
+def holding_key(position):
+    """(chain, asset) for the native asset, whose history is stored by symbol, else (chain, address).
+
+    Tokens are told apart by address, like diff.ASSET_KEY, so two mints
+    sharing a symbol are never merged or priced alike.
+    """
+    registered = chains.REGISTRY.get(position.chain)
+    if registered is not None and position.asset == registered.asset and (
+            position.address == registered.address or position.category in NATIVE_CATEGORIES):
+        return (position.chain, registered.asset)
+    return (position.chain, position.address)
+
+
+def load_holdings(paths):
+    """Read snapshots into per-day balances and prices.
+
+    Returns ({key: {day: balance}}, {key: {day: price}}) keyed by holding_key.
+    A snapshot sets the balances of every chain it covers (assets of that
+    chain it doesn't list drop to zero); later snapshots on the same day win.
+    Zero prices (failed lookups) are skipped.
+    """
+    runs = []
+    for path in paths:
+        positions = list(snapshot.read(path))
+        if positions:
+            runs.append((max(position.timestamp for position in positions), positions))
+
+    balances, prices = {}, {}
+    held = {}  # chain -> assets held after the previous snapshot
+    for timestamp, positions in sorted(runs, key=lambda run: run[0]):
+        day = datetime.fromisoformat(timestamp).date().toordinal()
+        totals = {}
+        for position in positions:
+            key = holding_key(position)
+            totals[key] = totals.get(key, 0.0) + position.balance
+            if position.price:
+                prices.setdefault(key, {})[day] = position.price
+        for chain in {position.chain for position in positions}:
+            for key in held.get(chain, ()):
+                totals.setdefault(key, 0.0)
+            held[chain] = {key for key in totals if key[0] == chain}
+        for key, balance in totals.items():
+            balances.setdefault(key, {})[day] = balance
+    return balances, prices
+
+
+def _column(points, first, last, fill_forward=True):
+    """A dense column for days first..last from sparse {day: value}, forward-filled.
+
+    The last value before `first` carries into the range; days before the
+    first known value are NaN.
+    """
+    column = array('d', [NAN]) * (last - first + 1)
+    days = sorted(points)
+    carried = NAN
+    for day in days:
+        if day < first:
+            carried = points[day]
+        elif day <= last:
+            column[day - first] = points[day]
+    if fill_forward:
+        for i, value in enumerate(column):
+            if math.isnan(value):
+                column[i] = carried
+            else:
+                carried = value
+    return column
+
+
+def value(balances, prices, first, last):
+    """Value every day from `first` to `last` (date ordinals) in one pass per asset.
+
+    Each asset's balances and prices become dense day columns, which are
+    multiplied element-wise and summed into per-chain columns. Prices come
+    from the stored history, with snapshot prices filling its gaps, and
+    are carried forward over days neither covers.
+
+    Returns ({chain: array of daily values}, {holding key: unpriced days}).
+    """
+    totals, unpriced = {}, {}
+    for key, points in balances.items():
+        chain, asset = key
+        balance = _column(points, first, last)
+        history = PriceSeries.load(series_path(chain, asset)).window(first, last)
+        observed = _column(prices.get(key, {}), first, last, fill_forward=False)
+        known = {day: p for day, p in prices.get(key, {}).items() if day < first}
+        known.update((first + i, p) for i, p in enumerate(map(_prefer, history, observed)) if not math.isnan(p))
+        price = _column(known, first, last)
+        values = array('d', map(mul, balance, price))
+        missing = sum(1 for b, v in zip(balance, values) if b and not math.isnan(b) and math.isnan(v))
+        if missing:
+            unpriced[key] = missing
+        values = array('d', (0.0 if math.isnan(v) else v for v in values))
+        totals[chain] = array('d', map(add, totals[chain], values)) if chain in totals else values
+    return totals, unpriced
+
+
+def _prefer(history, observed):
+    return observed if math.isnan(history) else history
+
+
+def export_to_csv(totals, first, filename):
+    """Write one row per day with per-chain and total values."""
+    names = sorted(totals)
+    file_path = os.path.join(REPORTS_FOLDER, filename)
+    try:
+        os.makedirs(REPORTS_FOLDER, exist_ok=True)
+        with open(file_path, mode='w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["Date"] + [f"{name} (USD)" for name in names] + ["Total Value (USD)"])
+            columns = [totals[name] for name in names]
+            for offset, row in enumerate(zip(*columns)):
+                writer.writerow([date.fromordinal(first + offset).isoformat()] + [f"{v:.2f}" for v in row] + [f"{sum(row):.2f}"])
+        print(f"\nData successfully exported to {file_path}")
+    except OSError as e:
+        print(f"\nError exporting to CSV: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill daily prices and revalue past snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fill = commands.add_parser("backfill", help="fetch missing daily prices into the local store")
+    fill.add_argument("--days", type=int, default=365, help="how far back to fill (default 365)")
+    fill.add_argument("--assets", nargs="+", metavar="CHAIN:ASSET", help="default: every native asset")
+
+    revalue = commands.add_parser("value", help="value snapshot holdings for every day of a range")
+    revalue.add_argument("snapshots", nargs="*", help=f"snapshot files (default: all in {SNAPSHOTS_FOLDER})")
+    revalue.add_argument("--from", dest="first", type=date.fromisoformat, help="first day (default: the first snapshot)")
+    revalue.add_argument("--to", dest="last", type=date.fromisoformat, help="last day (default: today)")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        assets = [tuple(spec.split(":", 1)) for spec in args.assets] if args.assets else [(c.id, c.asset) for c in chains.REGISTRY.values() if c.coingecko_id]
+        last = date.today().toordinal() - 1  # today's price isn't final yet
+        first = last - args.days + 1
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+            filled = executor.map(lambda key: backfill(*key, first, last), assets)
+            for (chain, asset), days in zip(assets, filled):
+                print(f"{chain} {asset}: {days} days filled")
+        return
+
+    paths = args.snapshots or sorted(glob.glob(os.path.join(SNAPSHOTS_FOLDER, "*.jsonl")))
+    try:
+        balances, prices = load_holdings(paths)
+    except (OSError, ValueError) as e:
+        print(f"Error reading snapshots: {e}")
+        return
+    if not balances:
+        print("No holdings found in the snapshots")
+        return
+
+    first = args.first.toordinal() if args.first else min(min(points) for points in balances.values())
+    last = args.last.toordinal() if args.last else date.today().toordinal()
+    started = time.perf_counter()
+    totals, unpriced = value(balances, prices, first, last)
+    print(f"Valued {len(balances)} assets over {last - first + 1} days in {time.perf_counter() - started:.3f}s")
+    for (chain, asset), days in sorted(unpriced.items()):
+        print(f"Warning: no price for {chain} {asset} on {days} held days (valued at 0)")
+
+    export_to_csv(totals, first, f"History_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+
+
+if __name__ == "__main__":
+    main()
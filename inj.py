@@ -1,30 +1,28 @@
 import os
-import requests
 import csv
 from datetime import datetime
 from dotenv import load_dotenv
-import time
-import threading
+
+import cosmos
+import metrics
+import prices
+import schemas
+import snapshot
+from progress import Progress
 
 load_dotenv()
 
 INJECTIVE_REST_API_URL = "https://injective-rest.publicnode.com"
-DEXSCREENER_API_URL = "https://api.dexscreener.com/latest/dex/tokens/inj"
 REPORTS_FOLDER = "reports"
+CATEGORIES = ("spendable", "staked", "rewards")  # position categories returned by collect()
 WALLET_ADDRESS = "inj1ukryjeq858umfds09jfmkd9csmjpuns7n3540f"
 
 DECIMALS = 10**18
-loading = True
-
 
-def show_loading(message):
-    global loading
-    dots = 0
-    while loading:
-        print(f"\r{message}{'.' * (dots % 4)}", end='', flush=True)
-        dots += 1
-        time.sleep(0.5)
-    print(f"\r{message}...", end='', flush=True)
+PRICE_SOURCES = (
+    prices.dexscreener_source("inj"),
+    prices.coingecko_source("injective-protocol")
+)
 
 
 def safe_float(value, default=0.0):
@@ -36,53 +34,41 @@ def safe_float(value, default=0.0):
 
 def fetch_account_balances(wallet_address):
     try:
-        response = requests.get(f"{INJECTIVE_REST_API_URL}/cosmos/bank/v1beta1/balances/{wallet_address}")
-        response.raise_for_status()
-        return response.json().get('balances', [])
-    except requests.RequestException as e:
+        return list(cosmos.get_client("inj", INJECTIVE_REST_API_URL).bank_balances(wallet_address))
+    except cosmos.TRANSPORT_ERRORS as e:
         print(f"Error fetching balances: {e}")
         return []
+    except ValueError as e:
+        print(f"Error parsing balances: {e}")
+        return []
 
 
 def fetch_account_rewards(wallet_address):
     try:
-        response = requests.get(f"{INJECTIVE_REST_API_URL}/cosmos/distribution/v1beta1/delegators/{wallet_address}/rewards")
-        response.raise_for_status()
-        return response.json().get('total', [])
-    except requests.RequestException as e:
+        return cosmos.get_client("inj", INJECTIVE_REST_API_URL).rewards(wallet_address)
+    except cosmos.TRANSPORT_ERRORS as e:
         print(f"Error fetching rewards: {e}")
         return []
+    except ValueError as e:
+        print(f"Error parsing rewards: {e}")
+        return []
 
 
 def fetch_account_delegations(wallet_address):
     try:
-        response = requests.get(f"{INJECTIVE_REST_API_URL}/cosmos/staking/v1beta1/delegations/{wallet_address}")
-        response.raise_for_status()
-        delegations = response.json().get('delegation_responses', [])
-        if delegations:
-            return delegations[0].get('balance', {}).get('amount', "0")
-        return "0"
-    except requests.RequestException as e:
+        delegations = cosmos.get_client("inj", INJECTIVE_REST_API_URL).delegations(wallet_address)
+        return sum(delegation.amount for delegation in delegations)
+    except cosmos.TRANSPORT_ERRORS as e:
         print(f"Error fetching delegations: {e}")
-        return "0"
+        return 0
+    except ValueError as e:
+        print(f"Error parsing delegations: {e}")
+        return 0
 
 
 def fetch_inj_price():
-    """Fetch the current price of INJ in USD from Dexscreener."""
-    try:
-        response = requests.get(DEXSCREENER_API_URL)
-        response.raise_for_status()
-        data = response.json()
-
-        for pair in data.get('pairs', []):
-            if pair['pairAddress'].lower() == 'inj1h0mpv48ctcsmydymh2hnkal7hla5gl4gftemqv'.lower():
-                return safe_float(pair['priceUsd'])
-
-        print("Error: No matching pair found for the given address.")
-        return 0.0
-    except requests.RequestException as e:
-        print(f"Error fetching INJ price: {e}")
-        return 0.0
+    """Fetch the current price of INJ in USD from the fastest healthy price source."""
+    return prices.get_price("INJ", PRICE_SOURCES)
 
 
 def convert_to_inj(value):
@@ -90,15 +76,23 @@ def convert_to_inj(value):
     return safe_float(value) / DECIMALS
 
 
-def get_wallet_balance_data():
-    """Extract and calculate wallet balance data."""
+def get_wallet_balance_data(progress):
+    """Extract and calculate wallet balance data.
+
+    Returns the native row and the Positions of every other denom held or earned.
+    """
+    progress.plan(4)
     balances = fetch_account_balances(WALLET_ADDRESS)
+    progress.advance()
     rewards = fetch_account_rewards(WALLET_ADDRESS)
+    progress.advance()
     delegated_balance = fetch_account_delegations(WALLET_ADDRESS)
+    progress.advance()
     inj_price = fetch_inj_price()
+    progress.advance()
 
-    spendable_balance_raw = next((item['amount'] for item in balances if item['denom'] == 'inj'), "0")
-    reward_balance_raw = next((item['amount'] for item in rewards if item['denom'] == 'inj'), "0")
+    spendable_balance_raw = schemas.amount_of(balances, 'inj')
+    reward_balance_raw = schemas.amount_of(rewards, 'inj')
 
     spendable_balance = convert_to_inj(spendable_balance_raw)
     delegated_balance = convert_to_inj(delegated_balance)
@@ -109,6 +103,11 @@ def get_wallet_balance_data():
     reward_balance_value = reward_balance * inj_price
 
 
+    others = (
+        cosmos.value_other_denoms("inj", WALLET_ADDRESS, balances, "spendable", INJECTIVE_REST_API_URL) +
+        cosmos.value_other_denoms("inj", WALLET_ADDRESS, rewards, "rewards", INJECTIVE_REST_API_URL)
+    )
+
     return {
         "Wallet Address": WALLET_ADDRESS,
         "INJ Price (USD)": f"{inj_price:.4f}",
@@ -118,11 +117,11 @@ def get_wallet_balance_data():
         "Delegated Value (USD)": f"{delegated_balance_value:.4f}",
         "Reward (INJ)": f"{reward_balance:.6f}",
         "Reward Value (USD)": f"{reward_balance_value:.4f}"
-    }
+    }, others
 
 
-def export_to_csv(data, filename):
-    """Export the results to a CSV file."""
+def export_to_csv(data, filename, others=()):
+    """Export the results to a CSV file, with other denoms (Positions) listed below."""
     try:
         os.makedirs(REPORTS_FOLDER, exist_ok=True)
 
@@ -138,6 +137,7 @@ def export_to_csv(data, filename):
             writer.writeheader()
 
             writer.writerow(data)
+            other_value = cosmos.export_other_denoms(csvfile, others)
 
             total_inj = (
                 safe_float(data['Spendable (INJ)']) +
@@ -148,7 +148,8 @@ def export_to_csv(data, filename):
             total_value = (
                 safe_float(data['Spendable Value (USD)']) +
                 safe_float(data['Delegated Value (USD)']) +
-                safe_float(data['Reward Value (USD)'])
+                safe_float(data['Reward Value (USD)']) +
+                other_value
             )
 
             writer.writerow({})
@@ -170,23 +171,47 @@ def export_to_csv(data, filename):
         print(f"\nError exporting to CSV: {e}")
 
 
+def collect(wallet_address, categories=CATEGORIES):
+    """Return the valued positions of one wallet (see snapshot.Position).
+
+    Each category is its own query, so only the requested ones are fetched.
+    Balances and rewards in other denoms are valued too (see cosmos.value_other_denoms).
+    """
+    price = snapshot.cached_price("inj", fetch_inj_price)
+    fetchers = {
+        "spendable": lambda: fetch_account_balances(wallet_address),
+        "staked": lambda: [schemas.Coin('inj', fetch_account_delegations(wallet_address))],
+        "rewards": lambda: fetch_account_rewards(wallet_address)
+    }
+    positions = []
+    for category in CATEGORIES:
+        if category in categories:
+            coins = fetchers[category]()
+            raw = int(schemas.amount_of(coins, 'inj'))
+            positions.append(snapshot.Position.of(
+                "inj", wallet_address, "INJ", "inj", category, convert_to_inj(raw), price, 18, raw, f"cosmos-{cosmos.transport()}"
+            ))
+            positions.extend(cosmos.value_other_denoms("inj", wallet_address, coins, category, INJECTIVE_REST_API_URL))
+    return positions
+
+
 def main():
     """Main function to execute the script."""
-    global loading
-
     print("Running...")
-    loading_thread = threading.Thread(target=show_loading, args=("Fetching data",))
-    loading_thread.start()
 
-    wallet_data = get_wallet_balance_data()
+    progress = Progress("Injective")
+    progress.stage("Fetching data")
 
-    loading = False
-    loading_thread.join()
+    wallet_data, others = get_wallet_balance_data(progress)
+
+    progress.finish()
 
     if wallet_data:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"Injective_Wallet_{timestamp}.csv"
-        export_to_csv(wallet_data, filename)
+        export_to_csv(wallet_data, filename, others)
+
+    metrics.export_trace("Injective")
 
     print("Done!")
 
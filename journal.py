@@ -0,0 +1,103 @@
+import os
+import json
+import threading
+from datetime import datetime
+
+import schemas
+import snapshot
+
+
+class Journal:
+    """Append-only journal of completed units of work.
+
+    A unit is a (chain, wallet, category) tuple. Each completed unit is
+    appended as one JSON line, with its positions, as soon as it finishes.
+    Opening an existing journal replays it, so a restarted run only fetches
+    the units that are missing. A torn last line (crash mid-write) is
+    cut off on open and that unit is simply redone.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.completed = {}
+        self._lock = threading.Lock()
+        self._replay()
+        self._trim_torn_tail()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, mode='a')
+
+    def _replay(self):
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = schemas.loads(line)
+                        unit = tuple(schemas.field("JournalEntry", entry, 'unit'))
+                        positions = [snapshot.Position.from_json(position) for position in schemas.field("JournalEntry", entry, 'positions')]
+                    except (ValueError, TypeError):
+                        continue
+                    self.completed[unit] = positions
+        except FileNotFoundError:
+            pass
+
+    def _trim_torn_tail(self, block=65536):
+        """Truncate the file after its last newline, so appends start on a fresh line."""
+        try:
+            with open(self.path, mode='rb+') as f:
+                end = f.seek(0, os.SEEK_END)
+                position = end
+                while position > 0:
+                    start = max(0, position - block)
+                    f.seek(start)
+                    newline = f.read(position - start).rfind(b"\n")
+                    if newline != -1:
+                        position = start + newline + 1
+                        break
+                    position = start
+                if position != end:
+                    f.truncate(position)
+        except FileNotFoundError:
+            pass
+
+    def __contains__(self, unit):
+        return tuple(unit) in self.completed
+
+    def __len__(self):
+        return len(self.completed)
+
+    def record(self, unit, positions):
+        """Append a completed unit and flush it to the OS."""
+        positions = list(positions)
+        line = json.dumps({
+            "unit": list(unit),
+            "positions": [position._asdict() for position in positions],
+            "at": datetime.now().isoformat()
+        })
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.completed[tuple(unit)] = positions
+
+    def positions(self):
+        """Return the positions of every completed unit."""
+        return [position for positions in self.completed.values() for position in positions]
+
+    def close(self):
+        self._file.close()
+
+    def remove(self):
+        """Close and delete the journal once its results are safely written elsewhere."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
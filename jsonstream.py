@@ -0,0 +1,108 @@
+import json
+import codecs
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """Incrementally decode JSON values from an iterable of byte chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read one more chunk into the buffer. Returns False at end of input."""
+        if self.eof:
+            return False
+
+        # Drop what has already been consumed so the buffer stays small
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+
+        for chunk in self.chunks:
+            if chunk:
+                self.buffer += self.utf8.decode(chunk)
+                return True
+        self.buffer += self.utf8.decode(b"", final=True)
+        self.eof = True
+        return False
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON input")
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found}' in JSON input")
+        self.pos += 1
+
+    def value(self):
+        """Decode and consume the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A value ending exactly at the buffer end may be a truncated number
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_items(chunks, path):
+    """Yield the items of the JSON array found at `path`, one at a time.
+
+    `chunks` is an iterable of bytes (e.g. `response.iter_content()`), and
+    `path` is the sequence of object keys leading to the array, e.g.
+    ("result", "value") for a Solana RPC response. Only one array item is
+    held in memory at a time, so peak memory does not grow with the array
+    size. Raises KeyError if a key along the path is missing.
+    """
+    reader = _Reader(chunks)
+
+    for key in path:
+        reader.expect("{")
+        while True:
+            if reader.peek() == "}":
+                raise KeyError(key)
+            name = reader.value()
+            reader.expect(":")
+            if name == key:
+                break
+            reader.value()
+            if reader.peek() == ",":
+                reader.pos += 1
+
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.value()
+        if reader.peek() == ",":
+            reader.pos += 1
+        else:
+            reader.expect("]")
+            return
+
+
+def iter_response_items(response, path, chunk_size=CHUNK_SIZE):
+    """Stream the array at `path` out of a `requests` response opened with stream=True."""
+    return iter_items(response.iter_content(chunk_size=chunk_size), path)
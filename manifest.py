@@ -0,0 +1,84 @@
+import os
+import json
+import argparse
+from typing import NamedTuple
+
+import chains
+import schemas
+import portfolio
+
+MANIFEST_FILE = os.getenv("PORTFOLIO_MANIFEST", "manifest.json")
+
+
+class Manifest(NamedTuple):
+    """Every tracked wallet across chains, with optional per-chain settings.
+
+    The file looks like:
+
+        {
+          "chains": {
+            "solana": {"wallets": ["5Z7U..."]},
+            "near": {"wallets": ["cfdf..."], "categories": ["spendable", "staked"]}
+          }
+        }
+
+    `categories` defaults to every category the chain's collector supports.
+    """
+    wallets: tuple  # (chain, wallet) pairs, in file order, without duplicates
+    categories: dict  # chain -> categories to collect, for chains that restrict them
+
+    @classmethod
+    def from_json(cls, data):
+        wallets, categories = [], {}
+        for chain, settings in schemas.field("Manifest", data, 'chains').items():
+            if chain not in chains.REGISTRY:
+                raise schemas.SchemaError("Manifest", ('chains', chain), f"is not a known chain (expected one of {', '.join(chains.REGISTRY)})")
+            for i, wallet in enumerate(schemas.field("Manifest", settings, 'wallets')):
+                if not isinstance(wallet, str) or not wallet.strip():
+                    raise schemas.SchemaError("Manifest", ('chains', chain, 'wallets', i), f"is not an address: {wallet!r}")
+                wallets.append((chain, wallet.strip()))
+            selected = schemas.field("Manifest", settings, 'categories', default=None)
+            if selected is not None:
+                categories[chain] = tuple(selected)
+        return cls(tuple(dict.fromkeys(wallets)), categories)
+
+    def to_json(self):
+        entries = {}
+        for chain, wallet in self.wallets:
+            entries.setdefault(chain, {"wallets": []})["wallets"].append(wallet)
+        for chain, selected in self.categories.items():
+            entries.setdefault(chain, {"wallets": []})["categories"] = list(selected)
+        return {"chains": entries}
+
+
+def load(path=MANIFEST_FILE):
+    """Read a manifest. Raises OSError or ValueError (SchemaError)."""
+    with open(path) as f:
+        return Manifest.from_json(schemas.loads(f.read()))
+
+
+def save(manifest, path=MANIFEST_FILE):
+    with open(path, mode='w') as f:
+        json.dump(manifest.to_json(), f, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a manifest from the wallets configured in each aggregator.")
+    parser.add_argument("path", nargs="?", default=MANIFEST_FILE)
+    parser.add_argument("--force", action="store_true", help="overwrite an existing manifest")
+    args = parser.parse_args()
+
+    if os.path.exists(args.path) and not args.force:
+        parser.error(f"{args.path} exists; use --force to overwrite it")
+    manifest = Manifest(tuple(portfolio.default_wallets()), {})
+    try:
+        save(manifest, args.path)
+    except OSError as e:
+        print(f"Error writing {args.path}: {e}")
+        return
+    print(f"Wrote {len(manifest.wallets)} wallets to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
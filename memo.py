@@ -0,0 +1,81 @@
+import os
+import time
+import threading
+import functools
+
+import metrics
+
+SHARED_TTL = int(os.getenv("SHARED_LOOKUP_TTL", "60"))  # seconds a shared lookup is reused
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+
+        if not leader:
+            call["done"].wait()
+        else:
+            try:
+                call["result"] = fn()
+            except Exception as e:
+                call["error"] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call["done"].set()
+
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"]
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+def shared(provider, endpoint, ttl=SHARED_TTL):
+    """Decorate a lookup that many wallets repeat (a token's price or metadata).
+
+    Calls with the same arguments share one request while it is in flight
+    and reuse its result for `ttl` seconds, so a run over many wallets
+    issues each lookup once. Hits and misses are recorded as cache metrics
+    under `provider`/`endpoint`.
+
+    Only returned values are kept. An exception reaches every caller sharing
+    the call and isn't cached, so decorate a lookup that raises and apply
+    fallbacks (e.g. a 0.0 price) outside it.
+    """
+    def decorate(fn):
+        flight = SingleFlight()
+        results = {}
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            with lock:
+                fetched_at, result = results.get(args, (float("-inf"), None))
+            hit = time.monotonic() - fetched_at < ttl
+            metrics.record_cache(provider, endpoint, hit or flight.in_flight(args))
+            if hit:
+                return result
+
+            def fetch():
+                value = fn(*args)
+                with lock:
+                    results[args] = (time.monotonic(), value)
+                return value
+            return flight.do(args, fetch)
+
+        wrapper.cache_clear = results.clear
+        return wrapper
+    return decorate
@@ -0,0 +1,312 @@
+import os
+import json
+import time
+import threading
+import contextlib
+import contextvars
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+REPORTS_FOLDER = "reports"
+TRACES_FOLDER = os.path.join(REPORTS_FOLDER, "traces")
+
+# Histogram bucket upper bounds (seconds / bytes)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+# Calls kept for the trace file; long-running processes keep only the latest ones
+TRACE_MAX_CALLS = int(os.getenv("METRICS_TRACE_MAX_CALLS", "100000"))
+
+_lock = threading.Lock()
+_calls = deque(maxlen=TRACE_MAX_CALLS)
+_requests = {}
+_latency = {}
+_size = {}
+_retries = {}
+_cache = {}
+_started_at = datetime.now()
+_failures = contextvars.ContextVar("metrics_failures", default=None)
+
+# Responses worth retrying later; failures() reports these and transport errors
+TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket bounds."""
+
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+    def to_dict(self):
+        return {
+            "buckets": {str(bound): count for bound, count in zip(self.bounds, self.counts)},
+            "sum": self.total,
+            "count": self.count
+        }
+
+
+def record(provider, endpoint, status, latency, size, retries=0, error=None):
+    """Record a single outbound call."""
+    key = (provider, endpoint)
+    with _lock:
+        _calls.append({
+            "provider": provider,
+            "endpoint": endpoint,
+            "status": status,
+            "latency": round(latency, 6),
+            "bytes": size,
+            "retries": retries,
+            "error": error,
+            "at": datetime.now().isoformat()
+        })
+        status_key = (provider, endpoint, str(status) if status is not None else "error")
+        _requests[status_key] = _requests.get(status_key, 0) + 1
+        _latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(latency)
+        _size.setdefault(key, Histogram(SIZE_BUCKETS)).observe(size)
+        _retries[key] = _retries.get(key, 0) + retries
+    _track(provider, endpoint, status, retries, error)
+
+
+def record_cache(provider, endpoint, hit):
+    """Record a cache lookup made instead of (or before) an outbound call."""
+    key = (provider, endpoint, "hit" if hit else "miss")
+    with _lock:
+        _cache[key] = _cache.get(key, 0) + 1
+
+
+@contextlib.contextmanager
+def failures():
+    """Track the calls made in this context that failed transiently.
+
+    Yields a dict of {(provider, endpoint): status or error name} for
+    transport errors and TRANSIENT_STATUSES responses, which a caller may have
+    swallowed (returning a zero balance). A retried call that succeeds
+    clears its endpoint's failure. Worker threads only report here when
+    their function is wrapped with bind().
+    """
+    failed = {}
+    token = _failures.set(failed)
+    try:
+        yield failed
+    finally:
+        _failures.reset(token)
+
+
+def bind(fn):
+    """Wrap `fn` to run in a copy of the current context, e.g. before submitting it to an executor.
+
+    Each call gets its own copy, so one bound function can be mapped over a pool.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def record_failure(provider, endpoint, error):
+    """Report a failure a caller swallowed that no failed call shows (e.g. a malformed payload)."""
+    _track(provider, endpoint, None, 0, error)
+
+
+def _track(provider, endpoint, status, retries, error=None):
+    failed = _failures.get()
+    if failed is None:
+        return
+    with _lock:
+        if status is None or status in TRANSIENT_STATUSES:
+            failed[(provider, endpoint)] = error or status
+        elif retries:
+            failed.pop((provider, endpoint), None)
+
+
+def request(method, provider, endpoint, url, retries=0, **kwargs):
+    """Send an HTTP request through `requests` and record its metrics.
+
+    `endpoint` is a short, low-cardinality label (e.g. "getBalance") rather
+    than the full URL, which usually contains wallet addresses.
+    """
+    start = time.perf_counter()
+    try:
+        response = requests.request(method, url, **kwargs)
+    except requests.RequestException as e:
+        record(provider, endpoint, None, time.perf_counter() - start, 0, retries, error=type(e).__name__)
+        raise
+
+    if kwargs.get("stream"):
+        _record_when_read(response, provider, endpoint, start, retries)
+    else:
+        record(provider, endpoint, response.status_code, time.perf_counter() - start, len(response.content), retries)
+    return response
+
+
+def _record_when_read(response, provider, endpoint, start, retries):
+    """Record a streamed response once its body is read, or when it is closed unread.
+
+    Wraps `iter_content` (which `content` and `iter_lines` read through) to
+    count the bytes, so chunked bodies without a Content-Length are sized too.
+    """
+    iter_content, close = response.iter_content, response.close
+    size = 0
+    recorded = False
+
+    def finish():
+        nonlocal recorded
+        if not recorded:
+            recorded = True
+            record(provider, endpoint, response.status_code, time.perf_counter() - start, size, retries)
+
+    def counted(*args, **kwargs):
+        nonlocal size
+        try:
+            for chunk in iter_content(*args, **kwargs):
+                size += len(chunk)
+                yield chunk
+        finally:
+            finish()
+
+    def closing():
+        finish()
+        close()
+
+    response.iter_content = counted
+    response.close = closing
+
+
+def get(provider, endpoint, url, **kwargs):
+    """Instrumented `requests.get`."""
+    return request("GET", provider, endpoint, url, **kwargs)
+
+
+def post(provider, endpoint, url, **kwargs):
+    """Instrumented `requests.post`."""
+    return request("POST", provider, endpoint, url, **kwargs)
+
+
+def summary():
+    """Aggregate the recorded calls per provider."""
+    providers = {}
+    with _lock:
+        for (provider, endpoint), histogram in _latency.items():
+            entry = providers.setdefault(provider, {"requests": 0, "latency": 0.0, "bytes": 0, "retries": 0, "endpoints": {}})
+            size = _size[(provider, endpoint)]
+            entry["requests"] += histogram.count
+            entry["latency"] += histogram.total
+            entry["bytes"] += int(size.total)
+            entry["retries"] += _retries.get((provider, endpoint), 0)
+            entry["endpoints"][endpoint] = {
+                "latency": histogram.to_dict(),
+                "bytes": size.to_dict()
+            }
+        for (provider, endpoint, result), count in _cache.items():
+            entry = providers.setdefault(provider, {"requests": 0, "latency": 0.0, "bytes": 0, "retries": 0, "endpoints": {}})
+            cache = entry.setdefault("cache", {"hit": 0, "miss": 0})
+            cache[result] += count
+    return providers
+
+
+def export_trace(run_name):
+    """Write the calls and histograms of this run to a JSON trace file."""
+    try:
+        os.makedirs(TRACES_FOLDER, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_path = os.path.join(TRACES_FOLDER, f"{run_name}_{timestamp}.json")
+
+        with _lock:
+            calls = list(_calls)
+        trace = {
+            "run": run_name,
+            "started_at": _started_at.isoformat(),
+            "finished_at": datetime.now().isoformat(),
+            "providers": summary(),
+            "calls": calls
+        }
+        with open(file_path, mode='w') as f:
+            json.dump(trace, f, indent=2)
+
+        print(f"Trace written to {file_path}")
+        return file_path
+    except Exception as e:
+        print(f"\nError exporting trace: {e}")
+        return None
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def _render_histogram(lines, name, histograms):
+    for (provider, endpoint), histogram in sorted(histograms.items()):
+        for bound, count in zip(histogram.bounds, histogram.counts):
+            lines.append(f"{name}_bucket{{{_labels(provider=provider, endpoint=endpoint, le=bound)}}} {count}")
+        lines.append(f"{name}_bucket{{{_labels(provider=provider, endpoint=endpoint, le='+Inf')}}} {histogram.count}")
+        lines.append(f"{name}_sum{{{_labels(provider=provider, endpoint=endpoint)}}} {histogram.total}")
+        lines.append(f"{name}_count{{{_labels(provider=provider, endpoint=endpoint)}}} {histogram.count}")
+
+
+def render_prometheus():
+    """Render the current metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        lines.append("# HELP aggregator_requests_total Outbound requests by provider, endpoint and status.")
+        lines.append("# TYPE aggregator_requests_total counter")
+        for (provider, endpoint, status), count in sorted(_requests.items()):
+            lines.append(f"aggregator_requests_total{{{_labels(provider=provider, endpoint=endpoint, status=status)}}} {count}")
+
+        lines.append("# HELP aggregator_request_duration_seconds Outbound request latency.")
+        lines.append("# TYPE aggregator_request_duration_seconds histogram")
+        _render_histogram(lines, "aggregator_request_duration_seconds", _latency)
+
+        lines.append("# HELP aggregator_response_bytes Outbound response body size.")
+        lines.append("# TYPE aggregator_response_bytes histogram")
+        _render_histogram(lines, "aggregator_response_bytes", _size)
+
+        lines.append("# HELP aggregator_request_retries_total Retries spent on outbound requests.")
+        lines.append("# TYPE aggregator_request_retries_total counter")
+        for (provider, endpoint), count in sorted(_retries.items()):
+            lines.append(f"aggregator_request_retries_total{{{_labels(provider=provider, endpoint=endpoint)}}} {count}")
+
+        lines.append("# HELP aggregator_cache_requests_total Cache lookups by result.")
+        lines.append("# TYPE aggregator_cache_requests_total counter")
+        for (provider, endpoint, result), count in sorted(_cache.items()):
+            lines.append(f"aggregator_cache_requests_total{{{_labels(provider=provider, endpoint=endpoint, result=result)}}} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve `render_prometheus()` on /metrics."""
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Expose /metrics from a background thread for long-running (daemon) processes."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
@@ -3,35 +3,39 @@ import requests
 import csv
 from datetime import datetime
 from dotenv import load_dotenv
-import time
-import threading
+
+import metrics
+import prices
+import schemas
+import snapshot
+from progress import Progress
 
 load_dotenv()
 
 MINA_ACCOUNT_API_URL = "https://api.minaexplorer.com/accounts/"
+MINA_GRAPHQL_URL = os.getenv("MINA_GRAPHQL_URL", "https://api.minascan.io/node/mainnet/v1/graphql")
 REPORTS_FOLDER = "reports"
+CATEGORIES = ("spendable",)  # position categories returned by collect()
 API_KEY = os.getenv("MINA_API_KEY")
 WALLET_ADDRESS = "B62qjTJPtZ8sPeLyaCQMHebSYj2GPwGvhnTeR2gr8jUEYSsGFxADXEH"
+WALLETS = [
+    WALLET_ADDRESS
+]
+COINGECKO_ID = "mina-protocol"
 
-loading = True
-
-def show_loading(message):
-    """Show a loading animation in the terminal."""
-    global loading
-    dots = 0
-    while loading:
-        print(f"\r{message}{'.' * (dots % 4)}", end='', flush=True)
-        dots += 1
-        time.sleep(0.5)
-    print(f"\r{message}...", end='', flush=True)
+# "graphql" batches many accounts per request and falls back to "rest" per wallet.
+# The node's GraphQL Account type has no staking ledger fields, so reports that
+# need epoch staking balances always use "rest".
+MINA_BACKEND = os.getenv("MINA_BACKEND", "graphql")
+GRAPHQL_BATCH_SIZE = 50  # aliased accounts per query
+NANOMINA = 1e9  # GraphQL amounts are in nanomina, REST amounts in MINA
 
+ACCOUNT_FIELDS = """
+    publicKey
+    balance { total }
+"""
 
-def safe_float(value, default=0.0):
-    """Convert a value to float safely, with a default fallback."""
-    try:
-        return float(value) if value is not None else default
-    except (ValueError, TypeError):
-        return default
+PRICE_SOURCES = (prices.coingecko_source(COINGECKO_ID),)
 
 
 def fetch_account_data(wallet_address):
@@ -42,35 +46,108 @@ def fetch_account_data(wallet_address):
     }
 
     try:
-        response = requests.get(f"{MINA_ACCOUNT_API_URL}{wallet_address}", headers=headers)
+        response = metrics.get("minaexplorer", "accounts", f"{MINA_ACCOUNT_API_URL}{wallet_address}", headers=headers)
         response.raise_for_status()
-        return response.json().get('account', {})
+        return schemas.decode(response, schemas.MinaAccount)
     except requests.RequestException as e:
         print(f"Error fetching account data for {wallet_address}: {e}")
-        return {}
+        return None
+    except ValueError as e:
+        print(f"Error parsing account data for {wallet_address}: {e}")
+        return None
+
+
+def build_accounts_query(wallets):
+    """Build one GraphQL request fetching every wallet under an alias (a0, a1, ...).
+
+    Wallets are passed as variables ($k0, $k1, ...), never spliced into the
+    document. Returns the JSON payload.
+    """
+    declarations = ", ".join(f"$k{i}: PublicKey!" for i in range(len(wallets)))
+    selections = "\n".join(
+        f'  a{i}: account(publicKey: $k{i}) {{{ACCOUNT_FIELDS}  }}'
+        for i in range(len(wallets))
+    )
+    return {
+        "query": f"query Accounts({declarations}) {{\n{selections}\n}}",
+        "variables": {f"k{i}": wallet for i, wallet in enumerate(wallets)}
+    }
+
+
+def fetch_accounts_graphql(wallets):
+    """Fetch many accounts with one aliased GraphQL query per GRAPHQL_BATCH_SIZE wallets.
+
+    Returns {wallet: MinaAccount} for the accounts that were found.
+    """
+    accounts = {}
+    for start in range(0, len(wallets), GRAPHQL_BATCH_SIZE):
+        batch = wallets[start:start + GRAPHQL_BATCH_SIZE]
+        try:
+            response = metrics.post("mina-graphql", "account", MINA_GRAPHQL_URL, json=build_accounts_query(batch))
+            response.raise_for_status()
+            data = schemas.loads(response.content)
+        except requests.RequestException as e:
+            print(f"Error fetching accounts from GraphQL: {e}")
+            continue
+        except ValueError as e:
+            print(f"Error parsing GraphQL response: {e}")
+            continue
+
+        for error in data.get('errors') or []:
+            print(f"GraphQL error: {error.get('message', error)}")
+
+        results = data.get('data') or {}
+        for i, wallet in enumerate(batch):
+            account = results.get(f"a{i}")
+            if not account:
+                continue
+            try:
+                accounts[wallet] = schemas.MinaAccount.from_account(account, scale=NANOMINA)
+            except ValueError as e:
+                print(f"Error parsing GraphQL account {wallet}: {e}")
+
+    return accounts
+
+
+def fetch_accounts(wallets, progress, staking=False):
+    """Fetch every wallet, batched over GraphQL, with the REST API as a fallback.
+
+    Returns (MinaAccount, backend) pairs, `backend` being the one that
+    answered ("graphql" or "rest"). With `staking`, every wallet comes from
+    the REST API, the only one with epoch staking balances.
+    """
+    wallets = list(dict.fromkeys(wallets))
+    accounts = {}
+
+    if MINA_BACKEND == "graphql" and not staking:
+        progress.plan((len(wallets) + GRAPHQL_BATCH_SIZE - 1) // GRAPHQL_BATCH_SIZE)
+        accounts = {wallet: (account, "graphql") for wallet, account in fetch_accounts_graphql(wallets).items()}
+        progress.advance((len(wallets) + GRAPHQL_BATCH_SIZE - 1) // GRAPHQL_BATCH_SIZE)
+
+    missing = [wallet for wallet in wallets if wallet not in accounts]
+    progress.plan(len(missing))
+    for wallet in missing:
+        account = fetch_account_data(wallet)
+        progress.advance()
+        if account is not None:
+            accounts[wallet] = (account, "rest")
+
+    return [accounts[wallet] for wallet in wallets if wallet in accounts]
 
 
 def fetch_mina_price():
     """Fetch the current price of MINA in USD."""
-    url = 'https://api.coingecko.com/api/v3/simple/price?ids=mina-protocol&vs_currencies=usd'
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        return safe_float(data['mina-protocol']['usd'])
-    except requests.RequestException as e:
-        print(f"Error fetching MINA price: {e}")
-        return 0.0
+    return prices.get_price("MINA", PRICE_SOURCES)
 
 
-def get_wallet_balance(account_data, mina_price):
-    """Extract and calculate balances from account data."""
-    total_balance = safe_float(account_data.get('balance', {}).get('total'))
-    current_staked_balance = safe_float(account_data.get('epochStakingAccount', [{}])[0].get('balance', 0))
-    next_staked_balance = safe_float(account_data.get('nextEpochStakingAccount', [{}])[0].get('balance', 0))
+def get_wallet_balance(account, mina_price):
+    """Calculate balances from a decoded MinaAccount."""
+    total_balance = account.total_balance
+    current_staked_balance = account.epoch_staked
+    next_staked_balance = account.next_epoch_staked
 
     return {
-        "Wallet Address": account_data.get('publicKey'),
+        "Wallet Address": account.public_key,
         "MINA Price (USD)": f"{mina_price:.4f}",
         "Total Balance (MINA)": f"{total_balance:.6f}",
         "Total Value (USD)": f"{total_balance * mina_price:.4f}",
@@ -97,32 +174,54 @@ def export_to_csv(data, filename):
             writer.writeheader()
 
             # Write data rows
-            writer.writerow(data)
+            for row in data:
+                writer.writerow(row)
 
         print(f"\nData successfully exported to {file_path}")
     except Exception as e:
         print(f"\nError exporting to CSV: {e}")
 
 
-def main():
-    global loading
+def collect(wallet, categories=CATEGORIES):
+    """Return the valued positions of one wallet (see snapshot.Position).
+
+    Delegated MINA stays in the account's balance, so it isn't a separate position.
+    """
+    return collect_many([wallet], categories)
+
+
+def collect_many(wallets, categories=CATEGORIES):
+    """Return the valued positions of several wallets, fetched in GRAPHQL_BATCH_SIZE batches."""
+    if "spendable" not in categories:
+        return []
+    mina_price = snapshot.cached_price("mina", fetch_mina_price)
+    return [
+        snapshot.Position.of("mina", account.public_key, "MINA", "native", "spendable", account.total_balance, mina_price, 9, source=f"mina-{backend}")
+        for account, backend in fetch_accounts(wallets, Progress("MINA", listeners=[]))
+    ]
 
+
+def main():
     print("Running...")
-    loading_thread = threading.Thread(target=show_loading, args=("Fetching data",))
-    loading_thread.start()
+
+    progress = Progress("MINA")
+    progress.stage("Fetching data")
+    progress.plan()
 
     mina_price = fetch_mina_price()
-    account_data = fetch_account_data(WALLET_ADDRESS)
+    progress.advance()
+    accounts = fetch_accounts(WALLETS, progress, staking=True)
 
-    loading = False
-    loading_thread.join()
+    progress.finish()
 
-    if account_data:
-        balance_data = get_wallet_balance(account_data, mina_price)
+    if accounts:
+        balance_data = [get_wallet_balance(account, mina_price) for account, _ in accounts]
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"MINA_Wallet_{timestamp}.csv"
         export_to_csv(balance_data, filename)
 
+    metrics.export_trace("MINA")
+
     print("Done!")
 
 
@@ -3,45 +3,78 @@ import json
 import base64
 import os
 import csv
-import threading
 from datetime import datetime
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
+import dexscreener
+import memo
+import metrics
+import prices
+import schemas
+import snapshot
+from progress import Progress
+
 load_dotenv()
 
-NEAR_RPC_URL = "https://rpc.mainnet.near.org"
+NEAR_RPC_URL = os.getenv("NEAR_RPC_URL", "https://rpc.mainnet.near.org")
 
-contract_address = "ledgerbyfigment.poolv1.near"
-method_name = "get_account"
+# Staking pools to scan; replaced by the pools listed in STAKING_POOLS_FILE when it exists
+STAKING_POOLS = [
+    "ledgerbyfigment.poolv1.near"
+]
+STAKING_POOLS_FILE = os.getenv("NEAR_STAKING_POOLS_FILE", "near_pools.json")
+RPC_CONCURRENCY = int(os.getenv("NEAR_RPC_CONCURRENCY", "64"))
 
 account_id = "cfdf371346821425cffe9ddd42cd0645c44d8837d614fc884a712a8662e50cfa"
 
 PIKESPEAK_API_URL = "https://api.pikespeak.ai/account/wealth/"
 REPORTS_FOLDER = "reports"
+CATEGORIES = ("spendable", "storage", "staked", "unstaked")  # position categories returned by collect()
 API_KEY = os.getenv("PIKESPEAK_API_KEY")
 
-loading = True
-
-def show_loading(message):
-    """Show a loading animation in the terminal."""
-    global loading
-    dots = 0
-    while loading:
-        print(f"\r{message}{'.' * (dots % 4)}", end='', flush=True)
-        dots += 1
-        time.sleep(0.5)
-    print(f"\r{message}...", end='', flush=True)
+# Token balances come from "pikespeak" or "rpc"; the other backend is used as a fallback
+BALANCE_BACKEND = os.getenv("NEAR_BALANCE_BACKEND", "pikespeak")
+BALANCE_FALLBACK = os.getenv("NEAR_BALANCE_FALLBACK", "1") == "1"
+
+# Fungible tokens read by the RPC backend
+FT_TOKENS = [
+    "wrap.near",
+    "usdt.tether-token.near",
+    "17208628f84f5d6ad33f0da3bbbeb27ffcb398eac501a31bd6ad2011e36133a1",  # USDC
+    "token.v2.ref-finance.near",
+    "meta-pool.near",
+    "linear-protocol.near",
+    "aurora",
+    "token.sweat"
+]
+WRAPPED_NEAR = "wrap.near"
+NEAR_PRICE_SOURCES = (
+    prices.dexscreener_source(WRAPPED_NEAR, chain="near"),
+    prices.coingecko_source("near")
+)
+YOCTO_PER_STORAGE_BYTE = 10**19
+
+CACHE_FOLDER = ".cache"
+FT_METADATA_CACHE_FILE = os.path.join(CACHE_FOLDER, "near_ft_metadata.json")
+
+def load_staking_pools():
+    """Return the staking pools to scan, from the local registry file if present."""
+    if not os.path.exists(STAKING_POOLS_FILE):
+        return STAKING_POOLS
 
-def safe_float(value, default=0.0):
-    """Convert a value to float safely, with a default fallback."""
     try:
-        return float(value) if value is not None else default
-    except (ValueError, TypeError):
-        return default
-
-def get_staked_near_balance():
-    """Fetch the staked NEAR balance using the NEAR RPC."""
+        with open(STAKING_POOLS_FILE) as f:
+            registry = json.load(f)
+        # Accept either a plain list or {"pools": [...]}
+        pools = registry.get("pools", []) if isinstance(registry, dict) else registry
+        return list(dict.fromkeys(pools))
+    except (OSError, ValueError) as e:
+        print(f"Error reading {STAKING_POOLS_FILE}: {e}")
+        return STAKING_POOLS
+
+def call_view_function(contract, method_name, args):
+    """Send a `call_function` view call to the NEAR RPC and return the response."""
     data = {
         "jsonrpc": "2.0",
         "id": "1",
@@ -49,27 +82,58 @@ def get_staked_near_balance():
         "params": {
             "request_type": "call_function",
             "finality": "final",
-            "account_id": contract_address,
+            "account_id": contract,
             "method_name": method_name,
-            "args_base64": base64.b64encode(json.dumps({"account_id": account_id}).encode("utf-8")).decode("utf-8")
+            "args_base64": base64.b64encode(json.dumps(args).encode("utf-8")).decode("utf-8")
         }
     }
+    return metrics.post("near-rpc", method_name, NEAR_RPC_URL, json=data)
 
-    response = requests.post(NEAR_RPC_URL, json=data)
+def get_pool_account(pool, account_id):
+    """Fetch the staked and unstaked balance of `account_id` in one staking pool."""
+    try:
+        response = call_view_function(pool, "get_account", {"account_id": account_id})
+    except requests.RequestException as e:
+        print(f"Error fetching staked balance from {pool}: {e}")
+        return None
 
     if response.status_code == 200:
-        result = response.json()
-        if "result" in result and "result" in result["result"]:
-            decoded_result = json.loads(bytes(result["result"]["result"]).decode("utf-8"))
-            staked_balance = int(decoded_result.get("staked_balance", "0")) / 1e24
-            return staked_balance
-        else:
-            print("Unexpected response format:", result)
-            return 0.0
+        try:
+            return schemas.decode(response, schemas.NearPoolAccount)
+        except ValueError as e:
+            print(f"Unexpected response format from {pool}: {e}")
+            return None
     else:
-        print(f"Failed to fetch staked balance. Status code: {response.status_code}")
+        print(f"Failed to fetch staked balance from {pool}. Status code: {response.status_code}")
         print(response.text)
-        return 0.0
+        return None
+
+def get_staked_near_balances(account_id, pools, progress):
+    """Query every pool concurrently and return the staked/unstaked NEAR held in each.
+
+    At most RPC_CONCURRENCY view calls are in flight at once, so scanning a
+    few dozen pools takes about one round trip of wall time.
+    """
+    progress.plan(len(pools))
+    stakes = []
+    if not pools:
+        return stakes
+
+    with ThreadPoolExecutor(max_workers=min(RPC_CONCURRENCY, len(pools))) as executor:
+        futures = {executor.submit(metrics.bind(get_pool_account), pool, account_id): pool for pool in pools}
+        for future in as_completed(futures):
+            progress.advance()
+            pool_account = future.result()
+            if pool_account is None:
+                continue
+            if pool_account.staked_balance or pool_account.unstaked_balance:
+                stakes.append({
+                    "pool": futures[future],
+                    "staked": pool_account.staked_balance / 1e24,
+                    "unstaked": pool_account.unstaked_balance / 1e24
+                })
+
+    return sorted(stakes, key=lambda stake: stake["pool"])
 
 def get_account_balances(account_id):
     """Fetch all token balances for a given NEAR account using the Pikespeak API."""
@@ -79,37 +143,231 @@ def get_account_balances(account_id):
     }
 
     try:
-        response = requests.get(f"{PIKESPEAK_API_URL}{account_id}", headers=headers)
+        response = metrics.get("pikespeak", "account/wealth", f"{PIKESPEAK_API_URL}{account_id}", headers=headers)
         response.raise_for_status()
-        data = response.json()
+        data = schemas.loads(response.content)
 
-        balances = data.get('balance', [])
+        balances = data.get('balance') or []
         if not balances:
             print("No tokens found for this account.")
             return []
 
         results = []
-        for token in balances:
-            symbol = token.get('symbol', 'UNKNOWN')
-            address = token.get('contract', 'Unknown')
-            balance = safe_float(token.get('amount', 0))
-            price_usd = safe_float(token.get('tokenPrice'))
-            total_value = safe_float(token.get('usdValue'))
-
+        for token in map(schemas.PikespeakToken.from_json, balances):
             results.append({
-                "Symbol": symbol,
-                "Address": address,
-                "Balance": f"{balance:.6f}",
-                "Price (USD)": f"{price_usd:.6f}",
-                "Total Value (USD)": f"{total_value:.6f}"
+                "Symbol": token.symbol,
+                "Address": token.contract,
+                "Balance": f"{token.amount:.6f}",
+                "Price (USD)": f"{token.price_usd:.6f}",
+                "Total Value (USD)": f"{token.value_usd:.6f}"
             })
 
         return results
     except requests.RequestException as e:
         print(f"Error fetching balances: {e}")
         return []
+    except ValueError as e:
+        print(f"Error parsing balances: {e}")
+        return []
+
+def view_account(account_id):
+    """Fetch the native NEAR account state (balance and storage usage)."""
+    data = {
+        "jsonrpc": "2.0",
+        "id": "1",
+        "method": "query",
+        "params": {
+            "request_type": "view_account",
+            "finality": "final",
+            "account_id": account_id
+        }
+    }
+
+    try:
+        response = metrics.post("near-rpc", "view_account", NEAR_RPC_URL, json=data)
+        response.raise_for_status()
+        return schemas.decode(response, schemas.NearViewAccount)
+    except requests.RequestException as e:
+        print(f"Error fetching account {account_id}: {e}")
+    except ValueError as e:
+        print(f"Error parsing account {account_id}: {e}")
+    return None
+
+def ft_balance_of(contract, account_id):
+    """Fetch the raw balance of `account_id` in a NEP-141 token contract."""
+    try:
+        response = call_view_function(contract, "ft_balance_of", {"account_id": account_id})
+        response.raise_for_status()
+        return schemas.decode(response, schemas.NearFtBalance).amount
+    except requests.RequestException as e:
+        print(f"Error fetching {contract} balance: {e}")
+    except ValueError as e:
+        print(f"Error parsing {contract} balance: {e}")
+    return 0
+
+def load_ft_metadata_cache():
+    """Load cached token metadata, which rarely changes, from disk."""
+    try:
+        with open(FT_METADATA_CACHE_FILE) as f:
+            return {contract: schemas.NearFtMetadata.from_dict(metadata) for contract, metadata in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+def save_ft_metadata_cache(cache):
+    """Persist token metadata so later runs skip the ft_metadata calls."""
+    try:
+        os.makedirs(CACHE_FOLDER, exist_ok=True)
+        with open(FT_METADATA_CACHE_FILE, mode='w') as f:
+            json.dump({contract: metadata._asdict() for contract, metadata in cache.items()}, f, indent=2)
+    except OSError as e:
+        print(f"Error writing {FT_METADATA_CACHE_FILE}: {e}")
+
+def ft_metadata(contract, cache):
+    """Return the metadata of a NEP-141 token, from `cache` when possible."""
+    if contract in cache:
+        metrics.record_cache("near-rpc", "ft_metadata", True)
+        return cache[contract]
+    metrics.record_cache("near-rpc", "ft_metadata", False)
+
+    try:
+        response = call_view_function(contract, "ft_metadata", {})
+        response.raise_for_status()
+        metadata = schemas.decode(response, schemas.NearFtMetadata)
+        cache[contract] = metadata
+        return metadata
+    except requests.RequestException as e:
+        print(f"Error fetching {contract} metadata: {e}")
+    except ValueError as e:
+        print(f"Error parsing {contract} metadata: {e}")
+    return None
+
+@memo.shared("dexscreener", "token-price")
+def fetch_token_price(contract):
+    """Fetch the USD price of a NEAR token from its most liquid Dexscreener pair."""
+    return dexscreener.get_price(contract, "near")
+
+def get_token_price(contract):
+    """The USD price of a NEAR token, or 0.0 on errors."""
+    try:
+        return fetch_token_price(contract)
+    except requests.RequestException as e:
+        print(f"Error fetching {contract} price: {e}")
+        metrics.record_failure("dexscreener", "token-price", type(e).__name__)
+    except ValueError as e:
+        print(f"Error parsing {contract} price: {e}")
+        metrics.record_failure("dexscreener", "token-price", type(e).__name__)
+    return 0.0
+
+def get_near_price():
+    """Fetch the USD price of NEAR from the fastest healthy price source."""
+    return prices.get_price("NEAR", NEAR_PRICE_SOURCES)
+
+def get_rpc_token_balance(contract, account_id, metadata_cache):
+    """Fetch one token's balance, then its metadata and price when it is held."""
+    amount = ft_balance_of(contract, account_id)
+    if not amount:
+        return None
+
+    metadata = ft_metadata(contract, metadata_cache)
+    if metadata is None:
+        return None
+
+    balance = amount / (10 ** metadata.decimals)
+    price_usd = get_token_price(contract)
+    return {
+        "Symbol": metadata.symbol,
+        "Address": contract,
+        "Balance": f"{balance:.6f}",
+        "Price (USD)": f"{price_usd:.6f}",
+        "Total Value (USD)": f"{balance * price_usd:.6f}",
+        "Decimals": metadata.decimals,
+        "Base Units": amount
+    }
+
+def get_rpc_account_balances(account_id, tokens, progress):
+    """Fetch native NEAR and `tokens` balances straight from the NEAR RPC.
+
+    The per-token view calls run concurrently (up to RPC_CONCURRENCY) and
+    token metadata is cached on disk between runs.
+    """
+    progress.plan(2 + len(tokens))
+    account = view_account(account_id)
+    progress.advance()
+    if account is None:
+        return []
 
-def export_to_csv(data, filename, staked_near_balance, near_price):
+    near_price = snapshot.cached_price("near", get_near_price)
+    progress.advance()
+
+    storage_yocto = account.storage_usage * YOCTO_PER_STORAGE_BYTE
+    storage = storage_yocto / 1e24
+    available = account.amount / 1e24 - storage
+    results = [
+        {
+            "Symbol": "NEAR",
+            "Address": "Near",
+            "Balance": f"{available:.6f}",
+            "Price (USD)": f"{near_price:.6f}",
+            "Total Value (USD)": f"{available * near_price:.6f}",
+            "Decimals": 24,
+            "Base Units": account.amount - storage_yocto
+        },
+        {
+            "Symbol": "NEAR [Storage]",
+            "Address": "Near",
+            "Balance": f"{storage:.6f}",
+            "Price (USD)": f"{near_price:.6f}",
+            "Total Value (USD)": f"{storage * near_price:.6f}",
+            "Decimals": 24,
+            "Base Units": storage_yocto
+        }
+    ]
+
+    metadata_cache = load_ft_metadata_cache()
+    cached = len(metadata_cache)
+    if tokens:
+        with ThreadPoolExecutor(max_workers=min(RPC_CONCURRENCY, len(tokens))) as executor:
+            futures = [executor.submit(metrics.bind(get_rpc_token_balance), contract, account_id, metadata_cache) for contract in tokens]
+            for future in as_completed(futures):
+                progress.advance()
+                row = future.result()
+                if row is not None:
+                    results.append(row)
+
+    if len(metadata_cache) != cached:
+        save_ft_metadata_cache(metadata_cache)
+
+    return results
+
+def fetch_account_balances(account_id, progress):
+    """Fetch token balances from BALANCE_BACKEND, falling back to the other backend.
+
+    Returns (rows, backend), `backend` being the one that answered (None when none did).
+    RPC rows also carry the token's "Decimals" and raw "Base Units".
+    """
+    def pikespeak():
+        progress.plan()
+        balances = get_account_balances(account_id)
+        progress.advance()
+        return balances
+
+    backends = {
+        "pikespeak": pikespeak,
+        "rpc": lambda: get_rpc_account_balances(account_id, FT_TOKENS, progress)
+    }
+    order = [BALANCE_BACKEND] + [name for name in backends if name != BALANCE_BACKEND]
+    if not BALANCE_FALLBACK:
+        order = order[:1]
+
+    for backend in order:
+        progress.stage(f"Fetching balances ({backend})")
+        balances = backends[backend]()
+        if balances:
+            return balances, backend
+        print(f"\nNo balances from the {backend} backend.")
+    return [], None
+
+def export_to_csv(data, filename, stakes, near_price):
     """Export the results to a CSV file."""
     try:
         os.makedirs(REPORTS_FOLDER, exist_ok=True)
@@ -118,7 +376,7 @@ def export_to_csv(data, filename, staked_near_balance, near_price):
 
         with open(file_path, mode='w', newline='') as csvfile:
             fieldnames = ['Symbol', 'Address', 'Balance', 'Price (USD)', 'Total Value (USD)']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
 
             writer.writeheader()
             total_value_sum = 0.0
@@ -127,16 +385,28 @@ def export_to_csv(data, filename, staked_near_balance, near_price):
                 total_value_sum += float(row['Total Value (USD)'])
                 writer.writerow(row)
 
-            staked_total_value = staked_near_balance * near_price
-            writer.writerow({
-                "Symbol": "Stacked NEAR",
-                "Address": contract_address,
-                "Balance": f"{staked_near_balance:.6f}",
-                "Price (USD)": f"{near_price:.6f}",
-                "Total Value (USD)": f"{staked_total_value:.6f}"
-            })
+            for stake in stakes:
+                staked_total_value = stake["staked"] * near_price
+                writer.writerow({
+                    "Symbol": "Stacked NEAR",
+                    "Address": stake["pool"],
+                    "Balance": f"{stake['staked']:.6f}",
+                    "Price (USD)": f"{near_price:.6f}",
+                    "Total Value (USD)": f"{staked_total_value:.6f}"
+                })
+                total_value_sum += staked_total_value
+
+                if stake["unstaked"]:
+                    unstaked_total_value = stake["unstaked"] * near_price
+                    writer.writerow({
+                        "Symbol": "Unstaked NEAR",
+                        "Address": stake["pool"],
+                        "Balance": f"{stake['unstaked']:.6f}",
+                        "Price (USD)": f"{near_price:.6f}",
+                        "Total Value (USD)": f"{unstaked_total_value:.6f}"
+                    })
+                    total_value_sum += unstaked_total_value
 
-            total_value_sum += staked_total_value
             writer.writerow({})
             writer.writerow({
                 "Symbol": "TOTAL",
@@ -150,24 +420,53 @@ def export_to_csv(data, filename, staked_near_balance, near_price):
     except Exception as e:
         print(f"\nError exporting to CSV: {e}")
 
-def main():
-    global loading
+def collect(account_id, categories=CATEGORIES):
+    """Return the valued positions of one account (see snapshot.Position).
+
+    Token balances (spendable, storage) and pool stakes (staked, unstaked)
+    are only fetched when one of their categories is requested.
+    """
+    progress = Progress("NEAR", listeners=[])
+    positions = []
+    if {"spendable", "storage"} & set(categories):
+        tokens, backend = fetch_account_balances(account_id, progress)
+        for token in tokens:
+            category = "storage" if token['Symbol'] == "NEAR [Storage]" else "spendable"
+            asset = "NEAR" if category == "storage" else token['Symbol']
+            positions.append(snapshot.Position.of(
+                "near", account_id, asset, token['Address'], category, float(token['Balance']), float(token['Price (USD)']),
+                token.get('Decimals', 24 if asset == "NEAR" else None), token.get('Base Units'), f"near-{backend}"
+            ))
+
+    if {"staked", "unstaked"} & set(categories):
+        near_price = next((position.price for position in positions if position.asset == "NEAR"), 0.0)
+        if not near_price:
+            near_price = snapshot.cached_price("near", get_near_price)
+        for stake in get_staked_near_balances(account_id, load_staking_pools(), progress):
+            positions.append(snapshot.Position.of("near", account_id, "NEAR", stake["pool"], "staked", stake["staked"], near_price, 24, source="near-rpc"))
+            if stake["unstaked"]:
+                positions.append(snapshot.Position.of("near", account_id, "NEAR", stake["pool"], "unstaked", stake["unstaked"], near_price, 24, source="near-rpc"))
+
+    return [position for position in positions if position.category in categories]
 
+def main():
     print("Running...")
-    loading_thread = threading.Thread(target=show_loading, args=("Fetching data",))
-    loading_thread.start()
 
-    token_data = get_account_balances(account_id)
-    staked_near_balance = get_staked_near_balance()
+    progress = Progress("NEAR")
+    token_data, _ = fetch_account_balances(account_id, progress)
 
-    loading = False
-    loading_thread.join()
+    progress.stage("Scanning staking pools")
+    stakes = get_staked_near_balances(account_id, load_staking_pools(), progress)
+
+    progress.finish()
 
     if token_data:
         near_price = next((float(token['Price (USD)']) for token in token_data if token['Symbol'] == 'NEAR'), 0.0)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"{account_id}_NEAR_{timestamp}.csv"
-        export_to_csv(token_data, filename, staked_near_balance, near_price)
+        export_to_csv(token_data, filename, stakes, near_price)
+
+    metrics.export_trace("NEAR")
 
     print("Done!")
 
@@ -1,29 +1,26 @@
 import os
-import requests
 import csv
 from datetime import datetime
 from dotenv import load_dotenv
-import time
-import threading
+
+import cosmos
+import metrics
+import prices
+import schemas
+import snapshot
+from progress import Progress
 
 load_dotenv()
 
 NIBI_REST_API_URL = "https://nibiru-rest.publicnode.com"
-COINGECKO_API_URL = "https://api.coingecko.com/api/v3/simple/price?ids=nibiru&vs_currencies=usd"
+COINGECKO_ID = "nibiru"
 REPORTS_FOLDER = "reports"
+CATEGORIES = ("spendable", "staked", "rewards")  # position categories returned by collect()
 WALLET_ADDRESS = "nibi1qmz8gw2ddh50x0nl4crejwr4vd67498rry37lm"
 
 DECIMALS = 10**6
-loading = True
 
-def show_loading(message):
-    global loading
-    dots = 0
-    while loading:
-        print(f"\r{message}{'.' * (dots % 4)}", end='', flush=True)
-        dots += 1
-        time.sleep(0.5)
-    print(f"\r{message}...", end='', flush=True)
+PRICE_SOURCES = (prices.coingecko_source(COINGECKO_ID),)
 
 def safe_float(value, default=0.0):
     try:
@@ -33,62 +30,60 @@ def safe_float(value, default=0.0):
 
 def fetch_account_balances(wallet_address):
     try:
-        response = requests.get(f"{NIBI_REST_API_URL}/cosmos/bank/v1beta1/balances/{wallet_address}")
-        response.raise_for_status()
-        return response.json().get('balances', [])
-    except requests.RequestException as e:
+        return list(cosmos.get_client("nibi", NIBI_REST_API_URL).bank_balances(wallet_address))
+    except cosmos.TRANSPORT_ERRORS as e:
         print(f"Error fetching balances: {e}")
         return []
+    except ValueError as e:
+        print(f"Error parsing balances: {e}")
+        return []
 
 def fetch_account_rewards(wallet_address):
     try:
-        response = requests.get(f"{NIBI_REST_API_URL}/cosmos/distribution/v1beta1/delegators/{wallet_address}/rewards")
-        response.raise_for_status()
-        return response.json().get('total', [])
-    except requests.RequestException as e:
+        return cosmos.get_client("nibi", NIBI_REST_API_URL).rewards(wallet_address)
+    except cosmos.TRANSPORT_ERRORS as e:
         print(f"Error fetching rewards: {e}")
         return []
+    except ValueError as e:
+        print(f"Error parsing rewards: {e}")
+        return []
 
 def fetch_account_delegations(wallet_address):
     try:
-        response = requests.get(f"{NIBI_REST_API_URL}/cosmos/staking/v1beta1/delegations/{wallet_address}")
-        response.raise_for_status()
-        delegations = response.json().get('delegation_responses', [])
-        if delegations:
-            return delegations[0].get('balance', {}).get('amount', "0")
-        return "0"
-    except requests.RequestException as e:
+        delegations = cosmos.get_client("nibi", NIBI_REST_API_URL).delegations(wallet_address)
+        return sum(delegation.amount for delegation in delegations)
+    except cosmos.TRANSPORT_ERRORS as e:
         print(f"Error fetching delegations: {e}")
-        return "0"
+        return 0
+    except ValueError as e:
+        print(f"Error parsing delegations: {e}")
+        return 0
 
 def fetch_nibi_price():
-    """Fetch the current price of NIBI in USD from CoinGecko."""
-    try:
-        response = requests.get(COINGECKO_API_URL)
-        response.raise_for_status()
-        data = response.json()
-
-        return safe_float(data['nibiru']['usd'])
-    except requests.RequestException as e:
-        print(f"Error fetching NIBI price from CoinGecko: {e}")
-        return 0.0
-    except KeyError as e:
-        print(f"Unexpected response format from CoinGecko: {e}")
-        return 0.0
+    """Fetch the current price of NIBI in USD."""
+    return prices.get_price("NIBI", PRICE_SOURCES)
 
 def convert_to_nibi(value):
     """Convert raw token amount to NIBI amount with 18 decimals."""
     return safe_float(value) / DECIMALS
 
-def get_wallet_balance_data():
-    """Extract and calculate wallet balance data."""
+def get_wallet_balance_data(progress):
+    """Extract and calculate wallet balance data.
+
+    Returns the native row and the Positions of every other denom held or earned.
+    """
+    progress.plan(4)
     balances = fetch_account_balances(WALLET_ADDRESS)
+    progress.advance()
     rewards = fetch_account_rewards(WALLET_ADDRESS)
+    progress.advance()
     delegated_balance = fetch_account_delegations(WALLET_ADDRESS)
+    progress.advance()
     nibi_price = fetch_nibi_price()
+    progress.advance()
 
-    spendable_balance_raw = next((item['amount'] for item in balances if item['denom'] == 'unibi'), "0")
-    reward_balance_raw = next((item['amount'] for item in rewards if item['denom'] == 'unibi'), "0")
+    spendable_balance_raw = schemas.amount_of(balances, 'unibi')
+    reward_balance_raw = schemas.amount_of(rewards, 'unibi')
 
     spendable_balance = convert_to_nibi(spendable_balance_raw)
     delegated_balance = convert_to_nibi(delegated_balance)
@@ -98,6 +93,11 @@ def get_wallet_balance_data():
     delegated_balance_value = delegated_balance * nibi_price
     reward_balance_value = reward_balance * nibi_price
 
+    others = (
+        cosmos.value_other_denoms("nibi", WALLET_ADDRESS, balances, "spendable", NIBI_REST_API_URL) +
+        cosmos.value_other_denoms("nibi", WALLET_ADDRESS, rewards, "rewards", NIBI_REST_API_URL)
+    )
+
     return {
         "Wallet Address": WALLET_ADDRESS,
         "NIBI Price (USD)": f"{nibi_price:.4f}",
@@ -107,7 +107,7 @@ def get_wallet_balance_data():
         "Delegated Value (USD)": f"{delegated_balance_value:.4f}",
         "Reward (NIBI)": f"{reward_balance:.6f}",
         "Reward Value (USD)": f"{reward_balance_value:.4f}"
-    }
+    }, others
 
 
     return {
@@ -121,8 +121,8 @@ def get_wallet_balance_data():
         "Reward Value (USD)": f"{reward_balance_value:.4f}"
     }
 
-def export_to_csv(data, filename):
-    """Export the results to a CSV file."""
+def export_to_csv(data, filename, others=()):
+    """Export the results to a CSV file, with other denoms (Positions) listed below."""
     try:
         os.makedirs(REPORTS_FOLDER, exist_ok=True)
 
@@ -138,6 +138,7 @@ def export_to_csv(data, filename):
             writer.writeheader()
 
             writer.writerow(data)
+            other_value = cosmos.export_other_denoms(csvfile, others)
 
             total_nibi = (
                 safe_float(data['Spendable (NIBI)']) +
@@ -148,7 +149,8 @@ def export_to_csv(data, filename):
             total_value = (
                 safe_float(data['Spendable Value (USD)']) +
                 safe_float(data['Delegated Value (USD)']) +
-                safe_float(data['Reward Value (USD)'])
+                safe_float(data['Reward Value (USD)']) +
+                other_value
             )
 
             writer.writerow({})
@@ -168,23 +170,47 @@ def export_to_csv(data, filename):
         print(f"\nData successfully exported to {file_path}")
     except Exception as e:
         print(f"\nError exporting to CSV: {e}")
+
+def collect(wallet_address, categories=CATEGORIES):
+    """Return the valued positions of one wallet (see snapshot.Position).
+
+    Each category is its own query, so only the requested ones are fetched.
+    Balances and rewards in other denoms are valued too (see cosmos.value_other_denoms).
+    """
+    price = snapshot.cached_price("nibi", fetch_nibi_price)
+    fetchers = {
+        "spendable": lambda: fetch_account_balances(wallet_address),
+        "staked": lambda: [schemas.Coin('unibi', fetch_account_delegations(wallet_address))],
+        "rewards": lambda: fetch_account_rewards(wallet_address)
+    }
+    positions = []
+    for category in CATEGORIES:
+        if category in categories:
+            coins = fetchers[category]()
+            raw = int(schemas.amount_of(coins, 'unibi'))
+            positions.append(snapshot.Position.of(
+                "nibi", wallet_address, "NIBI", "unibi", category, convert_to_nibi(raw), price, 6, raw, f"cosmos-{cosmos.transport()}"
+            ))
+            positions.extend(cosmos.value_other_denoms("nibi", wallet_address, coins, category, NIBI_REST_API_URL))
+    return positions
+
 def main():
     """Main function to execute the script."""
-    global loading
-
     print("Running...")
-    loading_thread = threading.Thread(target=show_loading, args=("Fetching data",))
-    loading_thread.start()
 
-    wallet_data = get_wallet_balance_data()
+    progress = Progress("NIBI")
+    progress.stage("Fetching data")
+
+    wallet_data, others = get_wallet_balance_data(progress)
 
-    loading = False
-    loading_thread.join()
+    progress.finish()
 
     if wallet_data:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"NIBI_Wallet_{timestamp}.csv"
-        export_to_csv(wallet_data, filename)
+        export_to_csv(wallet_data, filename, others)
+
+    metrics.export_trace("NIBI")
 
     print("Done!")
 
@@ -0,0 +1,86 @@
+import sys
+import json
+import threading
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+FORMATS = ("jsonl", "arrow")
+
+# Fields of the normalized records (snapshot.Position.record()) in order,
+# with the name of their pyarrow type
+FIELDS = (
+    ("chain", "string"),
+    ("wallet", "string"),
+    ("asset", "string"),
+    ("address", "string"),
+    ("category", "string"),
+    ("base_units", "string"),
+    ("decimals", "int32"),
+    ("balance", "float64"),
+    ("price", "float64"),
+    ("value", "float64"),
+    ("source", "string"),
+    ("timestamp", "string")
+)
+
+
+class JsonLinesWriter:
+    """Write one JSON record per position per line, flushed as it arrives."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def write(self, positions):
+        lines = "".join(json.dumps(position.record()) + "\n" for position in positions)
+        with self._lock:
+            self.stream.write(lines)
+            self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+        if self.stream is not sys.stdout:
+            self.stream.close()
+
+
+class ArrowWriter:
+    """Write positions as an Arrow IPC stream, one record batch per write().
+
+    Needs pyarrow. Base units are strings, like in the JSON records.
+    """
+
+    def __init__(self, stream):
+        if pyarrow is None:
+            raise RuntimeError("pyarrow is not installed; run `pip install pyarrow` or use the jsonl format")
+        self.schema = pyarrow.schema([(name, getattr(pyarrow, type_name)()) for name, type_name in FIELDS])
+        self.stream = stream
+        self._writer = pyarrow.ipc.new_stream(stream, self.schema)
+        self._lock = threading.Lock()
+
+    def write(self, positions):
+        records = [position.record() for position in positions]
+        if not records:
+            return
+        batch = pyarrow.RecordBatch.from_pylist(records, schema=self.schema)
+        with self._lock:
+            self._writer.write_batch(batch)
+            self.stream.flush()
+
+    def close(self):
+        self._writer.close()
+        self.stream.flush()
+        if self.stream is not sys.stdout.buffer:
+            self.stream.close()
+
+
+def open_writer(fmt, path="-"):
+    """Open a JSON Lines or Arrow writer on `path`, or on stdout for "-"."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    if fmt == "jsonl":
+        return JsonLinesWriter(sys.stdout if path == "-" else open(path, mode='w'))
+    return ArrowWriter(sys.stdout.buffer if path == "-" else open(path, mode='wb'))
@@ -0,0 +1,171 @@
+import os
+import argparse
+from datetime import datetime
+from typing import NamedTuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import chains
+import manifest
+import metrics
+import snapshot
+from portfolio import Portfolio, export_to_csv, save_snapshot
+from progress import Progress
+
+CONCURRENCY = int(os.getenv("PLANNER_CONCURRENCY", "8"))  # nodes in flight
+
+class Node(NamedTuple):
+    kind: str  # "price", "batch" (one collect_many call) or "wallet"
+    chain: str
+    wallets: tuple = ()
+
+
+class Plan:
+    """The lookups a manifest needs, as a graph of Nodes and their dependencies.
+
+    Each chain's native price is one node that its wallet nodes depend on.
+    Chains whose module has collect_many() get one batch node for all of
+    their wallets instead of one node per wallet. Token prices and
+    metadata are only known once balances arrive; the collectors share
+    those through memo.shared, so each token is still looked up once.
+    """
+
+    def __init__(self, wallets):
+        self.wallets = wallets
+        self.deps = {}
+
+    def add(self, node, deps=()):
+        self.deps[node] = set(deps)
+        return node
+
+    def __len__(self):
+        return len(self.deps)
+
+    def counts(self):
+        counts = {}
+        for node in self.deps:
+            counts[node.kind] = counts.get(node.kind, 0) + 1
+        return counts
+
+
+def plan(wallets):
+    """Expand (chain, wallet) pairs into a Plan, dropping repeated wallets and lookups."""
+    wallets = list(dict.fromkeys(wallets))
+    by_chain = {}
+    for chain, wallet in wallets:
+        by_chain.setdefault(chain, []).append(wallet)
+
+    graph = Plan(wallets)
+    for chain, chain_wallets in by_chain.items():
+        module = chains.load(chain)
+        deps = [graph.add(Node("price", chain))] if chains.get(chain).price else []
+        if hasattr(module, "collect_many"):
+            graph.add(Node("batch", chain, tuple(chain_wallets)), deps)
+        else:
+            for wallet in chain_wallets:
+                graph.add(Node("wallet", chain, (wallet,)), deps)
+    return graph
+
+
+def _run(node, categories):
+    """Run one node, returning its positions (or None if it failed)."""
+    module = chains.load(node.chain)
+    if node.kind == "price":
+        # Lands in the cache under the chain id, where the collectors look it up
+        snapshot.cached_price(node.chain, getattr(module, chains.get(node.chain).price))
+        return []
+    if node.kind == "batch":
+        try:
+            return module.collect_many(list(node.wallets), categories or module.CATEGORIES)
+        except Exception as e:
+            print(f"\nError collecting {len(node.wallets)} {node.chain} wallets: {e}")
+            return None
+    return chains.collect(node.chain, node.wallets[0], categories)
+
+
+def execute(graph, progress, categories=None, portfolio=None):
+    """Run every node of `graph` as soon as its dependencies are done, folding positions into `portfolio`."""
+    portfolio = portfolio if portfolio is not None else Portfolio()
+    categories = categories or {}
+    progress.plan(len(graph))
+
+    waiting = {node: set(deps) for node, deps in graph.deps.items()}
+    dependents = {}
+    for node, deps in graph.deps.items():
+        for dep in deps:
+            dependents.setdefault(dep, []).append(node)
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+        def submit(node):
+            del waiting[node]
+            return executor.submit(_run, node, categories.get(node.chain))
+
+        running = {submit(node): node for node in [node for node, deps in waiting.items() if not deps]}
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                portfolio.add(future.result() or [])
+                progress.advance()
+                for dependent in dependents.get(node, ()):
+                    waiting[dependent].discard(node)
+                    if not waiting[dependent]:
+                        running[submit(dependent)] = dependent
+    return portfolio
+
+
+def describe(graph):
+    """Print what a plan will fetch, next to a wallet-by-wallet run."""
+    counts = graph.counts()
+    unshared = len(graph.wallets) + sum(1 for chain, _ in graph.wallets if chains.get(chain).price)
+    print(
+        f"{len(graph.wallets)} wallets: {len(graph)} lookups ({counts.get('price', 0)} shared prices, "
+        f"{counts.get('batch', 0)} batches, {counts.get('wallet', 0)} wallets) instead of {unshared}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect every wallet of a manifest with the fewest lookups.")
+    parser.add_argument("manifest", nargs="?", default=manifest.MANIFEST_FILE)
+    parser.add_argument("--dry-run", action="store_true", help="print the plan without fetching")
+    args = parser.parse_args()
+
+    try:
+        loaded = manifest.load(args.manifest)
+    except OSError as e:
+        print(f"Error reading {args.manifest}: {e} (create one with manifest.py)")
+        return
+    except ValueError as e:
+        print(f"Error parsing {args.manifest}: {e}")
+        return
+
+    graph = plan(loaded.wallets)
+    describe(graph)
+    if args.dry_run:
+        return
+
+    progress = Progress("Planner")
+    progress.stage(f"Collecting {len(graph.wallets)} wallets")
+    portfolio = execute(graph, progress, loaded.categories)
+    progress.finish()
+
+    providers = metrics.summary()
+    issued = sum(entry["requests"] for entry in providers.values())
+    shared = sum(entry.get("cache", {}).get("hit", 0) for entry in providers.values())
+    print(f"{issued} requests issued, {shared} lookups shared")
+
+    summary = portfolio.summary()
+    for chain, totals in sorted(summary["chains"].items()):
+        print(f"{chain}: {totals['total_value_usd']:.2f} USD")
+    print(f"Total: {summary['total_value_usd']:.2f} USD")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    export_to_csv(portfolio, f"Portfolio_{timestamp}.csv")
+    save_snapshot(portfolio, f"Portfolio_{timestamp}")
+
+    metrics.export_trace("Planner")
+
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import os
+import csv
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import chains
+import metrics
+import snapshot
+from progress import Progress
+
+REPORTS_FOLDER = "reports"
+SNAPSHOTS_FOLDER = os.path.join(REPORTS_FOLDER, "snapshots")
+CONCURRENCY = int(os.getenv("PORTFOLIO_CONCURRENCY", "8"))  # wallets collected at once
+
+
+class Portfolio:
+    """Cross-chain positions folded into one snapshot as they arrive.
+
+    Running totals per chain, per category, per (chain, category) and
+    overall are updated on every add(), so they are current at any point
+    and final as soon as the last chain is added.
+    """
+
+    def __init__(self, positions=()):
+        self.positions = []
+        self.chain_totals = {}
+        self.category_totals = {}
+        self.chain_category_totals = {}
+        self.total = 0.0
+        self._lock = threading.Lock()
+        self.add(positions)
+
+    def add(self, positions):
+        """Fold positions into the snapshot."""
+        with self._lock:
+            for position in positions:
+                self.positions.append(position)
+                self.chain_totals[position.chain] = self.chain_totals.get(position.chain, 0.0) + position.value
+                self.category_totals[position.category] = self.category_totals.get(position.category, 0.0) + position.value
+                key = (position.chain, position.category)
+                self.chain_category_totals[key] = self.chain_category_totals.get(key, 0.0) + position.value
+                self.total += position.value
+
+    def summary(self):
+        """Return the totals as a JSON-ready dict."""
+        with self._lock:
+            by_chain = {}
+            for (chain, category), total in self.chain_category_totals.items():
+                by_chain.setdefault(chain, {"total_value_usd": self.chain_totals[chain], "categories": {}})["categories"][category] = total
+            return {
+                "total_value_usd": self.total,
+                "categories": dict(self.category_totals),
+                "chains": by_chain,
+                "positions": len(self.positions)
+            }
+
+
+def default_wallets(selected=None):
+    """The wallets configured in each (or each selected) aggregator module, as (chain, wallet) pairs."""
+    wallets = []
+    for chain in selected or chains.ids():
+        module = chains.load(chain)
+        configured = getattr(module, "WALLETS", None)
+        if configured is None:
+            configured = [getattr(module, name) for name in ("WALLET_ADDRESS", "ADDRESS", "account_id") if hasattr(module, name)][:1]
+        wallets.extend((chain, wallet) for wallet in configured)
+    return list(dict.fromkeys(wallets))
+
+
+def collect(wallets, progress, portfolio=None):
+    """Collect every wallet concurrently, folding each into `portfolio` as it completes."""
+    portfolio = portfolio if portfolio is not None else Portfolio()
+    progress.plan(len(wallets))
+    if not wallets:
+        return portfolio
+
+    with ThreadPoolExecutor(max_workers=min(CONCURRENCY, len(wallets))) as executor:
+        futures = [executor.submit(chains.collect, chain, wallet) for chain, wallet in wallets]
+        for future in as_completed(futures):
+            portfolio.add(future.result() or [])
+            progress.advance()
+    return portfolio
+
+
+def export_to_csv(portfolio, filename):
+    """Export the positions with per-chain, per-category and overall totals."""
+    try:
+        positions = sorted(portfolio.positions, key=lambda position: position.value, reverse=True)
+        summary = portfolio.summary()
+
+        os.makedirs(REPORTS_FOLDER, exist_ok=True)
+
+        file_path = os.path.join(REPORTS_FOLDER, filename)
+
+        with open(file_path, mode='w', newline='') as csvfile:
+            fieldnames = ['Chain', 'Wallet', 'Asset', 'Address', 'Category', 'Balance', 'Price (USD)', 'Total Value (USD)']
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+
+            writer.writeheader()
+            for position in positions:
+                writer.writerow({
+                    "Chain": position.chain,
+                    "Wallet": position.wallet,
+                    "Asset": position.asset,
+                    "Address": position.address,
+                    "Category": position.category,
+                    "Balance": f"{position.balance:.6f}",
+                    "Price (USD)": f"{position.price:.6f}",
+                    "Total Value (USD)": f"{position.value:.6f}"
+                })
+
+            writer.writerow({})
+            for chain, totals in sorted(summary["chains"].items()):
+                for category, total in sorted(totals["categories"].items()):
+                    writer.writerow({"Chain": chain, "Wallet": "TOTAL", "Category": category, "Total Value (USD)": f"{total:.6f}"})
+                writer.writerow({"Chain": chain, "Wallet": "TOTAL", "Total Value (USD)": f"{totals['total_value_usd']:.6f}"})
+            writer.writerow({})
+            for category, total in sorted(summary["categories"].items()):
+                writer.writerow({"Chain": "TOTAL", "Category": category, "Total Value (USD)": f"{total:.6f}"})
+            writer.writerow({"Chain": "TOTAL", "Total Value (USD)": f"{summary['total_value_usd']:.6f}"})
+
+        print(f"\nData successfully exported to {file_path}")
+    except Exception as e:
+        print(f"\nError exporting to CSV: {e}")
+
+
+def save_snapshot(portfolio, name):
+    """Write the positions to reports/snapshots/<name>.jsonl, e.g. for diffing runs."""
+    path = os.path.join(SNAPSHOTS_FOLDER, f"{name}.jsonl")
+    try:
+        snapshot.write(path, portfolio.positions)
+        print(f"Snapshot written to {path}")
+        return path
+    except OSError as e:
+        print(f"\nError writing snapshot: {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build one cross-chain portfolio snapshot.")
+    parser.add_argument("wallets", nargs="?", help="wallet list file (default: the wallets configured in each aggregator)")
+    parser.add_argument("--chains", nargs="+", choices=chains.ids(), help="only these chains")
+    args = parser.parse_args()
+
+    wallets = chains.load_wallets(args.wallets) if args.wallets else default_wallets(args.chains)
+    if args.chains:
+        wallets = [(chain, wallet) for chain, wallet in wallets if chain in args.chains]
+
+    print("Running...")
+
+    progress = Progress("Portfolio")
+    progress.stage(f"Collecting {len(wallets)} wallets")
+    portfolio = collect(wallets, progress)
+    progress.finish()
+
+    summary = portfolio.summary()
+    for chain, totals in sorted(summary["chains"].items()):
+        print(f"{chain}: {totals['total_value_usd']:.2f} USD")
+    print(f"Total: {summary['total_value_usd']:.2f} USD")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    export_to_csv(portfolio, f"Portfolio_{timestamp}.csv")
+    save_snapshot(portfolio, f"Portfolio_{timestamp}")
+
+    metrics.export_trace("Portfolio")
+
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
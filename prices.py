@@ -0,0 +1,209 @@
+import os
+import time
+import threading
+from statistics import median
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+import coingecko
+import dexscreener
+import metrics
+
+MAX_DEVIATION = float(os.getenv("PRICE_MAX_DEVIATION", "0.05"))  # relative disagreement tolerated between sources
+SECONDARY_WAIT = float(os.getenv("PRICE_SECONDARY_WAIT", "2.0"))  # seconds to wait for the cross-check after the primary answered
+LATENCY_ALPHA = 0.3  # weight of the newest sample in the latency average
+FAILURE_COOLDOWN = 30  # seconds an unhealthy source is skipped, doubled per consecutive failure
+MAX_COOLDOWN = 600
+
+_executor = ThreadPoolExecutor(max_workers=8)
+
+
+class Source:
+    """One way of pricing an asset; `fetch()` returns a USD price, 0.0 or raises on failure."""
+
+    def __init__(self, name, fetch):
+        self.name = name
+        self.fetch = fetch
+
+    def __repr__(self):
+        return f"Source({self.name!r})"
+
+
+class SourceStats:
+    """Latency and health of one source, shared by every asset it prices."""
+
+    __slots__ = ("latency", "failures", "retry_at")
+
+    def __init__(self):
+        self.latency = None  # moving average in seconds; None until first success
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def healthy(self, now):
+        return self.failures == 0 or now >= self.retry_at
+
+    def succeeded(self, latency):
+        self.latency = latency if self.latency is None else LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * self.latency
+        self.failures = 0
+
+    def failed(self, now):
+        self.failures += 1
+        self.retry_at = now + min(FAILURE_COOLDOWN * 2 ** (self.failures - 1), MAX_COOLDOWN)
+
+
+_lock = threading.Lock()
+_stats = {}
+_accepted = {}  # asset -> last price that passed the checks
+
+
+def coingecko_source(coin_id):
+    """A CoinGecko source; the lookup is batched with every registered id."""
+    coingecko.register(coin_id)
+    return Source(f"coingecko:{coin_id}", lambda: coingecko.get_price(coin_id))
+
+
+def dexscreener_source(token, chain=None):
+    """A Dexscreener source: the price of `token` on its most liquid pair (see dexscreener.py)."""
+    return Source(f"dexscreener:{chain or 'any'}:{token}", lambda: dexscreener.get_price(token, chain))
+
+
+def _stats_of(source):
+    stats = _stats.get(source.name)
+    if stats is None:
+        stats = _stats[source.name] = SourceStats()
+    return stats
+
+
+def _ranked(sources):
+    """Healthy sources, fastest first; unmeasured ones go first so they get measured.
+
+    When every source is cooling down, all of them are returned: a
+    suspect price is better than none.
+    """
+    now = time.monotonic()
+    with _lock:
+        scored = [(source, _stats_of(source)) for source in sources]
+    healthy = [(source, stats) for source, stats in scored if stats.healthy(now)] or scored
+    healthy.sort(key=lambda item: -1.0 if item[1].latency is None else item[1].latency)
+    return [source for source, _ in healthy]
+
+
+def _timed(source):
+    """Fetch from `source`, updating its stats. Returns the price or None."""
+    start = time.perf_counter()
+    try:
+        price = source.fetch()
+        error = None if price and price > 0 else "no price"
+    except (requests.RequestException, ValueError) as e:
+        price, error = None, str(e)
+
+    with _lock:
+        stats = _stats_of(source)
+        if error is None:
+            stats.succeeded(time.perf_counter() - start)
+        else:
+            stats.failed(time.monotonic())
+    if error is not None:
+        print(f"Price source {source.name} failed: {error}")
+        return None
+    return price
+
+
+def _mark_outlier(source):
+    with _lock:
+        _stats_of(source).failed(time.monotonic())
+
+
+def _agree(a, b):
+    return abs(a - b) <= MAX_DEVIATION * max(a, b)
+
+
+def get_price(asset, sources):
+    """Return the USD price of `asset` from the fastest healthy source in `sources`.
+
+    The second-fastest source is queried alongside and, if it answers
+    within SECONDARY_WAIT seconds of the first, used as a cross-check.
+    When the two disagree by more than MAX_DEVIATION, the remaining
+    sources are consulted and the median wins; sources that deviate from
+    it are put on cooldown. Failing sources fall through to the next one.
+    Returns 0.0 when no source has a price; only then are the sources'
+    failures reported to metrics.failures().
+    """
+    with metrics.failures() as failed:
+        price = _get_price(asset, sources, metrics.bind(_timed))
+    if not price:
+        metrics.record_failure("prices", asset, "no source answered")
+        for (provider, endpoint), error in failed.items():
+            metrics.record_failure(provider, endpoint, error)
+    return price
+
+
+def _get_price(asset, sources, timed):
+    ranked = _ranked(sources)
+    pending = {_executor.submit(timed, source): source for source in ranked[:2]}
+    remaining = ranked[2:]
+    quotes = {}
+
+    # Primary: the first successful answer, topping up from the remaining sources on failure
+    while pending and not quotes:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            source = pending.pop(future)
+            price = future.result()
+            if price is not None:
+                quotes[source] = price
+            elif remaining:
+                fallback = remaining.pop(0)
+                pending[_executor.submit(timed, fallback)] = fallback
+
+    if not quotes:
+        print(f"Error fetching {asset} price: no source answered")
+        return 0.0
+
+    # Cross-check: give the other in-flight source a bounded head start over the answer we have
+    if pending:
+        done, _ = wait(pending, timeout=SECONDARY_WAIT)
+        for future in done:
+            price = future.result()
+            if price is not None:
+                quotes[pending[future]] = price
+
+    (primary, price), *others = quotes.items()
+    if not others or all(_agree(price, other) for _, other in others):
+        with _lock:
+            _accepted[asset] = price
+        return price
+
+    # Disagreement: ask everyone left and take the median
+    for source, result in zip(remaining, _executor.map(timed, remaining)):
+        if result is not None:
+            quotes[source] = result
+    if len(quotes) < 3:
+        # No tie-breaker: trust the quote nearest the last accepted price, else the primary
+        with _lock:
+            last = _accepted.get(asset)
+        if last is not None:
+            primary, price = min(quotes.items(), key=lambda item: abs(item[1] - last))
+        listed = ", ".join(f"{source.name}={quote:.6g}" for source, quote in quotes.items())
+        print(f"Warning: {asset} price sources disagree ({listed}); using {primary.name}")
+        return price
+
+    price = median(quotes.values())
+    for source, quote in quotes.items():
+        if not _agree(price, quote):
+            print(f"Rejected outlier {asset} price {quote:.6g} from {source.name} (median {price:.6g})")
+            _mark_outlier(source)
+    with _lock:
+        _accepted[asset] = price
+    return price
+
+
+def source_stats():
+    """Return {source name: {"latency": seconds, "failures": n, "healthy": bool}}."""
+    now = time.monotonic()
+    with _lock:
+        return {
+            name: {"latency": stats.latency, "failures": stats.failures, "healthy": stats.healthy(now)}
+            for name, stats in _stats.items()
+        }
@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime
+
+PROGRESS_FORMAT = os.getenv("PROGRESS_FORMAT", "terminal")
+
+
+def format_duration(seconds):
+    """Format a duration in seconds as a short human readable string."""
+    if seconds is None:
+        return "?"
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+class TerminalRenderer:
+    """Redraw a single status line on every event."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def __call__(self, event):
+        if event["event"] == "finish":
+            line = f"{event['stage']}: {event['completed']}/{event['planned']} done in {format_duration(event['elapsed'])}"
+            print(f"\r{line}\033[K", file=self.stream, flush=True)
+            return
+
+        line = f"{event['stage']}: {event['completed']}/{event['planned']}"
+        if event["throughput"]:
+            line += f" ({event['throughput']:.1f}/s, ETA {format_duration(event['eta'])})"
+        print(f"\r{line}\033[K", end='', file=self.stream, flush=True)
+
+
+class JsonLinesRenderer:
+    """Write every event as one JSON object per line."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+
+    def __call__(self, event):
+        self.stream.write(json.dumps(event) + "\n")
+        self.stream.flush()
+
+
+RENDERERS = {
+    "terminal": TerminalRenderer,
+    "json": JsonLinesRenderer
+}
+
+
+class Progress:
+    """Progress of one run: stage transitions and completed versus planned work.
+
+    Events are pushed to the listeners as they happen, so no thread has to
+    poll for changes and several runs can share one process.
+    """
+
+    def __init__(self, run_name, listeners=None):
+        self.run_name = run_name
+        self.listeners = list(listeners) if listeners is not None else [RENDERERS.get(PROGRESS_FORMAT, TerminalRenderer)()]
+        self.stage_name = "Starting"
+        self.completed = 0
+        self.planned = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def snapshot(self, event):
+        """Return the current state as an event dict."""
+        elapsed = time.monotonic() - self.started
+        throughput = self.completed / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.planned - self.completed, 0)
+        eta = remaining / throughput if throughput else None
+        return {
+            "event": event,
+            "run": self.run_name,
+            "stage": self.stage_name,
+            "completed": self.completed,
+            "planned": self.planned,
+            "elapsed": round(elapsed, 3),
+            "throughput": round(throughput, 3),
+            "eta": round(eta, 3) if eta is not None else None,
+            "at": datetime.now().isoformat()
+        }
+
+    def _emit(self, event):
+        for listener in self.listeners:
+            listener(event)
+
+    def stage(self, name):
+        """Enter a new stage of the run."""
+        with self._lock:
+            self.stage_name = name
+            event = self.snapshot("stage")
+        self._emit(event)
+
+    def plan(self, count=1):
+        """Add `count` units of work to the planned total."""
+        with self._lock:
+            self.planned += count
+            event = self.snapshot("plan")
+        self._emit(event)
+
+    def advance(self, count=1):
+        """Mark `count` planned units as completed."""
+        with self._lock:
+            self.completed += count
+            event = self.snapshot("advance")
+        self._emit(event)
+
+    def finish(self):
+        """Mark the run as finished."""
+        with self._lock:
+            event = self.snapshot("finish")
+        self._emit(event)
@@ -0,0 +1,36 @@
+import time
+import threading
+
+
+class RateLimiter:
+    """Token bucket shared by every thread calling one provider.
+
+    Allows `rate` calls per `per` seconds, with bursts of up to `burst` calls.
+    """
+
+    def __init__(self, rate, per=60.0, burst=None):
+        self.interval = per / rate
+        self.capacity = burst or 1
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.interval)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) * self.interval
+            time.sleep(wait)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        return False
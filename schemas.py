@@ -0,0 +1,475 @@
+import json
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class SchemaError(ValueError):
+    """Raised when a provider response doesn't match the expected schema.
+
+    Structs below are NamedTuples (no per-instance dict) built by `from_json`
+    classmethods that validate only the fields the aggregators rely on.
+    """
+
+    def __init__(self, struct, path, message):
+        self.struct = struct
+        self.path = path
+        super().__init__(f"{struct}: {'.'.join(str(p) for p in path) or '<root>'} {message}")
+
+
+def loads(content):
+    """Decode a JSON document, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def decode(response, struct):
+    """Decode a `requests` response body straight into `struct`."""
+    return struct.from_json(loads(response.content))
+
+
+def field(struct, data, *path, default=...):
+    """Walk `path` through nested dicts/lists, raising SchemaError when it is missing."""
+    value = data
+    for i, key in enumerate(path):
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            if default is not ...:
+                return default
+            raise SchemaError(struct, path[:i + 1], "is missing") from None
+    if value is None and default is not ...:
+        return default
+    return value
+
+
+def as_int(struct, value, *path):
+    """Convert a JSON number or numeric string to int."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise SchemaError(struct, path, f"is not an integer: {value!r}") from None
+
+
+def as_float(struct, value, *path):
+    """Convert a JSON number or numeric string to float."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise SchemaError(struct, path, f"is not a number: {value!r}") from None
+
+
+# Solana
+
+class SolanaBalance(NamedTuple):
+    lamports: int
+    slot: int = 0
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            as_int("SolanaBalance", field("SolanaBalance", data, 'result', 'value'), 'result', 'value'),
+            as_int("SolanaBalance", field("SolanaBalance", data, 'result', 'context', 'slot', default=0), 'result', 'context', 'slot')
+        )
+
+
+class SolanaNotification(NamedTuple):
+    """An `accountNotification` or `programNotification` (jsonParsed encoding)."""
+    subscription: int
+    slot: int
+    value: dict  # the account (accountSubscribe) or {"pubkey", "account"} (programSubscribe)
+
+    @classmethod
+    def from_json(cls, data):
+        params = field("SolanaNotification", data, 'params')
+        return cls(
+            subscription=as_int("SolanaNotification", field("SolanaNotification", params, 'subscription'), 'params', 'subscription'),
+            slot=as_int("SolanaNotification", field("SolanaNotification", params, 'result', 'context', 'slot'), 'params', 'result', 'context', 'slot'),
+            value=field("SolanaNotification", params, 'result', 'value')
+        )
+
+    @property
+    def lamports(self):
+        return as_int("SolanaNotification", field("SolanaNotification", self.value, 'lamports'), 'params', 'result', 'value', 'lamports')
+
+
+class SplTokenAccount(NamedTuple):
+    mint: str
+    amount: int
+    decimals: int
+    ui_amount: float
+    pubkey: str = ""
+
+    @classmethod
+    def from_json(cls, data):
+        info = field("SplTokenAccount", data, 'account', 'data', 'parsed', 'info')
+        token_amount = field("SplTokenAccount", info, 'tokenAmount')
+        amount = as_int("SplTokenAccount", field("SplTokenAccount", token_amount, 'amount'), 'tokenAmount', 'amount')
+        decimals = as_int("SplTokenAccount", field("SplTokenAccount", token_amount, 'decimals'), 'tokenAmount', 'decimals')
+        return cls(
+            mint=field("SplTokenAccount", info, 'mint'),
+            amount=amount,
+            decimals=decimals,
+            ui_amount=amount / (10 ** decimals),
+            pubkey=field("SplTokenAccount", data, 'pubkey', default='')
+        )
+
+
+# Sui
+
+class SuiBalance(NamedTuple):
+    coin_type: str
+    total_balance: int
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            coin_type=field("SuiBalance", data, 'coinType'),
+            total_balance=as_int("SuiBalance", field("SuiBalance", data, 'totalBalance'), 'totalBalance')
+        )
+
+
+class SuiCoinMetadata(NamedTuple):
+    name: str
+    symbol: str
+    decimals: int
+
+    @classmethod
+    def from_json(cls, data):
+        result = field("SuiCoinMetadata", data, 'result')
+        return cls(
+            name=field("SuiCoinMetadata", result, 'name', default='Unknown Token'),
+            symbol=field("SuiCoinMetadata", result, 'symbol', default='UNKNOWN'),
+            decimals=as_int("SuiCoinMetadata", field("SuiCoinMetadata", result, 'decimals'), 'result', 'decimals')
+        )
+
+
+class SuiStake(NamedTuple):
+    validator: str
+    principal: int  # MIST
+    estimated_reward: int  # MIST, 0 until the stake is active
+    status: str  # "Active", "Pending" or "Unstaked"
+
+    @classmethod
+    def list_from_json(cls, result):
+        """Flatten a `suix_getStakes` result, which groups stakes by validator."""
+        stakes = []
+        for i, group in enumerate(result):
+            validator = field("SuiStake", group, 'validatorAddress')
+            for j, stake in enumerate(field("SuiStake", group, 'stakes')):
+                stakes.append(cls(
+                    validator=validator,
+                    principal=as_int("SuiStake", field("SuiStake", stake, 'principal'), i, 'stakes', j, 'principal'),
+                    estimated_reward=as_int("SuiStake", field("SuiStake", stake, 'estimatedReward', default=0), i, 'stakes', j, 'estimatedReward'),
+                    status=field("SuiStake", stake, 'status', default='Active')
+                ))
+        return stakes
+
+
+class SuiObjectPage(NamedTuple):
+    types: list  # Move type of each object on the page
+    next_cursor: Optional[str]
+    has_next_page: bool
+
+    @classmethod
+    def from_json(cls, result):
+        """Parse a `suix_getOwnedObjects` result requested with showType."""
+        return cls(
+            types=[field("SuiObjectPage", item, 'data', 'type') for item in field("SuiObjectPage", result, 'data')],
+            next_cursor=field("SuiObjectPage", result, 'nextCursor', default=None),
+            has_next_page=bool(field("SuiObjectPage", result, 'hasNextPage', default=False))
+        )
+
+
+# Dexscreener
+
+class DexPair(NamedTuple):
+    pair_address: str
+    name: str
+    symbol: str
+    price_usd: float
+    liquidity_usd: float
+    volume_h24: float = 0.0
+    chain_id: str = ""
+    base_address: str = ""
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            pair_address=field("DexPair", data, 'pairAddress'),
+            name=field("DexPair", data, 'baseToken', 'name', default='Unknown'),
+            symbol=field("DexPair", data, 'baseToken', 'symbol', default='UNKNOWN'),
+            price_usd=as_float("DexPair", field("DexPair", data, 'priceUsd'), 'priceUsd'),
+            liquidity_usd=as_float("DexPair", field("DexPair", data, 'liquidity', 'usd', default=0.0), 'liquidity', 'usd'),
+            volume_h24=as_float("DexPair", field("DexPair", data, 'volume', 'h24', default=0.0), 'volume', 'h24'),
+            chain_id=field("DexPair", data, 'chainId', default=''),
+            base_address=field("DexPair", data, 'baseToken', 'address', default='')
+        )
+
+    @classmethod
+    def list_from_json(cls, data):
+        """Parse either a `tokens/v1` list or a `latest/dex` {"pairs": [...]} body.
+
+        Pairs that are malformed or have no USD price (new pools often don't)
+        are skipped rather than failing the whole token.
+        """
+        pairs = data.get('pairs') if isinstance(data, dict) else data
+        parsed = []
+        for pair in pairs or []:
+            try:
+                parsed.append(cls.from_json(pair))
+            except SchemaError:
+                continue
+        return parsed
+
+
+# CoinGecko
+
+def coingecko_price(data, coin_id, vs_currency="usd"):
+    """Extract one price from a `simple/price` response."""
+    return as_float("CoinGeckoPrice", field("CoinGeckoPrice", data, coin_id, vs_currency), coin_id, vs_currency)
+
+
+class PricePoint(NamedTuple):
+    timestamp: float  # unix seconds
+    price: float
+
+    @classmethod
+    def list_from_market_chart(cls, data):
+        """Parse the `prices` of a `market_chart/range` response ([[ms, price], ...])."""
+        return [
+            cls(as_float("MarketChart", field("MarketChart", point, 0), 'prices', i, 0) / 1000,
+                as_float("MarketChart", field("MarketChart", point, 1), 'prices', i, 1))
+            for i, point in enumerate(field("MarketChart", data, 'prices'))
+        ]
+
+
+# Cosmos SDK REST
+
+class Coin(NamedTuple):
+    denom: str
+    amount: int
+
+    @classmethod
+    def from_json(cls, data):
+        # Reward amounts are decimal strings ("123.456..."); truncate to base units
+        amount = field("Coin", data, 'amount')
+        return cls(
+            denom=field("Coin", data, 'denom'),
+            amount=as_int("Coin", str(amount).split('.')[0], 'amount')
+        )
+
+    @classmethod
+    def list_from_json(cls, data, key):
+        return [cls.from_json(coin) for coin in field("Coin", data, key)]
+
+
+class Delegation(NamedTuple):
+    validator_address: str
+    amount: int
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            validator_address=field("Delegation", data, 'delegation', 'validator_address'),
+            amount=as_int("Delegation", field("Delegation", data, 'balance', 'amount'), 'balance', 'amount')
+        )
+
+    @classmethod
+    def list_from_json(cls, data):
+        return [cls.from_json(delegation) for delegation in field("Delegation", data, 'delegation_responses')]
+
+
+def next_page_key(data):
+    """Return the `pagination.next_key` of a Cosmos SDK list response, or None."""
+    return field("Pagination", data, 'pagination', 'next_key', default=None)
+
+
+class DenomTrace(NamedTuple):
+    path: str
+    base_denom: str
+
+    @classmethod
+    def from_json(cls, data):
+        # ibc-go < v8: {"denom_trace": {"path", "base_denom"}}
+        if 'denom_trace' in data:
+            return cls(
+                path=field("DenomTrace", data, 'denom_trace', 'path', default=''),
+                base_denom=field("DenomTrace", data, 'denom_trace', 'base_denom')
+            )
+        # ibc-go >= v8: {"denom": {"base", "trace": [{"port_id", "channel_id"}]}}
+        hops = field("DenomTrace", data, 'denom', 'trace', default=[])
+        return cls(
+            path="/".join(f"{hop.get('port_id')}/{hop.get('channel_id')}" for hop in hops),
+            base_denom=field("DenomTrace", data, 'denom', 'base')
+        )
+
+
+def amount_of(coins, denom):
+    """Return the amount of `denom` in a list of Coins, or 0."""
+    return next((coin.amount for coin in coins if coin.denom == denom), 0)
+
+
+# Mina (minaexplorer)
+
+class MinaAccount(NamedTuple):
+    public_key: str
+    total_balance: float
+    epoch_staked: float
+    next_epoch_staked: float
+
+    @classmethod
+    def from_json(cls, data):
+        return cls.from_account(field("MinaAccount", data, 'account'))
+
+    @classmethod
+    def from_account(cls, account, scale=1):
+        """Build from one account object; `scale` divides raw amounts (1e9 for nanomina).
+
+        Only the REST API has the staking accounts; without them both staked amounts are 0.
+        """
+        epoch = field("MinaAccount", account, 'epochStakingAccount', default=[])
+        next_epoch = field("MinaAccount", account, 'nextEpochStakingAccount', default=[])
+        return cls(
+            public_key=field("MinaAccount", account, 'publicKey'),
+            total_balance=as_float("MinaAccount", field("MinaAccount", account, 'balance', 'total'), 'balance', 'total') / scale,
+            epoch_staked=as_float("MinaAccount", field("MinaAccount", epoch, 0, 'balance', default=0), 'epochStakingAccount') / scale,
+            next_epoch_staked=as_float("MinaAccount", field("MinaAccount", next_epoch, 0, 'balance', default=0), 'nextEpochStakingAccount') / scale
+        )
+
+
+# Taostats
+
+class TaoPrice(NamedTuple):
+    price: float
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(as_float("TaoPrice", field("TaoPrice", data, 'data', 0, 'price'), 'data', 0, 'price'))
+
+
+class TaoPriceHistory(NamedTuple):
+    points: list  # PricePoints, in response order
+    next_page: Optional[int]
+
+    @classmethod
+    def from_json(cls, data):
+        points = []
+        for i, item in enumerate(field("TaoPriceHistory", data, 'data')):
+            created_at = field("TaoPriceHistory", item, 'created_at', default=None) or field("TaoPriceHistory", item, 'last_updated')
+            try:
+                timestamp = datetime.fromisoformat(created_at.replace("Z", "+00:00")).timestamp()
+            except (AttributeError, ValueError):
+                raise SchemaError("TaoPriceHistory", ('data', i, 'created_at'), f"is not a timestamp: {created_at!r}") from None
+            points.append(PricePoint(timestamp, as_float("TaoPriceHistory", field("TaoPriceHistory", item, 'price'), 'data', i, 'price')))
+        return cls(points, field("TaoPriceHistory", data, 'pagination', 'next_page', default=None))
+
+
+class TaoAccount(NamedTuple):
+    address: str
+    balance_free: int
+    balance_staked: int
+    balance_total: int
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            address=field("TaoAccount", data, 'address', 'ss58', default=''),
+            balance_free=as_int("TaoAccount", field("TaoAccount", data, 'balance_free'), 'balance_free'),
+            balance_staked=as_int("TaoAccount", field("TaoAccount", data, 'balance_staked'), 'balance_staked'),
+            balance_total=as_int("TaoAccount", field("TaoAccount", data, 'balance_total'), 'balance_total')
+        )
+
+
+# NEAR
+
+class PikespeakToken(NamedTuple):
+    symbol: str
+    contract: str
+    amount: float
+    price_usd: float
+    value_usd: float
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            symbol=field("PikespeakToken", data, 'symbol', default='UNKNOWN'),
+            contract=field("PikespeakToken", data, 'contract', default='Unknown'),
+            amount=as_float("PikespeakToken", field("PikespeakToken", data, 'amount'), 'amount'),
+            price_usd=as_float("PikespeakToken", field("PikespeakToken", data, 'tokenPrice', default=0.0), 'tokenPrice'),
+            value_usd=as_float("PikespeakToken", field("PikespeakToken", data, 'usdValue', default=0.0), 'usdValue')
+        )
+
+
+def near_call_result(struct, data):
+    """Decode the JSON returned by a NEAR `call_function` view call."""
+    if 'error' in data:
+        raise SchemaError(struct, ('error',), f"returned by RPC: {data['error']}")
+    raw = field(struct, data, 'result', 'result')
+    try:
+        return loads(bytes(raw))
+    except (TypeError, ValueError):
+        raise SchemaError(struct, ('result', 'result'), "is not a JSON byte array") from None
+
+
+class NearPoolAccount(NamedTuple):
+    staked_balance: int
+    unstaked_balance: int
+
+    @classmethod
+    def from_json(cls, data):
+        account = near_call_result("NearPoolAccount", data)
+        return cls(
+            staked_balance=as_int("NearPoolAccount", field("NearPoolAccount", account, 'staked_balance'), 'staked_balance'),
+            unstaked_balance=as_int("NearPoolAccount", field("NearPoolAccount", account, 'unstaked_balance', default="0"), 'unstaked_balance')
+        )
+
+
+class NearViewAccount(NamedTuple):
+    amount: int
+    locked: int
+    storage_usage: int
+
+    @classmethod
+    def from_json(cls, data):
+        if 'error' in data:
+            raise SchemaError("NearViewAccount", ('error',), f"returned by RPC: {data['error']}")
+        result = field("NearViewAccount", data, 'result')
+        return cls(
+            amount=as_int("NearViewAccount", field("NearViewAccount", result, 'amount'), 'result', 'amount'),
+            locked=as_int("NearViewAccount", field("NearViewAccount", result, 'locked', default="0"), 'result', 'locked'),
+            storage_usage=as_int("NearViewAccount", field("NearViewAccount", result, 'storage_usage', default=0), 'result', 'storage_usage')
+        )
+
+
+class NearFtBalance(NamedTuple):
+    amount: int
+
+    @classmethod
+    def from_json(cls, data):
+        balance = near_call_result("NearFtBalance", data)
+        return cls(as_int("NearFtBalance", balance, 'result'))
+
+
+class NearFtMetadata(NamedTuple):
+    name: str
+    symbol: str
+    decimals: int
+
+    @classmethod
+    def from_json(cls, data):
+        metadata = near_call_result("NearFtMetadata", data)
+        return cls.from_dict(metadata)
+
+    @classmethod
+    def from_dict(cls, metadata):
+        return cls(
+            name=field("NearFtMetadata", metadata, 'name', default='Unknown Token'),
+            symbol=field("NearFtMetadata", metadata, 'symbol', default='UNKNOWN'),
+            decimals=as_int("NearFtMetadata", field("NearFtMetadata", metadata, 'decimals'), 'decimals')
+        )
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import chains
+import metrics
+from memo import SingleFlight
+from portfolio import Portfolio
+
+CACHE_TTL = int(os.getenv("SERVER_CACHE_TTL", "300"))  # seconds before a wallet is refreshed
+REFRESH_CONCURRENCY = int(os.getenv("SERVER_REFRESH_CONCURRENCY", "8"))
+WALLETS_FILE = os.getenv("SERVER_WALLETS_FILE", "wallets.txt")
+
+
+class PortfolioCache:
+    """In-memory positions per (chain, wallet), refreshed on demand.
+
+    Fresh entries are served from memory. Stale entries are served as they
+    are while one background refresh runs. Missing entries are fetched
+    before answering. Concurrent requests for the same wallet share a
+    single refresh.
+    """
+
+    def __init__(self, wallets, ttl=CACHE_TTL):
+        self.wallets = list(dict.fromkeys(wallets))
+        self.ttl = ttl
+        self._entries = {}  # (chain, wallet) -> (monotonic time, refreshed at, positions)
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        # Background refreshes and request fan-out use separate pools, so a
+        # startup warm-up queue never delays a request
+        self._executor = ThreadPoolExecutor(max_workers=REFRESH_CONCURRENCY)
+        self._request_executor = ThreadPoolExecutor(max_workers=REFRESH_CONCURRENCY)
+
+    def _refresh(self, chain, wallet):
+        def fetch():
+            positions = chains.collect(chain, wallet)
+            if positions is None:
+                raise RuntimeError(f"collecting {chain} wallet {wallet} failed")
+            entry = (time.monotonic(), time.time(), positions)
+            with self._lock:
+                self._entries[(chain, wallet)] = entry
+            return entry
+        return self._flight.do((chain, wallet), fetch)
+
+    def get(self, chain, wallet, force=False):
+        """Return (refreshed at, positions) for one wallet."""
+        with self._lock:
+            entry = self._entries.get((chain, wallet))
+        hit = entry is not None and not force and time.monotonic() - entry[0] < self.ttl
+        metrics.record_cache("server", chain, hit)
+
+        if entry is None or force:
+            entry = self._refresh(chain, wallet)
+        elif not hit and not self._flight.in_flight((chain, wallet)):
+            self._executor.submit(self._refresh, chain, wallet)
+        return entry[1], entry[2]
+
+    def get_many(self, wallets, force=False):
+        """Return {(chain, wallet): (refreshed at, positions)}, fetching missing wallets concurrently."""
+        futures = {key: self._request_executor.submit(self.get, *key, force) for key in wallets}
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                print(f"\nError refreshing {key[0]} wallet {key[1]}: {e}")
+        return results
+
+    def warm(self):
+        """Fetch every configured wallet in the background."""
+        for chain, wallet in self.wallets:
+            self._executor.submit(self._refresh, chain, wallet)
+
+
+def summarize(results):
+    """Turn get_many() results into a JSON-ready valuation with totals."""
+    portfolio = Portfolio()
+    wallets = []
+    for (chain, wallet), (refreshed_at, positions) in results.items():
+        portfolio.add(positions)
+        total = sum(position.value for position in positions)
+        wallets.append({
+            "chain": chain,
+            "wallet": wallet,
+            "refreshed_at": refreshed_at,
+            "total_value_usd": total,
+            "positions": [position._asdict() for position in positions]
+        })
+    summary = portfolio.summary()
+    summary["wallets"] = wallets
+    return summary
+
+
+class PortfolioHandler(BaseHTTPRequestHandler):
+    """JSON query API over a PortfolioCache (set as `cache` on the server).
+
+    GET /portfolio                  every configured wallet
+    GET /chains/<chain>             the configured wallets of one chain
+    GET /wallets/<chain>/<wallet>   one wallet (configured or not)
+    GET /metrics                    Prometheus metrics
+    Add ?refresh=1 to bypass the cache.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        force = parse_qs(url.query).get("refresh", ["0"])[0] == "1"
+        cache = self.server.cache
+
+        if parts == ["metrics"]:
+            self._send(200, metrics.render_prometheus(), "text/plain; version=0.0.4")
+        elif parts == ["health"]:
+            self._send_json(200, {"status": "ok", "wallets": len(cache.wallets)})
+        elif parts == ["portfolio"]:
+            self._send_json(200, summarize(cache.get_many(cache.wallets, force)))
+        elif len(parts) == 2 and parts[0] == "chains" and parts[1] in chains.REGISTRY:
+            wallets = [key for key in cache.wallets if key[0] == parts[1]]
+            self._send_json(200, summarize(cache.get_many(wallets, force)))
+        elif len(parts) == 3 and parts[0] == "wallets" and parts[1] in chains.REGISTRY:
+            try:
+                results = {(parts[1], parts[2]): cache.get(parts[1], parts[2], force)}
+            except Exception as e:
+                self._send_json(502, {"error": str(e)})
+                return
+            self._send_json(200, summarize(results))
+        else:
+            self._send_json(404, {"error": f"unknown path {url.path}"})
+
+    def _send_json(self, status, data):
+        self._send(status, json.dumps(data), "application/json")
+
+    def _send(self, status, body, content_type):
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(wallets, port, host="127.0.0.1", warm=True):
+    """Serve the portfolio API until interrupted."""
+    server = ThreadingHTTPServer((host, port), PortfolioHandler)
+    server.daemon_threads = True
+    server.cache = PortfolioCache(wallets)
+    if warm:
+        server.cache.warm()
+    print(f"Serving {len(wallets)} wallets on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve cached holdings and valuations as JSON.")
+    parser.add_argument("wallets", nargs="?", default=WALLETS_FILE, help="wallet list file (`<chain> <wallet>` per line)")
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8080")))
+    parser.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    parser.add_argument("--no-warm", action="store_true", help="don't fetch every wallet at startup")
+    args = parser.parse_args()
+
+    serve(chains.load_wallets(args.wallets), args.port, args.host, warm=not args.no_warm)
+
+
+if __name__ == "__main__":
+    main()
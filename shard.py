@@ -0,0 +1,235 @@
+import os
+import sys
+import glob
+import hashlib
+import argparse
+import contextlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import chains
+import output
+import metrics
+import snapshot
+import portfolio
+from journal import Journal
+from progress import Progress
+
+WORKDIR = os.getenv("SHARD_WORKDIR", ".shards")
+WALLET_CONCURRENCY = int(os.getenv("SHARD_WALLET_CONCURRENCY", "4"))  # wallets in flight per shard
+
+def shard_of(chain, wallet, shards):
+    """Stable shard index of a wallet, identical on every process and machine.
+
+    Python's hash() is salted per process, so a digest is used instead.
+    """
+    digest = hashlib.sha1(f"{chain}:{wallet}".encode()).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def partial_path(workdir, shard, shards):
+    return os.path.join(workdir, f"partial-{shard:04d}-of-{shards:04d}.jsonl")
+
+
+def journal_path(workdir, shard, shards):
+    return os.path.join(workdir, f"journal-{shard:04d}-of-{shards:04d}.jsonl")
+
+
+def failed_path(workdir, shard, shards):
+    return os.path.join(workdir, f"failed-{shard:04d}-of-{shards:04d}.txt")
+
+
+def _collect(chain, wallet, categories):
+    """chains.collect, returning None if any request failed transiently.
+
+    Collectors print and swallow fetch errors (returning zero balances),
+    so their requests are watched instead; such a wallet is retried on
+    the next run rather than journaled with wrong balances.
+    """
+    with metrics.failures() as failed:
+        positions = chains.collect(chain, wallet, categories)
+    if failed:
+        reasons = ", ".join(f"{provider} {endpoint}: {reason}" for (provider, endpoint), reason in failed.items())
+        print(f"\nNot journaling {chain} wallet {wallet} ({reasons})")
+        return None
+    return positions
+
+
+def failed_wallets(workdir=WORKDIR):
+    """Return the (chain, wallet) pairs that shards couldn't collect, per the failed-* files."""
+    wallets = []
+    for path in sorted(glob.glob(os.path.join(workdir, "failed-*-of-*.txt"))):
+        wallets.extend(chains.load_wallets(path))
+    return wallets
+
+
+def run_shard(wallets, shard, shards, workdir=WORKDIR, on_positions=None):
+    """Collect the wallets belonging to `shard` and write its partial snapshot.
+
+    Completed (chain, wallet, category) units are journaled as they arrive,
+    so a restarted shard only fetches what the journal doesn't have. Safe
+    to call from separate processes or machines sharing `workdir`: every
+    shard writes its own files, and the partial is written atomically.
+    `on_positions` is called with the positions of every completed wallet
+    (replayed ones first), e.g. to stream them out. Wallets that failed
+    are left out of the journal and the partial, and listed in the shard's
+    failed-* file until a later run collects them.
+    """
+    mine = [(chain, wallet) for chain, wallet in wallets if shard_of(chain, wallet, shards) == shard]
+    with Journal(journal_path(workdir, shard, shards)) as journal:
+        pending = []
+        for chain, wallet in mine:
+            categories = [
+                category for category in chains.load(chain).CATEGORIES
+                if (chain, wallet, category) not in journal
+            ]
+            if categories:
+                pending.append((chain, wallet, categories))
+        if len(pending) < len(mine):
+            print(f"\nShard {shard}: {len(mine) - len(pending)} of {len(mine)} wallets replayed from the journal")
+        if on_positions is not None and len(journal):
+            on_positions(journal.positions())
+
+        failed = []
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(WALLET_CONCURRENCY, len(pending))) as executor:
+                futures = {executor.submit(_collect, *task): task for task in pending}
+                for future in as_completed(futures):
+                    positions = future.result()
+                    chain, wallet, categories = futures[future]
+                    if positions is None:
+                        failed.append((chain, wallet))
+                        continue
+                    for category in categories:
+                        journal.record((chain, wallet, category), [position for position in positions if position.category == category])
+                    if on_positions is not None:
+                        on_positions(positions)
+
+        count = snapshot.write(partial_path(workdir, shard, shards), journal.positions())
+
+    if failed:
+        with open(failed_path(workdir, shard, shards), mode='w') as f:
+            f.writelines(f"{chain} {wallet}\n" for chain, wallet in failed)
+        print(f"\nShard {shard}: {len(failed)} wallets failed and will be retried on the next run")
+    elif os.path.exists(failed_path(workdir, shard, shards)):
+        os.remove(failed_path(workdir, shard, shards))
+
+    metrics.export_trace(f"Shard_{shard:04d}_of_{shards:04d}")
+    return shard, len(mine), count
+
+
+def run_local(wallets, shards, workdir=WORKDIR, processes=None, on_positions=None):
+    """Run every shard on a local process pool.
+
+    `on_positions` is called with each shard's positions as soon as that
+    shard finishes.
+    """
+    progress = Progress("Shards")
+    progress.stage(f"Collecting {len(wallets)} wallets in {shards} shards")
+    progress.plan(shards)
+    with ProcessPoolExecutor(max_workers=processes or min(shards, os.cpu_count() or 1)) as executor:
+        futures = [executor.submit(run_shard, wallets, shard, shards, workdir) for shard in range(shards)]
+        for future in as_completed(futures):
+            shard = future.result()[0]
+            if on_positions is not None:
+                on_positions(list(snapshot.read(partial_path(workdir, shard, shards))))
+            progress.advance()
+    progress.finish()
+
+
+def merge(workdir=WORKDIR, shards=None):
+    """Read every partial snapshot in `workdir` and return all positions.
+
+    With `shards` given, missing partials are reported (a shard that hasn't
+    finished yet, or failed), as are wallets listed in failed-* files.
+    """
+    paths = sorted(glob.glob(os.path.join(workdir, "partial-*-of-*.jsonl")))
+    if shards is not None:
+        expected = {partial_path(workdir, shard, shards) for shard in range(shards)}
+        missing = sorted(expected - set(paths))
+        if missing:
+            print(f"Missing {len(missing)} of {shards} partial snapshots: {', '.join(os.path.basename(path) for path in missing)}")
+        paths = sorted(expected & set(paths))
+
+    failed = failed_wallets(workdir)
+    if failed:
+        print(f"Warning: {len(failed)} wallets failed to collect and are missing from the report: "
+              f"{', '.join(f'{chain} {wallet}' for chain, wallet in failed)}. Run the shards again to retry them.")
+
+    positions = []
+    for path in paths:
+        positions.extend(snapshot.read(path))
+    return positions
+
+
+def clear_journals(workdir=WORKDIR):
+    """Delete the shard journals once the merged report is written, so the next run starts fresh."""
+    for path in glob.glob(os.path.join(workdir, "journal-*-of-*.jsonl")):
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect a large wallet fleet in shards and merge the results.")
+    parser.add_argument("command", choices=["run", "worker", "merge"],
+                        help="run: all shards on a local process pool, then merge; "
+                             "worker: one shard (e.g. one per machine); merge: build the report from the partials")
+    parser.add_argument("wallets", nargs="?", help="wallet list file (`<chain> <wallet>` per line)")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard", type=int, help="shard index for `worker`")
+    parser.add_argument("--processes", type=int, help="process pool size for `run` (default: min(shards, cores))")
+    parser.add_argument("--workdir", default=WORKDIR, help="directory holding the partial snapshots")
+    parser.add_argument("--format", choices=output.FORMATS,
+                        help="also stream normalized position records while collecting (merge: all positions)")
+    parser.add_argument("--output", default="-", help="file for --format records (default: stdout)")
+    args = parser.parse_args()
+
+    if args.command in ("run", "worker") and not args.wallets:
+        parser.error(f"`{args.command}` needs a wallet list")
+    if args.command == "worker" and (args.shard is None or not 0 <= args.shard < args.shards):
+        parser.error("`worker` needs --shard between 0 and --shards - 1")
+
+    writer = None
+    if args.format:
+        try:
+            writer = output.open_writer(args.format, args.output)
+        except (RuntimeError, OSError) as e:
+            parser.error(str(e))
+
+    # Keep status messages off stdout when records are streamed there
+    status = sys.stderr if writer is not None and args.output == "-" else sys.stdout
+    with contextlib.redirect_stdout(status):
+        run(args, writer)
+
+    if writer is not None:
+        writer.close()
+
+
+def run(args, writer):
+    on_positions = writer.write if writer is not None else None
+
+    print("Running...")
+
+    if args.command == "worker":
+        shard, wallet_count, position_count = run_shard(chains.load_wallets(args.wallets), args.shard, args.shards, args.workdir, on_positions)
+        print(f"Shard {shard}: {wallet_count} wallets, {position_count} positions")
+        print("Done!")
+        return
+
+    if args.command == "run":
+        run_local(chains.load_wallets(args.wallets), args.shards, args.workdir, args.processes, on_positions)
+
+    positions = merge(args.workdir, args.shards)
+    if args.command == "merge" and on_positions is not None:
+        on_positions(positions)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    merged = portfolio.Portfolio(positions)
+    portfolio.export_to_csv(merged, f"Portfolio_{timestamp}.csv")
+    portfolio.save_snapshot(merged, f"Portfolio_{timestamp}")
+    complete = all(os.path.exists(partial_path(args.workdir, shard, args.shards)) for shard in range(args.shards))
+    if complete and not failed_wallets(args.workdir):
+        clear_journals(args.workdir)
+
+    print("Done!")
+
+if __name__ == "__main__":
+    main()
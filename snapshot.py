@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import threading
+from decimal import Decimal
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+import schemas
+
+PRICE_TTL = 60  # seconds a per-process price lookup is reused
+
+
+class Position(NamedTuple):
+    """One valued holding: an asset held by a wallet on a chain, in one category.
+
+    `category` is e.g. "spendable", "staked", "unstaked", "rewards" or
+    "storage". Balances are in display units, prices and values in USD.
+    `base_units` and `decimals` are None when the provider only reports
+    display amounts; `source` names the provider the balance came from.
+    """
+    chain: str
+    wallet: str
+    asset: str
+    address: str
+    category: str
+    balance: float
+    price: float
+    value: float
+    decimals: Optional[int] = None
+    base_units: Optional[int] = None
+    source: str = ""
+    timestamp: str = ""
+
+    @classmethod
+    def of(cls, chain, wallet, asset, address, category, balance, price, decimals=None, base_units=None, source=""):
+        if base_units is None and decimals is not None:
+            base_units = int(Decimal(repr(balance)).scaleb(decimals).to_integral_value())
+        return cls(
+            chain, wallet, asset, address, category, balance, price, balance * price,
+            decimals, base_units, source, datetime.now(timezone.utc).isoformat(timespec="seconds")
+        )
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            chain=schemas.field("Position", data, 'chain'),
+            wallet=schemas.field("Position", data, 'wallet'),
+            asset=schemas.field("Position", data, 'asset'),
+            address=schemas.field("Position", data, 'address', default=''),
+            category=schemas.field("Position", data, 'category'),
+            balance=schemas.as_float("Position", schemas.field("Position", data, 'balance'), 'balance'),
+            price=schemas.as_float("Position", schemas.field("Position", data, 'price', default=0.0), 'price'),
+            value=schemas.as_float("Position", schemas.field("Position", data, 'value', default=0.0), 'value'),
+            decimals=schemas.field("Position", data, 'decimals', default=None),
+            base_units=schemas.field("Position", data, 'base_units', default=None),
+            source=schemas.field("Position", data, 'source', default=''),
+            timestamp=schemas.field("Position", data, 'timestamp', default='')
+        )
+
+    def record(self):
+        """Return the normalized output record (see output.py).
+
+        Base units are a string: 18- and 24-decimal amounts don't fit a
+        64-bit integer or a JSON double.
+        """
+        return {
+            "chain": self.chain,
+            "wallet": self.wallet,
+            "asset": self.asset,
+            "address": self.address,
+            "category": self.category,
+            "base_units": str(self.base_units) if self.base_units is not None else None,
+            "decimals": self.decimals,
+            "balance": self.balance,
+            "price": self.price,
+            "value": self.value,
+            "source": self.source,
+            "timestamp": self.timestamp
+        }
+
+
+def write(path, positions):
+    """Write positions as JSON Lines, atomically (readers never see a partial file)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    count = 0
+    with open(tmp_path, mode='w') as f:
+        for position in positions:
+            f.write(json.dumps(position._asdict()) + "\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def read(path):
+    """Yield the positions of a JSON Lines snapshot."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield Position.from_json(schemas.loads(line))
+
+
+_prices_lock = threading.Lock()
+_prices = {}
+
+
+def cached_price(key, fetch):
+    """Return `fetch()`, reused for PRICE_TTL seconds within this process.
+
+    Collectors are called once per wallet; this keeps them from refetching
+    the chain's native price for every wallet. Zero (failed) lookups are
+    not cached.
+    """
+    with _prices_lock:
+        fetched_at, price = _prices.get(key, (float("-inf"), 0.0))
+        if time.monotonic() - fetched_at < PRICE_TTL:
+            return price
+    price = fetch()
+    if price:
+        with _prices_lock:
+            _prices[key] = (time.monotonic(), price)
+    return price
@@ -1,55 +1,54 @@
 import os
 import requests
 import csv
-import time
 from datetime import datetime
-import threading
+
+import dexscreener
+import jsonstream
+import memo
+import metrics
+import prices
+import schemas
+import snapshot
+from progress import Progress
 
 # Constants
 RPC_ENDPOINT = "https://api.mainnet-beta.solana.com"
-DEX_SCREENER_API_URL = "https://api.dexscreener.com/tokens/v1/solana/"
 WALLET_ADDRESS = "5Z7UwKzHbYfoJos5MZmLPbDpgkCbAayteirQT3aU5hRU"
 REPORTS_FOLDER = "reports"
-
-# Loading animation
-loading = True
-
-def show_loading(message):
-    """Show a loading animation in the terminal."""
-    global loading
-    dots = 0
-    while loading:
-        print(f"\r{message}{'.' * (dots % 4)}", end='', flush=True)
-        dots += 1
-        time.sleep(0.5)
-
-    # After loading stops, persist the message with dots
-    print(f"\r{message}...", end='', flush=True)
-
-def get_solana_balance(wallet_address: str) -> float:
-    """Fetch the SOL balance for a given wallet address."""
+CATEGORIES = ("spendable",)  # position categories returned by collect()
+SOL_MINT = "So11111111111111111111111111111111111111112"
+SOL_PRICE_SOURCES = (
+    prices.dexscreener_source(SOL_MINT, chain="solana"),
+    prices.coingecko_source("solana")
+)
+
+def fetch_balance(wallet_address: str):
+    """Fetch the lamports of a wallet and the slot they were read at, as a SolanaBalance. Raises on errors."""
     payload = {
         "jsonrpc": "2.0",
         "id": 1,
         "method": "getBalance",
         "params": [wallet_address]
     }
+    response = metrics.post("solana-rpc", "getBalance", RPC_ENDPOINT, json=payload)
+    response.raise_for_status()
+    return schemas.decode(response, schemas.SolanaBalance)
 
+def get_solana_balance(wallet_address: str) -> float:
+    """Fetch the SOL balance for a given wallet address."""
     try:
-        response = requests.post(RPC_ENDPOINT, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        balance_lamports = data['result']['value']
-        balance_sol = balance_lamports / 1_000_000_000  # 1 SOL = 1,000,000,000 Lamports
+        balance = fetch_balance(wallet_address)
+        balance_sol = balance.lamports / 1_000_000_000  # 1 SOL = 1,000,000,000 Lamports
         return balance_sol
     except requests.RequestException as e:
         print(f"\nRequest error: {e}")
-    except KeyError:
-        print("\nError parsing response data.")
+    except ValueError as e:
+        print(f"\nError parsing response data: {e}")
     return 0.0
 
-def get_spl_tokens(wallet_address: str):
-    """Fetch the SPL tokens for a given wallet address."""
+def fetch_spl_tokens(wallet_address: str):
+    """Fetch the SPL token accounts of a wallet. Raises on errors."""
     payload = {
         "jsonrpc": "2.0",
         "id": 1,
@@ -61,46 +60,57 @@ def get_spl_tokens(wallet_address: str):
         ]
     }
 
-    try:
-        response = requests.post(RPC_ENDPOINT, json=payload)
+    # Stream the token accounts so large wallets don't buffer the whole response
+    with metrics.post("solana-rpc", "getTokenAccountsByOwner", RPC_ENDPOINT, json=payload, stream=True) as response:
         response.raise_for_status()
-        data = response.json()
-        token_accounts = data['result']['value']
         tokens = []
 
-        for account in token_accounts:
-            mint_address = account['account']['data']['parsed']['info']['mint']
-            token_amount = account['account']['data']['parsed']['info']['tokenAmount']
-            ui_amount = float(token_amount['uiAmount'])
-            tokens.append({"mint": mint_address, "amount": ui_amount})
+        for account in jsonstream.iter_response_items(response, ("result", "value")):
+            token = schemas.SplTokenAccount.from_json(account)
+            tokens.append({
+                "mint": token.mint, "amount": token.ui_amount, "decimals": token.decimals, "base_units": token.amount, "account": token.pubkey
+            })
+
+    return tokens
 
-        return tokens
+def get_spl_tokens(wallet_address: str):
+    """Fetch the SPL tokens for a given wallet address."""
+    try:
+        return fetch_spl_tokens(wallet_address)
     except requests.RequestException as e:
         print(f"\nRequest error: {e}")
-    except KeyError:
-        print("\nError parsing response data.")
+    except (KeyError, ValueError) as e:
+        print(f"\nError parsing response data: {e}")
     return []
 
+@memo.shared("dexscreener", "token-price")
+def fetch_token_metadata_and_price(token_address: str):
+    """Fetch token metadata and price from the token's most liquid DEX Screener pair.
+
+    Raises requests.RequestException or ValueError, so failures aren't shared.
+    """
+    pair = dexscreener.get_pair(token_address, "solana")
+    if pair is not None:
+        return pair.name, pair.symbol, pair.price_usd
+    return "Unknown Token", "UNKNOWN", 0.0
+
 def get_token_metadata_and_price(token_address: str):
-    """Fetch token metadata and price from the DEX Screener API."""
+    """Token metadata and price, or ("Unknown Token", "UNKNOWN", 0.0) on errors."""
     try:
-        response = requests.get(DEX_SCREENER_API_URL + token_address)
-        if response.status_code == 200:
-            data = response.json()
-            if data:
-                for pair in data:
-                    base_token = pair.get('baseToken', {})
-                    name = base_token.get('name', 'Unknown')
-                    symbol = base_token.get('symbol', 'UNKNOWN')
-                    price_usd = float(pair.get('priceUsd', 0.0))
-                    return name, symbol, price_usd
-        else:
-            print(f"\nError fetching metadata for {token_address} (Status Code: {response.status_code})")
+        return fetch_token_metadata_and_price(token_address)
     except requests.RequestException as e:
         print(f"\nRequest error: {e}")
+        metrics.record_failure("dexscreener", "token-price", type(e).__name__)
+    except ValueError as e:
+        print(f"\nError parsing metadata for {token_address}: {e}")
+        metrics.record_failure("dexscreener", "token-price", type(e).__name__)
 
     return "Unknown Token", "UNKNOWN", 0.0
 
+def get_sol_price():
+    """Fetch the USD price of SOL from the fastest healthy price source."""
+    return prices.get_price("SOL", SOL_PRICE_SOURCES)
+
 def export_to_csv(data: list, filename: str):
     """Export the results to a CSV file, including a total value row."""
     try:
@@ -140,18 +150,47 @@ def export_to_csv(data: list, filename: str):
     except Exception as e:
         print(f"\nError exporting to CSV: {e}")
 
-def main():
-    global loading
+def collect(wallet_address: str, categories=CATEGORIES):
+    """Return the valued positions of one wallet (see snapshot.Position)."""
+    if "spendable" not in categories:
+        return []
+    return value_holdings(wallet_address, get_solana_balance(wallet_address), get_spl_tokens(wallet_address))
+
+def value_holdings(wallet_address, sol_balance, tokens, source="solana-rpc", quotes=None):
+    """Value a SOL balance and SPL token accounts (as returned by get_spl_tokens) as Positions.
+
+    `quotes` ({address: (symbol, price)}) keeps the prices looked up here for
+    later calls, so only addresses missing from it are priced.
+    """
+    quotes = {} if quotes is None else quotes
+    if "native SOL" not in quotes:
+        quotes["native SOL"] = ("SOL", snapshot.cached_price("solana", get_sol_price))
+    sol_price = quotes["native SOL"][1]
+    positions = [
+        snapshot.Position.of("solana", wallet_address, "SOL", "native SOL", "spendable", sol_balance, sol_price, 9, source=source)
+    ]
+    for token in tokens:
+        if token['mint'] not in quotes:
+            quotes[token['mint']] = get_token_metadata_and_price(token['mint'])[1:]
+        symbol, price_usd = quotes[token['mint']]
+        positions.append(snapshot.Position.of(
+            "solana", wallet_address, symbol, token['mint'], "spendable", token['amount'], price_usd,
+            token['decimals'], token['base_units'], source
+        ))
+    return positions
 
+def main():
     print("Running...")
 
-    # Start loading animation
-    loading_thread = threading.Thread(target=show_loading, args=("Fetching data",))
-    loading_thread.start()
+    progress = Progress("Solana")
+    progress.stage("Fetching balances")
+    progress.plan(3)
 
     # Get SOL balance and price
     sol_balance = get_solana_balance(WALLET_ADDRESS)
-    _, _, sol_price = get_token_metadata_and_price("So11111111111111111111111111111111111111112")  # SOL token address on Solana
+    progress.advance()
+    sol_price = get_sol_price()
+    progress.advance()
 
     # Get SPL token balances and prices
     results = []
@@ -165,7 +204,10 @@ def main():
     })
 
     tokens = get_spl_tokens(WALLET_ADDRESS)
+    progress.advance()
     if tokens:
+        progress.stage("Pricing tokens")
+        progress.plan(len(tokens))
         for token in tokens:
             mint_address = token['mint']
             balance = token['amount']
@@ -181,10 +223,9 @@ def main():
                 "Price (USD)": f"{price_usd:.6f}",
                 "Total Value (USD)": f"{total_value:.6f}"
             })
+            progress.advance()
 
-    # Stop loading animation and persist message
-    loading = False
-    loading_thread.join()
+    progress.finish()
 
     # CSV creation message
     print("\nCreating CSV file...")
@@ -194,6 +235,8 @@ def main():
     filename = f"{WALLET_ADDRESS}_Solana_{timestamp}.csv"
     export_to_csv(results, filename)
 
+    metrics.export_trace("Solana")
+
     print("Done!")
 
 if __name__ == "__main__":
@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+
+import requests
+
+import schemas
+import wsclient
+
+# Reconnect delays double from BACKOFF_INITIAL up to BACKOFF_MAX (seconds),
+# with jitter, and start over once a connection has resynced
+BACKOFF_INITIAL = 1.0
+BACKOFF_MAX = float(os.getenv("SUBSCRIBE_BACKOFF_MAX", "60"))
+PING_INTERVAL = 20  # seconds between keepalive pings; no frame for twice as long drops the connection
+DEBOUNCE = 0.5  # seconds to gather notifications before re-valuing a wallet
+CONNECT_TIMEOUT = 30  # seconds for the TCP, TLS and WebSocket handshakes
+PRICE_REFRESH = float(os.getenv("SUBSCRIBE_PRICE_REFRESH", "300"))  # seconds before cached prices are looked up again
+
+TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+TOKEN_ACCOUNT_SIZE = 165
+TOKEN_ACCOUNT_OWNER_OFFSET = 32
+
+
+def ws_endpoint(env, rpc_endpoint):
+    """The WebSocket endpoint of a chain: `env` if set, else its RPC endpoint over wss://."""
+    return os.getenv(env) or rpc_endpoint.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+
+
+class Watcher:
+    """Keep the holdings of some wallets current from subscription notifications.
+
+    Each connection subscribes first and then resyncs every wallet with one
+    poll, so changes made while disconnected are never missed. Changed
+    wallets are re-valued once notifications go quiet for DEBOUNCE seconds
+    and passed to `on_update(chain, wallet, positions)`.
+    """
+    chain = None
+
+    def __init__(self, wallets, url, on_update):
+        self.wallets = list(dict.fromkeys(wallets))
+        self.url = url
+        self.on_update = on_update
+        self.subscriptions = {}  # subscription id -> (kind, wallet)
+        self._pending = {}  # request id -> (kind, wallet)
+        self._dirty = set()
+        self._next_id = 0
+
+    def subscribe(self, ws):
+        """Send the subscription requests for every wallet."""
+        raise NotImplementedError
+
+    def resync(self):
+        """Poll every wallet once, raising requests.RequestException or ValueError on failure."""
+        raise NotImplementedError
+
+    def notify(self, message):
+        """Apply one notification, marking the wallets it changes dirty."""
+        raise NotImplementedError
+
+    def positions(self, wallet):
+        """The current Positions of a wallet."""
+        raise NotImplementedError
+
+    def _request(self, ws, method, params, kind, wallet):
+        self._next_id += 1
+        self._pending[self._next_id] = (kind, wallet)
+        ws.send(json.dumps({"jsonrpc": "2.0", "id": self._next_id, "method": method, "params": params}))
+
+    def _flush(self):
+        for wallet in [wallet for wallet in self.wallets if wallet in self._dirty]:
+            self._dirty.discard(wallet)
+            self.on_update(self.chain, wallet, self.positions(wallet))
+
+    def _receive(self, message):
+        if "id" in message:
+            kind, wallet = self._pending.pop(message["id"], (None, None))
+            if "error" in message:
+                raise wsclient.WebSocketError(f"{kind} subscription for {wallet} failed: {message['error']}")
+            self.subscriptions[message["result"]] = (kind, wallet)
+        elif "params" in message:
+            self.notify(message)
+
+    def _session(self, stop):
+        """One connection: subscribe, resync, then apply notifications until it drops."""
+        with wsclient.connect(self.url, timeout=CONNECT_TIMEOUT) as ws:
+            ws.sock.settimeout(DEBOUNCE)  # recv() wakes up to flush and ping
+            self.subscriptions.clear()
+            self._pending.clear()
+            self.subscribe(ws)
+            self.resync()
+            self._dirty.update(self.wallets)
+            self._flush()
+            print(f"Watching {len(self.wallets)} {self.chain} wallets at {self.url}", file=sys.stderr)
+            yield  # connected and in sync
+
+            last_ping = dirty_since = time.monotonic()
+            while not stop.is_set():
+                try:
+                    self._receive(schemas.loads(ws.recv()))
+                    idle = False
+                except socket.timeout:
+                    idle = True
+                now = time.monotonic()
+                if not self._dirty:
+                    dirty_since = now
+                elif idle or now - dirty_since >= DEBOUNCE:
+                    self._flush()
+                if now - ws.last_received > 2 * PING_INTERVAL:
+                    raise wsclient.WebSocketError(f"No frames for {2 * PING_INTERVAL}s")
+                if now - last_ping >= PING_INTERVAL:
+                    ws.ping()
+                    last_ping = now
+
+    def run(self, stop=None):
+        """Watch until `stop` (a threading.Event) is set, reconnecting with backoff."""
+        stop = stop or threading.Event()
+        delay = BACKOFF_INITIAL
+        while not stop.is_set():
+            try:
+                for _ in self._session(stop):
+                    delay = BACKOFF_INITIAL
+            except (OSError, requests.RequestException, ValueError) as e:
+                wait = delay * random.uniform(0.5, 1.0)
+                print(f"{self.chain} subscription lost: {e}; reconnecting in {wait:.1f}s", file=sys.stderr)
+                stop.wait(wait)
+                delay = min(delay * 2, BACKOFF_MAX)
+
+
+class SolanaWatcher(Watcher):
+    """SOL balances via accountSubscribe and SPL token accounts via programSubscribe.
+
+    Each wallet's state is rebuilt from getBalance/getTokenAccountsByOwner
+    on resync; notifications from slots before that poll are ignored. Prices
+    are shared by all wallets and looked up again every PRICE_REFRESH seconds.
+    """
+    chain = "solana"
+
+    def __init__(self, wallets, url=None, on_update=None):
+        import solana
+        self.solana = solana
+        super().__init__(wallets, url or ws_endpoint("SOLANA_WS_ENDPOINT", solana.RPC_ENDPOINT), on_update)
+        self.lamports = {}
+        self.tokens = {}  # wallet -> {token account: token dict, as in solana.get_spl_tokens}
+        self.slots = {}  # wallet -> slot of the last resync
+        self.quotes = {}  # address -> (symbol, price), see solana.value_holdings
+        self._quoted_at = time.monotonic()
+
+    def subscribe(self, ws):
+        config = {"encoding": "jsonParsed", "commitment": "confirmed"}
+        for wallet in self.wallets:
+            self._request(ws, "accountSubscribe", [wallet, config], "account", wallet)
+            self._request(ws, "programSubscribe", [TOKEN_PROGRAM, dict(config, filters=[
+                {"dataSize": TOKEN_ACCOUNT_SIZE},
+                {"memcmp": {"offset": TOKEN_ACCOUNT_OWNER_OFFSET, "bytes": wallet}}
+            ])], "tokens", wallet)
+
+    def resync(self):
+        for wallet in self.wallets:
+            balance = self.solana.fetch_balance(wallet)
+            self.lamports[wallet] = balance.lamports
+            self.slots[wallet] = balance.slot
+            self.tokens[wallet] = {token["account"]: token for token in self.solana.fetch_spl_tokens(wallet)}
+
+    def notify(self, message):
+        notification = schemas.SolanaNotification.from_json(message)
+        kind, wallet = self.subscriptions.get(notification.subscription, (None, None))
+        if wallet is None or notification.slot < self.slots.get(wallet, 0):
+            return
+        if kind == "account":
+            self.lamports[wallet] = notification.lamports
+        else:
+            pubkey = schemas.field("SolanaNotification", notification.value, 'pubkey')
+            if not schemas.field("SolanaNotification", notification.value, 'account', 'lamports', default=0):
+                self.tokens[wallet].pop(pubkey, None)  # closed
+            else:
+                token = schemas.SplTokenAccount.from_json(notification.value)
+                self.tokens[wallet][pubkey] = {
+                    "mint": token.mint, "amount": token.ui_amount, "decimals": token.decimals, "base_units": token.amount, "account": pubkey
+                }
+        self._dirty.add(wallet)
+
+    def positions(self, wallet):
+        if time.monotonic() - self._quoted_at >= PRICE_REFRESH:
+            self.quotes.clear()
+            self._quoted_at = time.monotonic()
+        return self.solana.value_holdings(
+            wallet, self.lamports[wallet] / 1_000_000_000, self.tokens[wallet].values(), source="solana-ws", quotes=self.quotes
+        )
+
+
+class SuiWatcher(Watcher):
+    """Sui wallets, re-polled with one suix_getAllBalances after each of their transactions.
+
+    Sui pushes transaction effects rather than balances, so a notification
+    only marks its wallet as changed.
+    """
+    chain = "sui"
+
+    def __init__(self, wallets, url=None, on_update=None):
+        import sui
+        self.sui = sui
+        super().__init__(wallets, url or ws_endpoint("SUI_WS_ENDPOINT", sui.RPC_ENDPOINT), on_update)
+        self.balances = {}
+        self._stale = set()  # wallets with transactions since their last poll
+
+    def subscribe(self, ws):
+        for wallet in self.wallets:
+            self._request(ws, "suix_subscribeTransaction", [{"FromOrToAddress": {"addr": wallet}}], "transactions", wallet)
+
+    def resync(self):
+        for wallet in self.wallets:
+            self.balances[wallet] = self.sui.fetch_sui_tokens(wallet)
+        self._stale.clear()
+
+    def notify(self, message):
+        subscription = schemas.field("SuiNotification", message, 'params', 'subscription')
+        _, wallet = self.subscriptions.get(subscription, (None, None))
+        if wallet is not None:
+            self._stale.add(wallet)
+            self._dirty.add(wallet)
+
+    def _flush(self):
+        # One poll per wallet however many of its transactions arrived
+        for wallet in list(self._stale):
+            self.balances[wallet] = self.sui.fetch_sui_tokens(wallet)
+            self._stale.discard(wallet)
+        super()._flush()
+
+    def positions(self, wallet):
+        return self.sui.value_balances(wallet, self.balances[wallet], source="sui-ws")
+
+
+WATCHERS = {"solana": SolanaWatcher, "sui": SuiWatcher}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream the positions of wallets as JSON Lines whenever they change.")
+    parser.add_argument("chain", choices=sorted(WATCHERS))
+    parser.add_argument("wallets", nargs="+")
+    parser.add_argument("--url", help="WebSocket endpoint (default: SOLANA_WS_ENDPOINT / SUI_WS_ENDPOINT, else the RPC endpoint)")
+    args = parser.parse_args()
+
+    import output  # not at the top: pyarrow, when installed, is slow to import
+    writer = output.open_writer("jsonl")
+    watcher = WATCHERS[args.chain](args.wallets, args.url, lambda chain, wallet, positions: writer.write(positions))
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,34 @@
 import os
 import requests
 import csv
-import time
 from datetime import datetime
-import threading
+
+import dexscreener
+import jsonstream
+import memo
+import metrics
+import schemas
+import snapshot
+from progress import Progress
 
 # Constants
 RPC_ENDPOINT = "https://sui-rpc.publicnode.com"
-DEX_SCREENER_API_URL = "https://api.dexscreener.com/tokens/v1/sui/"
 WALLET_ADDRESS = "0x357a12335528ee125422430624e0251f18d3ee0f55d5911e56b3da1c3eeb06fc"
 REPORTS_FOLDER = "reports"
+CATEGORIES = ("spendable", "staked", "rewards", "objects")  # position categories returned by collect()
+MIST = 1_000_000_000  # per SUI
+SUI_COIN_TYPE = "0x2::sui::SUI"
+
+# Calls per batched JSON-RPC POST, and objects per suix_getOwnedObjects page (the RPC maximum)
+BATCH_SIZE = int(os.getenv("SUI_BATCH_SIZE", "20"))
+PAGE_SIZE = 50
+# Coins and stakes are covered by suix_getAllBalances and suix_getStakes
+OBJECT_FILTER = {"MatchNone": [{"StructType": "0x2::coin::Coin"}, {"StructType": "0x3::staking_pool::StakedSui"}]}
 
-# Loading animation
-loading = True
-
-def show_loading(message):
-    """Show a loading animation in the terminal."""
-    global loading
-    dots = 0
-    while loading:
-        print(f"\r{message}{'.' * (dots % 4)}", end='', flush=True)
-        dots += 1
-        time.sleep(0.5)
-    print(f"\r{message}...", end='', flush=True)
-
-def get_sui_tokens(wallet_address: str):
-    """Fetch all tokens held by a Sui wallet."""
+UNKNOWN_METADATA = schemas.SuiCoinMetadata(name='Unknown Token', symbol='UNKNOWN', decimals=9)
+
+def fetch_sui_tokens(wallet_address: str):
+    """Fetch the coin balances of a Sui wallet. Raises on errors."""
     payload = {
         "jsonrpc": "2.0",
         "id": 1,
@@ -33,42 +36,105 @@ def get_sui_tokens(wallet_address: str):
         "params": [wallet_address]
     }
 
-    try:
-        response = requests.post(RPC_ENDPOINT, json=payload)
+    # Stream the balances and keep only the fields used for valuation
+    with metrics.post("sui-rpc", "suix_getAllBalances", RPC_ENDPOINT, json=payload, stream=True) as response:
         response.raise_for_status()
-        return response.json().get('result', [])
-    except requests.RequestException as e:
-        print(f"Request error in get_sui_tokens: {e}")
-        return []
+        return [
+            schemas.SuiBalance.from_json(balance)
+            for balance in jsonstream.iter_response_items(response, ("result",))
+        ]
 
-def get_token_metadata(coin_type: str):
-    """Fetch metadata for a given token."""
+def rpc_batch(method, calls):
+    """Send `calls` ((key, params) pairs) as batched JSON-RPC requests, BATCH_SIZE per POST.
+
+    Yields (key, result) as each response item is decoded from the stream.
+    Failed calls are printed and skipped; a failed POST raises.
+    """
+    for start in range(0, len(calls), BATCH_SIZE):
+        batch = calls[start:start + BATCH_SIZE]
+        payload = [{"jsonrpc": "2.0", "id": i, "method": method, "params": params} for i, (_, params) in enumerate(batch)]
+        with metrics.post("sui-rpc", method, RPC_ENDPOINT, json=payload, stream=True) as response:
+            response.raise_for_status()
+            for item in jsonstream.iter_response_items(response, ()):
+                key = batch[schemas.as_int("SuiBatch", schemas.field("SuiBatch", item, 'id'), 'id')][0]
+                if "error" in item:
+                    print(f"Error in {method} for {key}: {item['error']}")
+                    continue
+                yield key, schemas.field("SuiBatch", item, 'result')
+
+def fetch_all_balances(wallets):
+    """Fetch the coin balances of several wallets, as {wallet: [SuiBalance]}."""
+    return {
+        wallet: [schemas.SuiBalance.from_json(balance) for balance in result]
+        for wallet, result in rpc_batch("suix_getAllBalances", [(wallet, [wallet]) for wallet in wallets])
+    }
+
+def fetch_stakes(wallets):
+    """Fetch the delegated SUI of several wallets, as {wallet: [SuiStake]}."""
+    return {
+        wallet: schemas.SuiStake.list_from_json(result)
+        for wallet, result in rpc_batch("suix_getStakes", [(wallet, [wallet]) for wallet in wallets])
+    }
+
+def fetch_object_types(wallets):
+    """Count the non-coin objects of several wallets by type, as {wallet: {type: count}}.
+
+    Each round requests the next page of every wallet that has one, so the
+    round trips follow the largest wallet's page count, not the wallet count.
+    """
+    counts = {wallet: {} for wallet in wallets}
+    cursors = {wallet: None for wallet in wallets}
+    while cursors:
+        calls = [(wallet, [wallet, {"filter": OBJECT_FILTER, "options": {"showType": True}}, cursor, PAGE_SIZE]) for wallet, cursor in cursors.items()]
+        cursors = {}
+        for wallet, result in rpc_batch("suix_getOwnedObjects", calls):
+            page = schemas.SuiObjectPage.from_json(result)
+            for object_type in page.types:
+                counts[wallet][object_type] = counts[wallet].get(object_type, 0) + 1
+            if page.has_next_page and page.next_cursor:
+                cursors[wallet] = page.next_cursor
+    return counts
+
+@memo.shared("sui-rpc", "suix_getCoinMetadata")
+def fetch_token_metadata(coin_type: str):
+    """Fetch metadata for a given token, raising requests.RequestException or ValueError."""
     payload = {
         "jsonrpc": "2.0",
         "id": 1,
         "method": "suix_getCoinMetadata",
         "params": [coin_type]
     }
+    response = metrics.post("sui-rpc", "suix_getCoinMetadata", RPC_ENDPOINT, json=payload)
+    response.raise_for_status()
+    return schemas.decode(response, schemas.SuiCoinMetadata)
 
+def get_token_metadata(coin_type: str):
+    """Metadata for a given token, or UNKNOWN_METADATA on errors."""
     try:
-        response = requests.post(RPC_ENDPOINT, json=payload)
-        response.raise_for_status()
-        return response.json().get('result', {})
+        return fetch_token_metadata(coin_type)
     except requests.RequestException as e:
         print(f"Request error in get_token_metadata: {e}")
-        return {}
+        metrics.record_failure("sui-rpc", "suix_getCoinMetadata", type(e).__name__)
+    except ValueError as e:
+        print(f"Error parsing metadata for {coin_type}: {e}")
+        metrics.record_failure("sui-rpc", "suix_getCoinMetadata", type(e).__name__)
+    return UNKNOWN_METADATA
+
+@memo.shared("dexscreener", "token-price")
+def fetch_token_price(coin_type: str):
+    """Fetch the USD price of a token from its most liquid Dexscreener pair."""
+    return dexscreener.get_price(coin_type, "sui")
 
 def get_token_price(coin_type: str):
-    """Fetch the USD price of a token from Dexscreener."""
+    """The USD price of a token, or 0.0 on errors."""
     try:
-        response = requests.get(DEX_SCREENER_API_URL + coin_type)
-        response.raise_for_status()
-
-        data = response.json()
-        if data and isinstance(data, list):
-            return float(data[0].get('priceUsd', 0.0))
+        return fetch_token_price(coin_type)
     except requests.RequestException as e:
         print(f"Request error in get_token_price: {e}")
+        metrics.record_failure("dexscreener", "token-price", type(e).__name__)
+    except ValueError as e:
+        print(f"Error parsing price for {coin_type}: {e}")
+        metrics.record_failure("dexscreener", "token-price", type(e).__name__)
 
     return 0.0
 
@@ -110,48 +176,100 @@ def export_to_csv(data: list, filename: str):
     except Exception as e:
         print(f"\nError exporting to CSV: {e}")
 
-def main():
-    global loading
+def collect(wallet_address: str, categories=CATEGORIES):
+    """Return the valued positions of one wallet (see snapshot.Position)."""
+    return collect_many([wallet_address], categories)
 
-    print("Running...")
-    loading_thread = threading.Thread(target=show_loading, args=("Fetching data",))
-    loading_thread.start()
+def collect_many(wallets, categories=CATEGORIES):
+    """Return the valued positions of several wallets, fetched in batched requests.
 
-    # Get all tokens for the wallet
-    tokens = get_sui_tokens(WALLET_ADDRESS)
+    Coins, stakes and owned objects each take one batched round trip (per
+    BATCH_SIZE wallets), plus one per extra page of objects. Objects other
+    than coins and stakes have no price; they are counted by type.
+    """
+    wallets = list(dict.fromkeys(wallets))
+    positions = []
+    fetches = (
+        ({"spendable"}, fetch_all_balances, value_balances),
+        ({"staked", "rewards"}, fetch_stakes, value_stakes),
+        ({"objects"}, fetch_object_types, value_objects)
+    )
+    for fetch_categories, fetch, value in fetches:
+        if not fetch_categories & set(categories):
+            continue
+        try:
+            for wallet, holdings in fetch(wallets).items():
+                positions.extend(value(wallet, holdings))
+        except requests.RequestException as e:
+            print(f"Request error in {fetch.__name__}: {e}")
+        except (KeyError, ValueError) as e:
+            print(f"Error parsing response in {fetch.__name__}: {e}")
+    return [position for position in positions if position.category in categories]
 
-    # Prepare data for CSV
-    results = []
-    for token in tokens:
-        coin_type = token.get('coinType')
-        raw_balance = int(token.get('totalBalance', 0))
+def value_balances(wallet_address, balances, source="sui-rpc"):
+    """Value SuiBalances (as returned by fetch_sui_tokens) as Positions."""
+    positions = []
+    for token in balances:
+        metadata = get_token_metadata(token.coin_type)
+        balance = token.total_balance / (10 ** metadata.decimals)
+        positions.append(snapshot.Position.of(
+            "sui", wallet_address, metadata.symbol, token.coin_type, "spendable", balance, get_token_price(token.coin_type),
+            metadata.decimals, token.total_balance, source
+        ))
+    return positions
 
+def value_stakes(wallet_address, stakes):
+    """Value SuiStakes: principal as staked, and the estimated reward of active stakes as rewards."""
+    sui_price = get_token_price(SUI_COIN_TYPE)
+    positions = []
+    for stake in stakes:
+        positions.append(snapshot.Position.of(
+            "sui", wallet_address, "SUI", stake.validator, "staked", stake.principal / MIST, sui_price, 9, stake.principal, "sui-rpc"
+        ))
+        if stake.estimated_reward:
+            positions.append(snapshot.Position.of(
+                "sui", wallet_address, "SUI", stake.validator, "rewards", stake.estimated_reward / MIST, sui_price, 9, stake.estimated_reward, "sui-rpc"
+            ))
+    return positions
 
-        # Fetch metadata and price
-        metadata = get_token_metadata(coin_type)
-        decimals = metadata.get('decimals', 9)
-        symbol = metadata.get('symbol', 'UNKNOWN')
-        name = metadata.get('name', 'Unknown Token')
+def value_objects(wallet_address, counts):
+    """Count objects by type, named after their struct (e.g. `0x..::suifrens::SuiFren<..>` as SuiFren)."""
+    return [
+        snapshot.Position.of(
+            "sui", wallet_address, object_type.split("<", 1)[0].rsplit("::", 1)[-1], object_type, "objects", count, 0.0, 0, count, "sui-rpc"
+        )
+        for object_type, count in counts.items()
+    ]
 
-        price_usd = get_token_price(coin_type)
+def main():
+    print("Running...")
 
-        # Adjust balance and calculate total value
-        balance = raw_balance / (10 ** decimals)
-        total_value = balance * price_usd
+    progress = Progress("Sui")
+    progress.stage("Fetching balances")
+    progress.plan()
+
+    # Coins, stakes and owned objects, valued as in collect()
+    positions = collect_many([WALLET_ADDRESS])
+    progress.advance()
+
+    # Prepare data for CSV
+    results = []
+    for position in positions:
+        if position.category == "spendable":
+            name = get_token_metadata(position.address).name
+        else:
+            name = f"{position.asset} [{position.category.capitalize()}]"
 
-        # Add to results
         results.append({
             "Token Name": name,
-            "Symbol": symbol,
-            "Address": coin_type,
-            "Balance": f"{balance:.6f}",
-            "Price (USD)": f"{price_usd:.6f}",
-            "Total Value (USD)": f"{total_value:.6f}"
+            "Symbol": position.asset,
+            "Address": position.address,
+            "Balance": f"{position.balance:.6f}",
+            "Price (USD)": f"{position.price:.6f}",
+            "Total Value (USD)": f"{position.value:.6f}"
         })
 
-    # Stop loading animation and persist message
-    loading = False
-    loading_thread.join()
+    progress.finish()
 
     # CSV creation message
     print("\nCreating CSV file...")
@@ -161,6 +279,8 @@ def main():
     filename = f"{WALLET_ADDRESS}_Sui_{timestamp}.csv"
     export_to_csv(results, filename)
 
+    metrics.export_trace("Sui")
+
     print("Done!")
 
 if __name__ == "__main__":
@@ -1,109 +1,153 @@
 import os
 import requests
 import csv
-import threading
-from datetime import datetime
 import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
+import metrics
+import prices
+import schemas
+import snapshot
+from progress import Progress
+from ratelimit import RateLimiter
+
 load_dotenv()
 
 TAO_PRICE_API_URL = "https://api.taostats.io/api/price/latest/v1?asset=tao"
+TAO_PRICE_HISTORY_API_URL = "https://api.taostats.io/api/price/history/v1"
 ACCOUNT_BALANCE_API_URL = "https://api.taostats.io/api/account/latest/v1"
 REPORTS_FOLDER = "reports"
+CATEGORIES = ("spendable", "staked")  # position categories returned by collect()
 API_KEY = os.getenv("TAO_API_KEY")
 
+# Taostats request budget, shared by all wallet fetches
+RATE_LIMIT_PER_MINUTE = int(os.getenv("TAOSTATS_RATE_LIMIT", "60"))
+CONCURRENCY = int(os.getenv("TAOSTATS_CONCURRENCY", "8"))
+MAX_RETRIES = 3
+
+rate_limiter = RateLimiter(RATE_LIMIT_PER_MINUTE, per=60.0, burst=CONCURRENCY)
+
+PRICE_SOURCES = (
+    prices.Source("taostats:tao", lambda: fetch_taostats_price()),
+    prices.coingecko_source("bittensor")
+)
+
 WALLETS = [
     "5EcYxFfwKLKogdKkGdz88ZFh2J6TqpygRGdRqHWADii9vzYb",
     "5Fqxv8Ba3GG6BHWMeUScGHt39ddJmafAnGkuxxCRXicSYVWY",
     "5DMxfUJfhSskQnSkzJnFJQns1Ej2FbZLAFjfs5mSTjccLkx8"
 ]
 
-loading = True
-
-def show_loading(message):
-    """Show a loading animation in the terminal."""
-    global loading
-    dots = 0
-    while loading:
-        print(f"\r{message}{'.' * (dots % 4)}", end='', flush=True)
-        dots += 1
-        time.sleep(0.5)
-    print(f"\r{message}...", end='', flush=True)
-
-def safe_float(value, default=0.0):
-    """Convert a value to float safely, with a default fallback."""
-    try:
-        return float(value) if value is not None else default
-    except (ValueError, TypeError):
-        return default
-
-def fetch_tao_price():
-    """Fetch the current price of TAO in USD."""
+def taostats_get(endpoint, url):
+    """GET a Taostats URL within the shared rate budget, retrying on HTTP 429."""
     headers = {
         "accept": "application/json",
         "Authorization": API_KEY
     }
 
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        response = metrics.get("taostats", endpoint, url, headers=headers, retries=1 if attempt else 0)
+        if response.status_code != 429 or attempt == MAX_RETRIES:
+            return response
+        try:
+            delay = float(response.headers.get("Retry-After", 2 ** attempt))
+        except ValueError:
+            delay = 2 ** attempt
+        time.sleep(delay)
+
+def fetch_taostats_price():
+    """Fetch the current price of TAO in USD from Taostats."""
     try:
-        response = requests.get(TAO_PRICE_API_URL, headers=headers)
+        response = taostats_get("price/latest", TAO_PRICE_API_URL)
         response.raise_for_status()
-        data = response.json().get('data', [])
-        if data:
-            return safe_float(data[0].get('price'))
-        return 0.0
+        return schemas.decode(response, schemas.TaoPrice).price
     except requests.RequestException as e:
         print(f"Error fetching TAO price: {e}")
         return 0.0
+    except ValueError as e:
+        print(f"Error parsing TAO price: {e}")
+        return 0.0
+
+def fetch_tao_price():
+    """Fetch the current price of TAO in USD from the fastest healthy price source."""
+    return prices.get_price("TAO", PRICE_SOURCES)
+
+def fetch_tao_price_history(start, end):
+    """Return the PricePoints of TAO between two unix timestamps from Taostats.
+
+    Raises requests.RequestException or ValueError.
+    """
+    points = []
+    page = 1
+    while page:
+        url = f"{TAO_PRICE_HISTORY_API_URL}?asset=tao&timestamp_start={int(start)}&timestamp_end={int(end)}&limit=200&page={page}"
+        response = taostats_get("price/history", url)
+        response.raise_for_status()
+        history = schemas.decode(response, schemas.TaoPriceHistory)
+        points.extend(history.points)
+        page = history.next_page
+    return points
 
 def fetch_account_data(wallet_address):
     """Fetch account balance data for a given wallet."""
-    headers = {
-        "accept": "application/json",
-        "Authorization": API_KEY
-    }
-
     try:
-        response = requests.get(f"{ACCOUNT_BALANCE_API_URL}?address={wallet_address}", headers=headers)
+        response = taostats_get("account/latest", f"{ACCOUNT_BALANCE_API_URL}?address={wallet_address}")
         response.raise_for_status()
-        data = response.json().get('data', [])
+        data = schemas.loads(response.content).get('data') or []
         if data:
-            return data[0]
-        return {}
+            return schemas.TaoAccount.from_json(data[0])
+        return None
     except requests.RequestException as e:
         print(f"Error fetching account data for {wallet_address}: {e}")
-        return {}
-
-def get_wallet_balances(wallets, tao_price):
-    """Fetch and prepare balance data for multiple wallets."""
-    results = []
-    for wallet in wallets:
-        account_data = fetch_account_data(wallet)
-        if not account_data:
-            continue
-
-        available_balance = safe_float(account_data.get('balance_free')) / 1e9
-        staked_balance = safe_float(account_data.get('balance_staked')) / 1e9
-        total_balance = safe_float(account_data.get('balance_total')) / 1e9
-
-        available_value = available_balance * tao_price
-        staked_value = staked_balance * tao_price
-        total_value = total_balance * tao_price
-
-        results.append({
-            "Wallet Address": wallet,
-            "Available Balance (TAO)": f"{available_balance:.6f}",
-            "Available Value (USD)": f"{available_value:.6f}",
-            "Staked Balance (TAO)": f"{staked_balance:.6f}",
-            "Staked Value (USD)": f"{staked_value:.6f}",
-            "Total Balance (TAO)": f"{total_balance:.6f}",
-            "Total Value (USD)": f"{total_value:.6f}"
-        })
-
-    return results
+        return None
+    except ValueError as e:
+        print(f"Error parsing account data for {wallet_address}: {e}")
+        return None
+
+def get_wallet_balance(wallet, account_data, tao_price):
+    """Prepare the report row of one wallet."""
+    available_balance = account_data.balance_free / 1e9
+    staked_balance = account_data.balance_staked / 1e9
+    total_balance = account_data.balance_total / 1e9
+
+    available_value = available_balance * tao_price
+    staked_value = staked_balance * tao_price
+    total_value = total_balance * tao_price
+
+    return {
+        "Wallet Address": wallet,
+        "Available Balance (TAO)": f"{available_balance:.6f}",
+        "Available Value (USD)": f"{available_value:.6f}",
+        "Staked Balance (TAO)": f"{staked_balance:.6f}",
+        "Staked Value (USD)": f"{staked_value:.6f}",
+        "Total Balance (TAO)": f"{total_balance:.6f}",
+        "Total Value (USD)": f"{total_value:.6f}"
+    }
+
+def get_wallet_balances(wallets, tao_price, progress):
+    """Fetch balance data for many wallets concurrently, yielding rows as they arrive.
+
+    Up to CONCURRENCY requests are in flight, and all of them draw from the
+    shared Taostats rate budget.
+    """
+    wallets = list(dict.fromkeys(wallets))
+    progress.plan(len(wallets))
+    if not wallets:
+        return
+
+    with ThreadPoolExecutor(max_workers=min(CONCURRENCY, len(wallets))) as executor:
+        futures = {executor.submit(fetch_account_data, wallet): wallet for wallet in wallets}
+        for future in as_completed(futures):
+            progress.advance()
+            account_data = future.result()
+            if account_data:
+                yield get_wallet_balance(futures[future], account_data, tao_price)
 
 def export_to_csv(data, filename, tao_price):
-    """Export the results to a CSV file."""
+    """Export the results to a CSV file, writing each row as soon as `data` yields it."""
     try:
         os.makedirs(REPORTS_FOLDER, exist_ok=True)
 
@@ -127,6 +171,7 @@ def export_to_csv(data, filename, tao_price):
                 total_staked_value += float(row['Staked Value (USD)'])
                 total_value_sum += float(row['Total Value (USD)'])
                 writer.writerow(row)
+                csvfile.flush()
 
             writer.writerow({})
             writer.writerow({
@@ -148,25 +193,40 @@ def export_to_csv(data, filename, tao_price):
     except Exception as e:
         print(f"\nError exporting to CSV: {e}")
 
-def main():
-    global loading
+def collect(wallet, categories=CATEGORIES):
+    """Return the valued positions of one wallet (see snapshot.Position).
+
+    Both categories come from the same account lookup.
+    """
+    tao_price = snapshot.cached_price("tao", fetch_tao_price)
+    account_data = fetch_account_data(wallet)
+    if account_data is None:
+        return []
+    positions = [
+        snapshot.Position.of("tao", wallet, "TAO", "native", "spendable", account_data.balance_free / 1e9, tao_price, 9, account_data.balance_free, "taostats"),
+        snapshot.Position.of("tao", wallet, "TAO", "native", "staked", account_data.balance_staked / 1e9, tao_price, 9, account_data.balance_staked, "taostats")
+    ]
+    return [position for position in positions if position.category in categories]
 
+def main():
     print("Running...")
-    
-    loading_thread = threading.Thread(target=show_loading, args=("Fetching data",))
-    loading_thread.start()
+
+    progress = Progress("TAO")
+    progress.stage("Fetching price")
+    progress.plan()
 
     tao_price = fetch_tao_price()
+    progress.advance()
 
-    token_data = get_wallet_balances(WALLETS, tao_price)
+    # Rows are written to the report as each wallet's data arrives
+    progress.stage("Fetching wallets")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"TAO_Wallets_{timestamp}.csv"
+    export_to_csv(get_wallet_balances(WALLETS, tao_price, progress), filename, tao_price)
 
-    loading = False
-    loading_thread.join()
+    progress.finish()
 
-    if token_data:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"TAO_Wallets_{timestamp}.csv"
-        export_to_csv(token_data, filename, tao_price)
+    metrics.export_trace("TAO")
 
     print("Done!")
 
@@ -0,0 +1,168 @@
+import os
+import ssl
+import base64
+import socket
+import time
+import struct
+import hashlib
+from urllib.parse import urlparse
+
+# Minimal RFC 6455 client: text messages, ping/pong and close. Enough for
+# JSON-RPC subscriptions, without a WebSocket dependency.
+
+GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketError(OSError):
+    """The handshake failed, the peer broke the protocol or closed the connection."""
+
+
+class WebSocket:
+    """A client connection; `recv()` raises socket.timeout (TimeoutError) after `timeout` idle seconds."""
+
+    def __init__(self, url, timeout=30):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("ws", "wss"):
+            raise ValueError(f"Not a WebSocket URL: {url}")
+        port = parsed.port or (443 if parsed.scheme == "wss" else 80)
+        sock = socket.create_connection((parsed.hostname, port), timeout=timeout)
+        if parsed.scheme == "wss":
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parsed.hostname)
+        self.sock = sock
+        self._buffer = bytearray()
+        self._message = bytearray()  # fragments of the message being received
+        self._message_opcode = None
+        self._handshake(parsed, port)
+        self.last_received = time.monotonic()  # of the last frame, pongs included
+
+    def _handshake(self, parsed, port):
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+        host = parsed.hostname if port in (80, 443) else f"{parsed.hostname}:{port}"
+        self.sock.sendall((
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {host}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+
+        while b"\r\n\r\n" not in self._buffer:
+            self._fill(len(self._buffer) + 1)
+        end = self._buffer.index(b"\r\n\r\n")
+        status, *lines = self._buffer[:end].decode("latin-1").split("\r\n")
+        del self._buffer[:end + 4]
+        headers = {}
+        for line in lines:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if status.split(" ")[1:2] != ["101"]:
+            raise WebSocketError(f"WebSocket handshake failed: {status.strip()}")
+        expected = base64.b64encode(hashlib.sha1((key + GUID).encode()).digest()).decode()
+        if headers.get("sec-websocket-accept") != expected:
+            raise WebSocketError("WebSocket handshake failed: bad Sec-WebSocket-Accept")
+
+    def _send_frame(self, opcode, payload=b""):
+        # Client frames are always masked
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([0x80 | length])
+        elif length < 1 << 16:
+            header += bytes([0x80 | 126]) + struct.pack("!H", length)
+        else:
+            header += bytes([0x80 | 127]) + struct.pack("!Q", length)
+        mask = os.urandom(4)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.sock.sendall(header + mask + masked)
+
+    def _fill(self, size):
+        """Buffer at least `size` bytes. A timeout leaves the buffer intact."""
+        while len(self._buffer) < size:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise WebSocketError("WebSocket connection closed")
+            self._buffer += chunk
+
+    def _recv_frame(self):
+        # Nothing is consumed until the whole frame is buffered, so a
+        # timeout mid-frame can simply be retried
+        self._fill(2)
+        first, second = self._buffer[0], self._buffer[1]
+        length, offset = second & 0x7F, 2
+        if length == 126:
+            self._fill(4)
+            length, offset = struct.unpack_from("!H", self._buffer, 2)[0], 4
+        elif length == 127:
+            self._fill(10)
+            length, offset = struct.unpack_from("!Q", self._buffer, 2)[0], 10
+        masked = second & 0x80
+        self._fill(offset + (4 if masked else 0) + length)
+        if masked:
+            mask = self._buffer[offset:offset + 4]
+            offset += 4
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self._buffer[offset:offset + length]))
+        else:
+            payload = bytes(self._buffer[offset:offset + length])
+        del self._buffer[:offset + length]
+        self.last_received = time.monotonic()
+        return bool(first & 0x80), first & 0x0F, payload
+
+    def send(self, text):
+        self._send_frame(OP_TEXT, text.encode("utf-8"))
+
+    def ping(self, payload=b""):
+        self._send_frame(OP_PING, payload)
+
+    def recv(self):
+        """Return the next text message, answering pings on the way.
+
+        Fragments received before a timeout are kept for the next call.
+        """
+        while True:
+            fin, opcode, payload = self._recv_frame()
+            if opcode == OP_PING:
+                self._send_frame(OP_PONG, payload)
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                code = struct.unpack("!H", payload[:2])[0] if len(payload) >= 2 else None
+                raise WebSocketError(f"WebSocket closed by peer (code {code})")
+            if opcode != OP_CONTINUATION:
+                self._message_opcode = opcode
+                self._message.clear()
+            self._message += payload
+            if fin:
+                message, message_opcode = bytes(self._message), self._message_opcode
+                self._message.clear()
+                self._message_opcode = None
+                if message_opcode == OP_BINARY:
+                    return message
+                return message.decode("utf-8")
+
+    def close(self):
+        try:
+            self._send_frame(OP_CLOSE, struct.pack("!H", 1000))
+        except OSError:
+            pass
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def connect(url, timeout=30):
+    return WebSocket(url, timeout)